@@ -1,8 +1,10 @@
 from pathlib import Path
 import pandas as pd
+import numpy as np
+import h5py
 import torch
 from torch import Tensor
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, Iterator, Union
 import matplotlib
 import matplotlib.pyplot as plt
 
@@ -26,6 +28,136 @@ Provides class for handling muon hits and simulating detector response.
 """
 
 
+class DetectorResponse:
+    r"""
+    A class to simulate the detector response, i.e. the panels spatial resolution and efficiency,
+    from the generated hits.
+
+    The random numbers are drawn from a seeded generator, such that the detector response is reproducible.
+    """
+
+    def __init__(
+        self,
+        spatial_res: Union[Tensor, Tuple[float, float, float]] = (0.0, 0.0, 0.0),
+        efficiency: Union[Tensor, float] = 1.0,
+        seed: Optional[int] = None,
+        chunk_size: int = 1_000_000,
+    ) -> None:
+        r"""
+        Initializes the DetectorResponse object.
+
+        Args:
+            spatial_res (Union[Tensor, Tuple[float, float, float]]): The spatial resolution along x, y, z in mm, with size (3)
+                for identical panels, or (n_plane, 3) for plane-wise spatial resolution.
+            efficiency (Union[Tensor, float]): The panels efficiency, as a float for identical panels
+                or with size (n_plane) for plane-wise efficiency. Must be in [0., 1.].
+            seed (Optional[int]): The seed of the random number generator. If None, the seed is drawn from the
+                global random number generator, such that `torch.manual_seed` makes the detector response reproducible.
+            chunk_size (int): The number of muons processed at once.
+        """
+        self.spatial_res = torch.as_tensor(spatial_res, dtype=dtype_hit, device=DEVICE)
+        self.efficiency = torch.as_tensor(efficiency, dtype=dtype_hit, device=DEVICE)
+        self.chunk_size = chunk_size
+
+        if (self.spatial_res.ndim not in (1, 2)) or (self.spatial_res.size(-1) != 3):
+            raise ValueError("Spatial resolution must have size (3) or (n_plane, 3).")
+        if (self.spatial_res < 0.0).any():
+            raise ValueError("Spatial resolution must be positive.")
+        if self.efficiency.ndim > 1:
+            raise ValueError("Efficiency must be a float or have size (n_plane).")
+        if ((self.efficiency < 0.0) | (self.efficiency > 1.0)).any():
+            raise ValueError("Panels efficiency must be in [0., 1.].")
+
+        self.generator = torch.Generator(device=DEVICE)
+        self.seed = seed if seed is not None else int(torch.randint(2**62, (1,)))
+        self.reset()
+
+    def __repr__(self) -> str:
+        return f"Detector response with spatial resolution {self.spatial_res.tolist()} mm and panel efficiency {self.efficiency.tolist()}."
+
+    def reset(self) -> None:
+        r"""
+        Resets the random number generator to its seed, such that the same detector response is simulated again.
+        """
+        self.generator.manual_seed(self.seed)
+
+    def get_plane_wise_params(self, n_plane: int) -> Tuple[Tensor, Tensor]:
+        r"""
+        Returns the spatial resolution and efficiency of each plane.
+
+        Args:
+            n_plane (int): The number of detector planes.
+
+        Returns:
+            spatial_res (Tensor): The spatial resolution, with size (3, n_plane).
+            efficiency (Tensor): The efficiency, with size (n_plane).
+        """
+        if (self.spatial_res.ndim == 2) and (self.spatial_res.size(0) != n_plane):
+            raise ValueError(f"Spatial resolution given for {self.spatial_res.size(0)} planes, but hits have {n_plane} planes.")
+        if (self.efficiency.ndim == 1) and (self.efficiency.size(0) != n_plane):
+            raise ValueError(f"Efficiency given for {self.efficiency.size(0)} planes, but hits have {n_plane} planes.")
+
+        return self.spatial_res.expand(n_plane, 3).T, self.efficiency.expand(n_plane)
+
+    def simulate(
+        self,
+        gen_hits: Tensor,
+        reco_hits: Optional[Tensor] = None,
+        hits_eff: Optional[Tensor] = None,
+    ) -> Tuple[Tensor, Tensor]:
+        r"""
+        Simulates the reconstructed hits and the hits efficiency from the generated hits.
+
+        The generated hits are smeared by a Normal distribution centered at 0, with standard deviation equal
+        to the plane-wise spatial resolution along a given dimension. A hit is recorded (1) with a probability
+        equal to the plane efficiency, and lost (0) otherwise. Both are computed within the same pass over
+        chunks of muons, in-place.
+
+        Args:
+            gen_hits (Tensor): The generated level hits, with size (3, n_plane, mu). It is not modified.
+            reco_hits (Optional[Tensor]): The buffer where the reconstructed hits are written, with size (3, n_plane, mu).
+                Allows to simulate a new detector response without new allocation. If None, a new tensor is allocated.
+            hits_eff (Optional[Tensor]): The buffer where the hits efficiency is written, with size (n_plane, mu).
+                If None, a new tensor is allocated.
+
+        Returns:
+            reco_hits (Tensor): The reconstructed hits, with size (3, n_plane, mu).
+            hits_eff (Tensor): The hits efficiency, with size (n_plane, mu).
+        """
+        n_plane, n_mu = gen_hits.size()[1:]
+        spatial_res, efficiency = self.get_plane_wise_params(n_plane)
+
+        if reco_hits is None:
+            reco_hits = torch.empty_like(gen_hits, memory_format=torch.contiguous_format)
+        if hits_eff is None:
+            hits_eff = torch.empty((n_plane, n_mu), dtype=torch.int64, device=gen_hits.device)
+
+        # Axes along which at least one plane has a non-zero spatial resolution
+        axes = torch.nonzero(spatial_res.sum(dim=1) > 0.0).flatten().tolist()
+
+        # Buffers for the random numbers of a chunk, kept contiguous for fast sampling
+        noise_buffer = torch.empty(len(axes) * n_plane * min(self.chunk_size, n_mu), dtype=dtype_hit, device=gen_hits.device)
+        p_buffer = torch.empty(n_plane * min(self.chunk_size, n_mu), dtype=dtype_hit, device=gen_hits.device)
+
+        for start in range(0, n_mu, self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            n = min(self.chunk_size, n_mu - start)
+
+            # Smearing
+            noise = noise_buffer[: len(axes) * n_plane * n].view(len(axes), n_plane, n)
+            noise.normal_(generator=self.generator).mul_(spatial_res[axes, :, None])
+
+            reco_hits[:, :, chunk] = gen_hits[:, :, chunk]
+            for i, axis in enumerate(axes):
+                reco_hits[axis, :, chunk] += noise[i]
+
+            # Efficiency
+            p = p_buffer[: n_plane * n].view(n_plane, n)
+            hits_eff[:, chunk] = p.uniform_(generator=self.generator) < efficiency[:, None]
+
+        return reco_hits, hits_eff
+
+
 class Hits:
     r"""
     A class to handle and process muon hit data from a CSV file.
@@ -53,51 +185,62 @@ class Hits:
         self,
         csv_filename: Optional[str] = None,
         df: Optional[pd.DataFrame] = None,
+        hdf5_filename: Optional[str] = None,
         plane_labels: Optional[Tuple[int, ...]] = None,
-        spatial_res: Optional[Tuple[float, float, float]] = None,
+        spatial_res: Optional[Union[Tensor, Tuple[float, float, float]]] = None,
         energy_range: Optional[Tuple[float, float]] = None,
-        efficiency: float = 1.0,
+        efficiency: Union[float, Tensor] = 1.0,
         input_unit: str = "mm",
+        seed: Optional[int] = None,
     ) -> None:
         r"""
         Initializes a Hits object to represent particle hit data from a detector, with input from either
-        a CSV file path or an existing DataFrame.
+        a CSV file path, an existing DataFrame or a HDF5 file written by `convert_csv_to_hdf5`.
 
         Args:
             csv_filename (Optional[str]): The file path to the CSV containing hit and energy data.
                 Either `csv_filename` or `df` must be provided, but not both.
             df (Optional[pd.DataFrame]): A DataFrame containing hit and energy data. Use this instead of
                 loading data from a CSV file.
+            hdf5_filename (Optional[str]): The file path to a HDF5 file written by `convert_csv_to_hdf5`.
+                The hits and energies are memory-mapped instead of being loaded in memory.
             plane_labels (Optional[Tuple[int, ...]]): Specifies the plane labels to include from the data,
                 as a tuple of integers. Only hits from these planes will be loaded if provided.
-            spatial_res (Optional[Tuple[float, float, float]]): The spatial resolution of detector panels
-                along the x, y, and z axes, in units specified by `input_unit`. Assumes uniform resolution
-                across all panels if provided.
+            spatial_res (Optional[Union[Tensor, Tuple[float, float, float]]]): The spatial resolution of detector panels
+                along the x, y, and z axes, in units specified by `input_unit`. Either a triple, assuming uniform resolution
+                across all panels, or a tensor with size (n_plane, 3) for plane-wise resolution.
             energy_range (Optional[Tuple[float, float]]): A tuple specifying the minimum and maximum energy
                 range for hits to be included. Only hits within this range will be processed if provided.
-            efficiency (float): The efficiency factor of the detector panels, applied uniformly across all panels.
+            efficiency (Union[float, Tensor]): The efficiency factor of the detector panels, either as a float applied
+                uniformly across all panels, or as a tensor with size (n_plane) for plane-wise efficiency.
                 Defaults to 1.0, representing full efficiency.
             input_unit (str): The unit of measurement for the input data (e.g., "mm", "cm"). Data will be rescaled to
                 millimeters if another unit is specified. Defaults to "mm".
+            seed (Optional[int]): The seed used to simulate the detector response. If None, the seed is drawn
+                from the global random number generator, see `DetectorResponse`.
         """
 
         # Detector panel parameters
-        self.spatial_res = (
-            torch.tensor(spatial_res, dtype=dtype_hit, device=DEVICE) if spatial_res is not None else torch.zeros(3, dtype=dtype_hit, device=DEVICE)
+        self.detector_response = DetectorResponse(
+            spatial_res=spatial_res if spatial_res is not None else (0.0, 0.0, 0.0),
+            efficiency=efficiency,
+            seed=seed,
         )
 
-        self.efficiency = efficiency  # in %
-        if (efficiency > 1.0) | (efficiency < 0.0):
-            raise ValueError("Efficency must be positive and < 1.")
-
         # Energy range
         self.energy_range = energy_range
 
         # Load or create hits DataFrame
-        if csv_filename is not None and df is not None:
-            raise ValueError("Provide either csv_filename or df, not both.")
+        if sum([csv_filename is not None, df is not None, hdf5_filename is not None]) > 1:
+            raise ValueError("Provide only one of csv_filename, df or hdf5_filename.")
 
-        if csv_filename is not None:
+        if hdf5_filename is not None:
+            # Hits are saved in mm
+            self.input_unit = "mm"
+            self._df = None
+            self._gen_hits, self._E, self.plane_labels = self.get_hits_energy_from_hdf5(hdf5_filename, plane_labels)
+
+        elif csv_filename is not None:
             self.input_unit = input_unit
             if input_unit not in allowed_d_units:
                 raise ValueError("Input unit must be mm, cm, dm or m")
@@ -112,28 +255,31 @@ class Hits:
             self._df = df
 
         else:
-            raise ValueError("Either csv_filename or df must be provided.")
+            raise ValueError("Either csv_filename, df or hdf5_filename must be provided.")
 
         # Panels label
-        self.plane_labels = plane_labels if plane_labels is not None else self.get_panels_labels_from_df(self._df)
+        if hdf5_filename is None:
+            self.plane_labels = plane_labels if plane_labels is not None else self.get_panels_labels_from_df(self._df)
+
+        # Check the plane-wise detector parameters
+        self.detector_response.get_plane_wise_params(self.n_panels)
 
         # Filter events with E out of energy_range
         if self.energy_range is not None:
             energy_mask = (self.E > self.energy_range[0]) & (self.E < self.energy_range[-1])
             self._filter_events(energy_mask)
 
-        # Detector efficiency
-        if (self.efficiency < 0.0) | (self.efficiency > 1.0):
-            raise ValueError("Panels efficiency must be in [0., 1.].")
-
     def __repr__(self) -> str:
         description = f"Collection of hits from {self.n_mu:,d} muons " f"on {self.n_panels} detector panels"
 
         if self.spatial_res.sum() > 0:
-            res = ", ".join(f"{value:.2f}" for value in self.spatial_res.detach().cpu().numpy())
+            res = ", ".join(f"{value:.2f}" for value in self.spatial_res.detach().cpu().numpy().flatten())
             description += f",\n with spatial resolution [{res}] mm along x, y, z"
 
-        if self.efficiency < 1.0:
+        if isinstance(self.efficiency, Tensor):
+            eff = ", ".join(f"{value * 100:.1f}" for value in self.efficiency.detach().cpu().numpy())
+            description += f", with panels efficiency of [{eff}]%"
+        elif self.efficiency < 1.0:
             description += f", with panel efficiency of {self.efficiency * 100:.1f}%"
 
         description += "."
@@ -158,38 +304,93 @@ class Hits:
         return pd.read_csv(csv_filename)
 
     @staticmethod
-    def get_hits_from_df(df: pd.DataFrame, plane_labels: Optional[Tuple[int, ...]] = None) -> Tensor:
+    def get_hits_from_df(
+        df: pd.DataFrame,
+        plane_labels: Optional[Tuple[int, ...]] = None,
+        dtype: torch.dtype = dtype_hit,
+        device: torch.device = DEVICE,
+    ) -> Tensor:
         r"""
         Extracts hits data from a DataFrame and returns it as a Tensor.
 
+        The X, Y, Z columns of all the planes are read at once, reshaped into (3, n_plane, n_mu)
+        and sent to `device` with a single (pinned memory) transfer.
+
         IMPORTANT:
             The DataFrame must have the following columns:
             "X0, Y0, Z0, ..., Xi, Yi, Zi", where Xi is the muon hit x position on plane i.
 
         Args:
             df (pd.DataFrame): DataFrame containing the hit data.
+            plane_labels (Optional[Tuple[int, ...]]): The labels of the planes to load. If None, all planes are loaded.
+            dtype (torch.dtype): The data type of the hits. A lower precision (e.g. torch.float16) reduces
+                the memory footprint and the transfer size. Defaults to dtype_hit.
+            device (torch.device): The device where the hits are sent. Defaults to DEVICE.
 
         Returns:
             hits (Tensor): Hits, with size (3, n_plane, n_mu)
         """
-        # Extract plane count and validate columns
-
-        n_plane = len(plane_labels)  # type: ignore
-        hits = torch.zeros((3, n_plane, len(df)), dtype=dtype_hit, device=DEVICE)
-
-        for i, plane in enumerate(plane_labels):  # type: ignore
-            x_col = f"X{plane}"
-            y_col = f"Y{plane}"
-            z_col = f"Z{plane}"
+        plane_labels = plane_labels if plane_labels is not None else Hits.get_panels_labels_from_df(df)
 
+        # Validate columns
+        for plane in plane_labels:
+            x_col, y_col, z_col = f"X{plane}", f"Y{plane}", f"Z{plane}"
             if x_col not in df or y_col not in df or z_col not in df:
                 raise KeyError(f"Missing columns for plane {plane}: {x_col}, {y_col}, {z_col}")
 
-            hits[0, i, :] = torch.tensor(df[x_col].values, dtype=dtype_hit, device=DEVICE)
-            hits[1, i, :] = torch.tensor(df[y_col].values, dtype=dtype_hit, device=DEVICE)
-            hits[2, i, :] = torch.tensor(df[z_col].values, dtype=dtype_hit, device=DEVICE)
+        # Columns ordered as X0, ..., Xi, Y0, ..., Yi, Z0, ..., Zi
+        cols = [f"{coord}{plane}" for coord in ("X", "Y", "Z") for plane in plane_labels]
+
+        # (mu, 3 * n_plane) -> (3, n_plane, mu)
+        hits = torch.from_numpy(df[cols].to_numpy().T).to(dtype).contiguous().reshape(3, len(plane_labels), len(df))
+
+        if torch.device(device).type == "cuda":
+            return hits.pin_memory().to(device, non_blocking=True)
+        return hits.to(device)
+
+    @staticmethod
+    def get_hits_energy_from_hdf5(hdf5_filename: str, plane_labels: Optional[Tuple[int, ...]] = None) -> Tuple[Tensor, Tensor, Tuple[int, ...]]:
+        r"""
+        Memory-maps the hits and energy saved in a HDF5 file by `convert_csv_to_hdf5`.
+
+        The returned tensors share memory with the file, without copy, as long as the datasets
+        are stored contiguously and the selected planes are consecutive. Otherwise, the data is loaded in memory.
+
+        Args:
+            hdf5_filename (str): The path to the HDF5 file.
+            plane_labels (Optional[Tuple[int, ...]]): The labels of the planes to load. If None, all planes are loaded.
+
+        Returns:
+            hits (Tensor): Hits in mm, with size (3, n_plane, n_mu).
+            E (Tensor): Muons energy, with size (n_mu).
+            plane_labels (Tuple[int, ...]): The labels of the loaded planes.
+        """
+        if not Path(hdf5_filename).exists():
+            raise FileNotFoundError(f"The file {hdf5_filename} does not exist.")
+
+        def memmap(dataset: h5py.Dataset) -> np.ndarray:
+            offset = dataset.id.get_offset()
+            if offset is None:  # Chunked, compressed or empty dataset
+                return dataset[...]
+            return np.memmap(hdf5_filename, dtype=dataset.dtype, mode="c", offset=offset, shape=dataset.shape)
+
+        with h5py.File(hdf5_filename, "r") as f:
+            file_plane_labels = tuple(int(label) for label in f.attrs["plane_labels"])
+            hits, E = memmap(f["hits"]), memmap(f["E"])
 
-        return hits
+        plane_labels = plane_labels if plane_labels is not None else file_plane_labels
+
+        missing_planes = [plane for plane in plane_labels if plane not in file_plane_labels]
+        if len(missing_planes) > 0:
+            raise KeyError(f"Missing planes {missing_planes} in {hdf5_filename}")
+
+        planes = [file_plane_labels.index(plane) for plane in plane_labels]
+        if planes == list(range(planes[0], planes[0] + len(planes))):
+            hits = hits[:, planes[0] : planes[0] + len(planes)]
+        else:
+            hits = hits[:, planes]
+
+        return torch.from_numpy(hits).to(DEVICE), torch.from_numpy(E).to(DEVICE), tuple(plane_labels)
 
     @staticmethod
     def get_energy_from_df(df: pd.DataFrame) -> Tensor:
@@ -238,45 +439,43 @@ class Hits:
 
         Args:
             gen_hits (Tensor): The generated level hits, with size (3, n_plane, mu).
-            spatial_res (Tensor): The spatial resolution along x,y,z with size (3).
+            spatial_res (Tensor): The spatial resolution along x,y,z with size (3), or (n_plane, 3).
 
         Returns:
             reco_hits (Tensor): The reconstructed hits, with size (3, n_plane, mu)
         """
-        reco_hits = torch.ones_like(gen_hits, dtype=dtype_hit, device=DEVICE) * gen_hits
-
-        for i in range(spatial_res.size()[0]):
-            if spatial_res[i] != 0.0:
-                reco_hits[i] += torch.normal(
-                    mean=0.0,
-                    std=torch.ones_like(reco_hits[i]) * spatial_res[i],
-                )
-
-        return reco_hits
+        return DetectorResponse(spatial_res=spatial_res).simulate(gen_hits)[0]
 
     @staticmethod
-    def get_muon_wise_eff(efficiency: float, gen_hits: Tensor) -> Tensor:
+    def get_muon_wise_eff(efficiency: Union[float, Tensor], gen_hits: Tensor) -> Tensor:
         r"""
         Returns a muon-wise efficiency based on the panels' efficiency.
         The muon-wise efficiency is either 0 (muon not detected) or 1 (muon detected).
 
-        IMPORTANT: Currently, all panels are assumed to have the same efficency.
-        Can be improved by setting the effieicy as a tensor with size n_panels instead of a float.
-
         Args:
-            efficiency (float): The panels' efficency. Must be between 0 and 1.
+            efficiency (Union[float, Tensor]): The panels' efficency, as a float or with size (n_plane). Must be between 0 and 1.
             gen_hits (Tensor): The generated_hits.
 
         Returns:
             muon_wise_eff (Tensor): The muon-wise efficiency.
         """
 
-        # Probability for a muon to leave hit on a detector panel
-        p = torch.rand(gen_hits.size()[1:], device=DEVICE, dtype=dtype_hit)
+        return DetectorResponse(efficiency=efficiency).simulate(gen_hits)[1]
+
+    def simulate_detector_response(self, detector_response: Optional[DetectorResponse] = None) -> None:
+        r"""
+        Simulates the reconstructed hits and the hits efficiency from the generated hits.
+
+        If the reconstructed hits were already simulated, they are overwritten in-place, such that a new
+        detector response (e.g. a new spatial resolution) is simulated without reloading or copying the generated hits.
 
-        muon_wise_eff = torch.where(p < efficiency, 1, 0)
+        Args:
+            detector_response (Optional[DetectorResponse]): The new detector response. If None, the current one is used.
+        """
+        if detector_response is not None:
+            self.detector_response = detector_response
 
-        return muon_wise_eff
+        self._reco_hits, self._hits_eff = self.detector_response.simulate(self.gen_hits, reco_hits=self._reco_hits, hits_eff=self._hits_eff)
 
     def _filter_events(self, mask: Tensor) -> None:
         r"""
@@ -287,6 +486,7 @@ class Hits:
         """
 
         self.reco_hits = self.reco_hits[:, :, mask]
+        self._hits_eff = self.hits_eff[:, mask]
         self.gen_hits = self.gen_hits[:, :, mask]
         self.E = self.E[mask]
 
@@ -403,11 +603,9 @@ class Hits:
         r"""
         Reconstructed hits data as Tensor with size (3, n_plane, mu).
         """
-        if self.spatial_res is None:
-            return self.gen_hits
-        elif self._reco_hits is None:
-            self._reco_hits = self.get_reco_hits_from_gen_hits(gen_hits=self.gen_hits, spatial_res=self.spatial_res)
-        return self._reco_hits
+        if self._reco_hits is None:
+            self.simulate_detector_response()
+        return self._reco_hits  # type: ignore
 
     @reco_hits.setter
     def reco_hits(self, value: Tensor) -> None:
@@ -416,8 +614,23 @@ class Hits:
     @property
     def hits_eff(self) -> Tensor:
         if self._hits_eff is None:
-            self._hits_eff = self.get_muon_wise_eff(self.efficiency, self.gen_hits)
-        return self._hits_eff
+            self.simulate_detector_response()
+        return self._hits_eff  # type: ignore
+
+    @property
+    def spatial_res(self) -> Tensor:
+        r"""
+        The spatial resolution of the detector panels along x, y, z in mm, with size (3) or (n_plane, 3).
+        """
+        return self.detector_response.spatial_res
+
+    @property
+    def efficiency(self) -> Union[float, Tensor]:
+        r"""
+        The efficiency of the detector panels, as a float if identical for all panels, else with size (n_plane).
+        """
+        efficiency = self.detector_response.efficiency
+        return efficiency.item() if efficiency.ndim == 0 else efficiency
 
 
 def filter_nans(hits_in: Hits, hits_out: Hits) -> None:
@@ -451,3 +664,93 @@ def filter_nans(hits_in: Hits, hits_out: Hits) -> None:
 
     hits_in._filter_events(mask_nan)
     hits_out._filter_events(mask_nan)
+
+
+def iter_hits_from_csv(
+    csv_filename: str,
+    chunk_size: int = 1_000_000,
+    plane_labels: Optional[Tuple[int, ...]] = None,
+    spatial_res: Optional[Union[Tensor, Tuple[float, float, float]]] = None,
+    energy_range: Optional[Tuple[float, float]] = None,
+    efficiency: Union[float, Tensor] = 1.0,
+    input_unit: str = "mm",
+    seed: Optional[int] = None,
+) -> Iterator[Hits]:
+    """
+    Reads the CSV file by chunks of `chunk_size` muons, and yields one `Hits` instance per chunk.
+
+    The energy filtering, spatial resolution and detector efficiency are applied chunk by chunk,
+    such that the full CSV file is never held in memory.
+
+    Args:
+        csv_filename (str): The file path to the CSV containing hit and energy data.
+        chunk_size (int): The number of muons (rows of the CSV file) per chunk.
+        plane_labels (Optional[Tuple[int, ...]]): The plane labels to include from the data.
+        spatial_res (Optional[Union[Tensor, Tuple[float, float, float]]]): The spatial resolution of detector panels along the x, y, and z axes,
+            with size (3) or (n_plane, 3).
+        energy_range (Optional[Tuple[float, float]]): The minimum and maximum energy of the muons to include.
+        efficiency (Union[float, Tensor]): The efficiency factor of the detector panels, as a float or with size (n_plane).
+        input_unit (str): The unit of measurement for the input data (e.g., "mm", "cm").
+        seed (Optional[int]): The seed used to simulate the detector response of the first chunk, the i-th chunk
+            using `seed + i`. If None, the seeds are drawn from the global random number generator.
+
+    Example Usage:
+        >>> hits_chunks = iter_hits_from_csv("hits.csv", chunk_size=100_000, plane_labels=(0, 1, 2))
+        >>> tracks = Tracking(label="above", hits_chunks=hits_chunks)
+    """
+    if not Path(csv_filename).exists():
+        raise FileNotFoundError(f"The file {csv_filename} does not exist.")
+
+    for i, df in enumerate(pd.read_csv(csv_filename, chunksize=chunk_size)):
+        yield Hits(
+            df=df,
+            plane_labels=plane_labels,
+            spatial_res=spatial_res,
+            energy_range=energy_range,
+            efficiency=efficiency,
+            input_unit=input_unit,
+            seed=seed + i if seed is not None else None,
+        )
+
+
+def convert_csv_to_hdf5(csv_filename: str, hdf5_filename: str, input_unit: str = "mm", chunk_size: int = 1_000_000) -> None:
+    """
+    Converts a hits CSV file with columns "X0, Y0, Z0, ..., Xi, Yi, Zi, E" into a HDF5 file
+    that can be memory-mapped by `Hits(hdf5_filename=...)`.
+
+    The HDF5 file contains two contiguous datasets:
+        - `hits` (float32) with size (3, n_plane, n_mu), in mm.
+        - `E` (float32) with size (n_mu).
+    The labels of the planes are saved as the `plane_labels` attribute.
+
+    Args:
+        csv_filename (str): The file path to the CSV containing hit and energy data.
+        hdf5_filename (str): The file path of the HDF5 file to create.
+        input_unit (str): The unit of measurement for the input data (e.g., "mm", "cm").
+        chunk_size (int): The number of muons read from the CSV file at once.
+    """
+    if not Path(csv_filename).exists():
+        raise FileNotFoundError(f"The file {csv_filename} does not exist.")
+
+    if input_unit not in allowed_d_units:
+        raise ValueError("Input unit must be mm, cm, dm or m")
+
+    # The number of muons is counted as parsed by pandas (e.g. without blank lines), such that the datasets are contiguous
+    n_mu = sum(len(df) for df in pd.read_csv(csv_filename, usecols=["E"], chunksize=chunk_size))
+    plane_labels = Hits.get_panels_labels_from_df(pd.read_csv(csv_filename, nrows=0))
+
+    with h5py.File(hdf5_filename, "w") as f:
+        f.attrs["plane_labels"] = plane_labels
+        hits_dataset = f.create_dataset("hits", shape=(3, len(plane_labels), n_mu), dtype=np.float32)
+        E_dataset = f.create_dataset("E", shape=(n_mu,), dtype=np.float32)
+
+        first = 0
+        for df in pd.read_csv(csv_filename, chunksize=chunk_size):
+            if len(df) == 0:  # Header without data rows
+                continue
+            last = first + len(df)
+            hits_dataset[:, :, first:last] = (Hits.get_hits_from_df(df, plane_labels, device=torch.device("cpu")) * Hits._unit_coef[input_unit]).numpy()
+            E_dataset[first:last] = Hits.get_energy_from_df(df).detach().cpu().numpy()
+            first = last
+
+    print(f"Hits from {csv_filename} saved at {hdf5_filename}")
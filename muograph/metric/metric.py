@@ -180,6 +180,20 @@ class PocaErrorMetrics:
         self.poca._filter_pocas(self.masks[1])
         self.poca.tracks._filter_muons(self.masks[1])
 
+    def get_quality_mask(self, dca_range: Tuple[float, float] = (0.0, math.inf), use_quality_flag: bool = True) -> Tensor:
+        """
+        Computes the mask of the compatible events passing the closest approach quality cuts in both POCA objects,
+        e.g to be used as `mask` in `plot_distance`. See `POCA.get_quality_mask`.
+
+        Args:
+            dca_range (Tuple[float, float]): The range of accepted distance of closest approach, in [mm].
+            use_quality_flag (bool): If True, events with an opening angle below `min_opening_angle` are rejected.
+
+        Returns:
+            Tensor: Boolean tensor of shape (N,).
+        """
+        return self.poca_ref.get_quality_mask(dca_range, use_quality_flag) & self.poca.get_quality_mask(dca_range, use_quality_flag)
+
     def plot_distance(self, mask: Optional[Tensor] = None, figname: Optional[str] = None, title: Optional[str] = None) -> None:
         """
         Plots the distribution of distances between the POCA points of two POCA objects.
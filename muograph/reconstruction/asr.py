@@ -1,6 +1,7 @@
-from typing import Optional, Tuple, Dict, Union, List
+from typing import Optional, Tuple, Dict, Union, List, Callable
 import numpy as np
 from functools import partial
+from copy import copy
 import math
 import torch
 from torch import Tensor
@@ -10,12 +11,15 @@ import h5py
 import matplotlib.pyplot as plt
 
 from muograph.utils.save import AbsSave
+from muograph.utils.device import DEVICE
+from muograph.utils.tools import segment_reduce
 from muograph.tracking.tracking import TrackingMST
 from muograph.volume.volume import Volume
 from muograph.reconstruction.voxel_inferer import AbsVoxelInferer
+from muograph.reconstruction.poca import POCA
 from muograph.plotting.params import configure_plot_theme, font, tracking_figsize
 
-value_type = Union[partial, Tuple[float, float], bool]
+value_type = Union[partial, Callable, Tuple[float, float], bool]
 
 
 r"""
@@ -28,7 +32,7 @@ https://iopscience.iop.org/article/10.1088/1748-0221/9/11/P11019)).
 
 
 class ASR(AbsSave, AbsVoxelInferer):
-    _triggered_voxels: Optional[List[np.ndarray]] = None
+    _triggered_voxels_csr: Optional[Tuple[Tensor, Tensor]] = None  # (mu + 1), (n_triggered_vox)
     _n_mu_per_vox: Optional[Tensor] = None  # (Nx, Ny, Nz)
     _recompute_preds = True
 
@@ -37,6 +41,8 @@ class ASR(AbsSave, AbsVoxelInferer):
         "p_range": (0.0, 10000000),  # MeV
         "dtheta_range": (0.0, math.pi / 3),
         "use_p": False,
+        "dca_range": (0.0, math.inf),  # mm
+        "use_quality_flag": False,
     }
 
     _vars_to_save = ["triggered_voxels"]
@@ -49,6 +55,7 @@ class ASR(AbsSave, AbsVoxelInferer):
         tracking: TrackingMST,
         output_dir: Optional[str] = None,
         triggered_vox_file: Optional[str] = None,
+        poca: Optional[POCA] = None,
     ) -> None:
         r"""Initializes the ASR object with either instances of the `Volume` and `TrackingMST` class
 
@@ -59,18 +66,21 @@ class ASR(AbsSave, AbsVoxelInferer):
             as a hdf5 file. Defaults to None.
             triggered_vox_file (Optional[str], optional): Path to a hdf5 file where to load the triggered voxels
             from. Defaults to None.
+            poca (Optional[POCA], optional): POCA computed from `tracking`. If provided, muons with a POCA point
+            failing the closest approach quality cuts (`dca_range`, `use_quality_flag`) are rejected. Defaults to None.
         """
 
         AbsSave.__init__(self, output_dir=output_dir)
         AbsVoxelInferer.__init__(self, voi=voi, tracking=tracking)
+        self.poca = poca
 
         if triggered_vox_file is None:
             if self.output_dir is not None:
-                self.save_triggered_vox(self.triggered_voxels, self.output_dir, "triggered_voxels.hdf5")
+                self.save_triggered_vox(self.triggered_voxels_csr, self.voi, self.output_dir, "triggered_voxels.hdf5")
 
         elif triggered_vox_file is not None:
             self.tracks = tracking
-            self.triggered_voxels = self.load_triggered_vox(triggered_vox_file)
+            self.triggered_voxels_csr = self.load_triggered_vox(triggered_vox_file, self.voi)
 
     def __repr__(self) -> str:
         description = "ASR algorithm using a c"
@@ -78,26 +88,75 @@ class ASR(AbsSave, AbsVoxelInferer):
         return description + description_tracks
 
     @staticmethod
-    def save_triggered_vox(triggered_voxels: List[np.ndarray], directory: Path, filename: str) -> None:
+    def save_triggered_vox(
+        triggered_voxels_csr: Tuple[Tensor, Tensor],
+        voi: Volume,
+        directory: Path,
+        filename: str,
+        compression: Optional[str] = None,
+    ) -> None:
         r"""
         Method for saving triggered voxel as a hdf5 file.
+
+        The triggered voxels are saved in a CSR layout, as two datasets:
+            - `offsets` (int64) with size (n_mu + 1).
+            - `voxel_ids` (int16 or int32, depending on the number of voxels) with size (n_triggered_vox).
+
+        Args:
+            triggered_voxels_csr (Tuple[Tensor, Tensor]): The triggered voxels offsets and flat voxel indices.
+            voi (Volume): Instance of the volume class.
+            directory (Path): The directory where to save the file.
+            filename (str): The name of the file.
+            compression (Optional[str]): The hdf5 compression filter (e.g "gzip", "lzf") applied to chunked datasets.
+            If None, the datasets are stored contiguously, without compression. Defaults to None.
         """
+        offsets, voxel_ids = triggered_voxels_csr
+        voxel_dtype = np.int16 if math.prod(voi.n_vox_xyz) <= np.iinfo(np.int16).max else np.int32
+
         with h5py.File(directory / filename, "w") as f:
             print("Saving trigerred voxels to {}".format(directory / filename))
-            for i, indices in enumerate(progress_bar(triggered_voxels)):
-                f.create_dataset("{}".format(i), data=indices)
+            f.attrs["n_vox_xyz"] = voi.n_vox_xyz
+            f.create_dataset("offsets", data=offsets.detach().cpu().numpy().astype(np.int64), compression=compression)
+            f.create_dataset("voxel_ids", data=voxel_ids.detach().cpu().numpy().astype(voxel_dtype), compression=compression)
         f.close()
 
     @staticmethod
-    def load_triggered_vox(triggered_vox_file: str) -> List[np.ndarray]:
+    def load_triggered_vox(triggered_vox_file: str, voi: Volume, muon_range: Optional[Tuple[int, int]] = None) -> Tuple[Tensor, Tensor]:
         r"""
         Method for loading triggered voxel from hdf5 file.
+
+        Only the requested range of muons is read from the file. Files with one dataset per muon,
+        as written by previous versions of muograph, are loaded entirely and converted to the CSR layout.
+
+        Args:
+            triggered_vox_file (str): Path to the hdf5 file.
+            voi (Volume): Instance of the volume class.
+            muon_range (Optional[Tuple[int, int]]): The indices of the first and last (excluded) muons to load.
+            If None, all muons are loaded. Defaults to None.
+
+        Returns:
+            triggered_voxels_csr (Tuple[Tensor, Tensor]): The triggered voxels offsets and flat voxel indices.
         """
         with h5py.File(triggered_vox_file, "r") as f:
             print("Loading trigerred voxels from {}".format(triggered_vox_file))
-            triggered_voxels = [f["{}".format(i)][:] for i, _ in enumerate(progress_bar(f.keys()))]
+
+            if "offsets" not in f:
+                triggered_voxels = [f["{}".format(i)][:] for i, _ in enumerate(progress_bar(f.keys()))]
+                start, end = muon_range if muon_range is not None else (0, len(triggered_voxels))
+                return ASR.triggered_voxels_list_to_csr(triggered_voxels[start:end], voi)
+
+            if tuple(f.attrs["n_vox_xyz"]) != tuple(voi.n_vox_xyz):
+                raise ValueError(f"Triggered voxels were computed for {tuple(f.attrs['n_vox_xyz'])} voxels, but the volume has {voi.n_vox_xyz} voxels.")
+
+            start, end = muon_range if muon_range is not None else (0, len(f["offsets"]) - 1)
+            offsets = f["offsets"][start : end + 1]
+            voxel_ids = f["voxel_ids"][offsets[0] : offsets[-1]]
         f.close()
-        return triggered_voxels
+
+        return (
+            torch.tensor(offsets - offsets[0], dtype=torch.int64, device=DEVICE),
+            torch.tensor(voxel_ids, dtype=torch.int64, device=DEVICE),
+        )
 
     @staticmethod
     def _compute_xyz_in_out(
@@ -194,125 +253,86 @@ class ASR(AbsSave, AbsVoxelInferer):
         return xyz_discrete_in, xyz_discrete_out
 
     @staticmethod
-    def _find_sub_volume(
+    def _find_triggered_voxels(
         voi: Volume,
-        xyz_in_voi: Tensor,
-        xyz_out_voi: Tensor,
-    ) -> List[List[Tensor]]:
+        xyz_discrete_in: Tensor,
+        xyz_discrete_out: Tensor,
+        first_muon: int = 0,
+    ) -> Tensor:
         r"""
-        Find the xy voxel indices of the sub-volume which contains both incoming and outgoing tracks.
+        For a chunk of muons, find the voxels triggered by both the INCOMING and OUTGOING tracks.
+
+        The voxel indices of all the discretized track points are computed at once. Each triggered voxel is
+        encoded as a key `muon_index * n_vox + flat_voxel_index`, and the sorted keys of the incoming and outgoing
+        tracks are intersected.
 
         Args:
              - voi (Volume): Instance of the volume class.
-             - xyz_in_voi (Tensor): The location of muons when entering/exiting the volume for the incoming track.
-             - xyz_out_voi (Tensor): The location of muons when entering/exiting the volume for the outgoing track.
+             - xyz_discrete_in (Tensor): The discretized incoming tracks with size (3, n_points, n_mu)
+             - xyz_discrete_out (Tensor): The discretized outgoing tracks with size (3, n_points, n_mu)
+             - first_muon (int): The index of the first muon of the chunk.
 
         Returns:
-             - sub_vol_indices_min_max (List[Tensor]): List containing the voxel indices.
+             - keys (Tensor): The sorted keys of the triggered voxels, with size (n_triggered_vox).
         """
-        # Precompute voxel boundaries for simpler condition checks
-        voxel_edges_x_min = voi.voxel_edges[:, :, 0, 0, 0]
-        voxel_edges_x_max = voi.voxel_edges[:, :, 0, 1, 0]
-        voxel_edges_y_min = voi.voxel_edges[:, :, 0, 0, 1]
-        voxel_edges_y_max = voi.voxel_edges[:, :, 0, 1, 1]
-
-        # Get the min, max x and y coordinnates of the tracks entering the voi
-        xyz_min = torch.min(torch.cat([xyz_in_voi, xyz_out_voi], dim=1), dim=1).values
-        xyz_max = torch.max(torch.cat([xyz_in_voi, xyz_out_voi], dim=1), dim=1).values
-
-        x_min, y_min = xyz_min[:, 0], xyz_min[:, 1]
-        x_max, y_max = xyz_max[:, 0], xyz_max[:, 1]
-
-        print("\nSub-volumes")
-        sub_vol_indices_min_max = []
-        n_mu = xyz_in_voi.size(0)
-
-        for event in progress_bar(range(n_mu)):
-            # Filter valid voxels for this event
-            condition = (
-                (voxel_edges_x_min < x_max[event])
-                & (voxel_edges_x_max > x_min[event])
-                & (voxel_edges_y_min < y_max[event])
-                & (voxel_edges_y_max > y_min[event])
-            )
+        n_vox = math.prod(voi.n_vox_xyz)
+        n_points, n_mu = xyz_discrete_in.size(1), xyz_discrete_in.size(2)
+
+        # Muon index of each discretized point, with points ordered as (n_points, n_mu)
+        muon_indices = torch.arange(first_muon, first_muon + n_mu, device=xyz_discrete_in.device).repeat(n_points)
 
-            # Get the valid voxels indices
-            sub_vol_indices = condition.nonzero()
+        keys_in_out = []
+        for xyz_discrete in (xyz_discrete_in, xyz_discrete_out):
+            indices = voi.get_voxel_indices(xyz_discrete.permute(1, 2, 0).reshape(-1, 3))
+            mask = (indices >= 0).all(dim=-1)
+            keys_in_out.append(torch.unique(muon_indices[mask] * n_vox + voi.get_flat_voxel_indices(indices[mask])))
 
-            # If sub_vol_indices is non-empty, determine bounds
-            if sub_vol_indices.numel() > 0:
-                sub_vol_indices_min_max.append([sub_vol_indices[0], sub_vol_indices[-1]])
+        keys_in, keys_out = keys_in_out
+        if keys_out.numel() == 0:
+            return keys_out
 
-            else:
-                sub_vol_indices_min_max.append([])
+        # Keep the keys of the incoming tracks also found in the sorted keys of the outgoing tracks
+        match = keys_out[torch.searchsorted(keys_out, keys_in).clamp(max=keys_out.numel() - 1)] == keys_in
 
-        return sub_vol_indices_min_max
+        return keys_in[match]
 
     @staticmethod
-    def _find_triggered_voxels(
-        voi: Volume,
-        sub_vol_indices_min_max: List[List[Tensor]],
-        xyz_discrete_in: Tensor,
-        xyz_discrete_out: Tensor,
-    ) -> List[np.ndarray]:
+    def triggered_voxels_csr_to_list(triggered_voxels_csr: Tuple[Tensor, Tensor], voi: Volume) -> List[np.ndarray]:
         r"""
-        For each muon incoming and outgoing tracks, find the associated triggered voxels.
-        Only voxels triggered by both INCOMING and OUTGOING tracks are kept.
+        Converts the triggered voxels from the CSR format to a list of np.ndarray,
+        where triggered_voxels[i] contains the xyz indices of the voxels triggered by muon i.
 
         Args:
+             - triggered_voxels_csr (Tuple[Tensor, Tensor]): The triggered voxels offsets and flat voxel indices.
              - voi (Volume): Instance of the volume class.
-             - sub_vol_indices_min_max (List[Tensor]):  the xy voxel indices of the sub-volume
-             which contains both incoming and outgoing tracks.
-             - xyz_discrete_in (Tensor): The discretized incoming tracks with size (3, n_points, n_mu)
-             - xyz_discrete_out (Tensor): The discretized outgoing tracks with size (3, n_points, n_mu)
 
         Returns:
-             - triggererd_voxels (List[Tensor]): List with len() = n_mu, containing the indices
-             of the triggered voxels as a Tensor (with size [n_triggered_vox,3])
+             - triggered_voxels (List[np.ndarray]): the list of triggered voxels.
         """
+        offsets, voxel_ids = triggered_voxels_csr
+        xyz_indices = voi.unflatten_voxel_indices(voxel_ids).detach().cpu().numpy()
+        return np.split(xyz_indices, offsets[1:-1].detach().cpu().numpy())
 
-        triggered_voxels = []
-        n_mu = xyz_discrete_in.size(2)
+    @staticmethod
+    def triggered_voxels_list_to_csr(triggered_voxels: List[np.ndarray], voi: Volume) -> Tuple[Tensor, Tensor]:
+        r"""
+        Converts the triggered voxels from a list of np.ndarray to the CSR format.
 
-        print("\nVoxel triggering")
-        for event in progress_bar(range(n_mu)):
-            event_indices = sub_vol_indices_min_max[event]
-
-            if len(sub_vol_indices_min_max[event]) != 0:
-                ix_min, iy_min = event_indices[0][0], event_indices[0][1]
-                ix_max, iy_max = event_indices[1][0], event_indices[1][1]
-
-                sub_voi_edges = voi.voxel_edges[ix_min : ix_max + 1, iy_min : iy_max + 1]
-                sub_voi_edges = sub_voi_edges[:, :, :, :, None, :].expand(-1, -1, -1, -1, xyz_discrete_out.size()[1], -1)
-
-                xyz_in_event = xyz_discrete_in[:, :, event]
-                xyz_out_event = xyz_discrete_out[:, :, event]
-
-                sub_mask_in = (
-                    (sub_voi_edges[:, :, :, 0, :, 0] < xyz_in_event[0])
-                    & (sub_voi_edges[:, :, :, 1, :, 0] > xyz_in_event[0])
-                    & (sub_voi_edges[:, :, :, 0, :, 1] < xyz_in_event[1])
-                    & (sub_voi_edges[:, :, :, 1, :, 1] > xyz_in_event[1])
-                    & (sub_voi_edges[:, :, :, 0, :, 2] < xyz_in_event[2])
-                    & (sub_voi_edges[:, :, :, 1, :, 2] > xyz_in_event[2])
-                )
+        Args:
+             - triggered_voxels (List[np.ndarray]): the list of triggered voxels.
+             - voi (Volume): Instance of the volume class.
 
-                sub_mask_out = (
-                    (sub_voi_edges[:, :, :, 0, :, 0] < xyz_out_event[0])
-                    & (sub_voi_edges[:, :, :, 1, :, 0] > xyz_out_event[0])
-                    & (sub_voi_edges[:, :, :, 0, :, 1] < xyz_out_event[1])
-                    & (sub_voi_edges[:, :, :, 1, :, 1] > xyz_out_event[1])
-                    & (sub_voi_edges[:, :, :, 0, :, 2] < xyz_out_event[2])
-                    & (sub_voi_edges[:, :, :, 1, :, 2] > xyz_out_event[2])
-                )
+        Returns:
+             - triggered_voxels_csr (Tuple[Tensor, Tensor]): The triggered voxels offsets and flat voxel indices.
+        """
+        counts = torch.tensor([len(vox) for vox in triggered_voxels], dtype=torch.int64, device=DEVICE)
+        offsets = torch.zeros(len(triggered_voxels) + 1, dtype=torch.int64, device=DEVICE)
+        offsets[1:] = torch.cumsum(counts, dim=0)
+
+        xyz_indices = np.concatenate([np.reshape(vox, (-1, 3)) for vox in triggered_voxels]) if len(triggered_voxels) > 0 else np.empty((0, 3))
+        voxel_ids = voi.get_flat_voxel_indices(torch.tensor(xyz_indices, dtype=torch.int64, device=DEVICE))
 
-                vox_list = (sub_mask_in & sub_mask_out).nonzero()[:, :-1].unique(dim=0)
-                vox_list[:, 0] += ix_min
-                vox_list[:, 1] += iy_min
-                triggered_voxels.append(vox_list.detach().cpu().numpy())
-            else:
-                triggered_voxels.append(np.empty([0, 3]))
-        return triggered_voxels
+        return offsets, voxel_ids
 
     @staticmethod
     def get_asr_name(
@@ -348,11 +368,13 @@ class ASR(AbsSave, AbsVoxelInferer):
         voi: Volume,
         theta_xy_in: Tuple[Tensor, Tensor],
         theta_xy_out: Tuple[Tensor, Tensor],
-    ) -> List[np.ndarray]:
+        chunk_size: int = 10_000,
+    ) -> Tuple[Tensor, Tensor]:
         """
-        Gets the `xyz` indices of the voxels along each muon path, as a list of np.ndarray.
-        e.g triggered_voxels[i] is an np.ndarray with shape (n, 3) where n is the number
-        of voxels along the muon path for the muon event i.
+        Gets the voxels along each muon path, in a CSR-like format (offsets, voxel_ids):
+        the flat indices of the voxels triggered by muon i are voxel_ids[offsets[i] : offsets[i + 1]].
+
+        Muons are processed by chunks of `chunk_size` events.
 
         Args:
              - points_in (Tensor): Points on incoming muon tracks.
@@ -360,52 +382,63 @@ class ASR(AbsSave, AbsVoxelInferer):
              - voi (Volume): Instance of the volume class.
              - theta_xy_in (Tensor): The incoming projected zenith angle in XZ and YZ plane.
              - theta_xy_out (Tensor): The outgoing projected zenith angle in XZ and YZ plane.
+             - chunk_size (int): The number of muons processed at once.
 
         Returns:
-             - triggered_voxels (List[np.ndarray]): the list of triggered voxels.
+             - offsets (Tensor): The offsets of each muon in `voxel_ids`, with size (n_mu + 1).
+             - voxel_ids (Tensor): The flat indices of the triggered voxels, sorted by muon, with size (n_triggered_vox).
         """
-        xyz_in_voi, xyz_out_voi = ASR._compute_xyz_in_out(
-            points_in=points_in,
-            points_out=points_out,
-            voi=voi,
-            theta_xy_in=theta_xy_in,
-            theta_xy_out=theta_xy_out,
-        )
+        n_mu = points_in.size(0)
+        n_vox = math.prod(voi.n_vox_xyz)
 
-        xyz_discrete_in, xyz_discrete_out = ASR._compute_discrete_tracks(
-            voi=voi,
-            xyz_in_out_voi=(xyz_in_voi, xyz_out_voi),
-            theta_xy_in=theta_xy_in,
-            theta_xy_out=theta_xy_out,
-            n_points_per_z_layer=7,
-        )
+        print("\nVoxel triggering")
+        keys = []
+        for start in progress_bar(range(0, n_mu, chunk_size)):
+            end = min(start + chunk_size, n_mu)
+
+            theta_xy_in_chunk = (theta_xy_in[0][start:end], theta_xy_in[1][start:end])
+            theta_xy_out_chunk = (theta_xy_out[0][start:end], theta_xy_out[1][start:end])
+
+            xyz_in_voi, xyz_out_voi = ASR._compute_xyz_in_out(
+                points_in=points_in[start:end],
+                points_out=points_out[start:end],
+                voi=voi,
+                theta_xy_in=theta_xy_in_chunk,
+                theta_xy_out=theta_xy_out_chunk,
+            )
 
-        sub_vol_indices_min_max = ASR._find_sub_volume(voi=voi, xyz_in_voi=xyz_in_voi, xyz_out_voi=xyz_out_voi)
+            xyz_discrete_in, xyz_discrete_out = ASR._compute_discrete_tracks(
+                voi=voi,
+                xyz_in_out_voi=(xyz_in_voi, xyz_out_voi),
+                theta_xy_in=theta_xy_in_chunk,
+                theta_xy_out=theta_xy_out_chunk,
+                n_points_per_z_layer=7,
+            )
 
-        return ASR._find_triggered_voxels(
-            voi=voi,
-            sub_vol_indices_min_max=sub_vol_indices_min_max,
-            xyz_discrete_in=xyz_discrete_in,
-            xyz_discrete_out=xyz_discrete_out,
-        )
+            keys.append(
+                ASR._find_triggered_voxels(
+                    voi=voi,
+                    xyz_discrete_in=xyz_discrete_in,
+                    xyz_discrete_out=xyz_discrete_out,
+                    first_muon=start,
+                )
+            )
 
-    def get_xyz_voxel_pred(self) -> Tensor:
-        r"""
-        Computes the density predictions per voxel.
+        all_keys = torch.cat(keys) if len(keys) > 0 else torch.empty(0, dtype=torch.int64, device=points_in.device)
 
-        Returns:
-            vox_density_pred (Tensor): voxelwise density predictions
-        """
+        offsets = torch.zeros(n_mu + 1, dtype=torch.int64, device=all_keys.device)
+        offsets[1:] = torch.cumsum(torch.bincount(all_keys // n_vox, minlength=n_mu), dim=0)
 
-        score_list: List[List[List[List]]] = [
-            [[[] for _ in range(self.voi.n_vox_xyz[2])] for _ in range(self.voi.n_vox_xyz[1])] for _ in range(self.voi.n_vox_xyz[0])
-        ]
+        return offsets, all_keys % n_vox
 
-        if self._asr_params["use_p"]:
-            score = np.log(self.tracks.dtheta.detach().cpu().numpy() * self.tracks.E.detach().cpu().numpy())
-        else:
-            score = self.tracks.dtheta.detach().cpu().numpy()
+    def get_muon_mask(self) -> Tensor:
+        r"""
+        Computes the mask of the muons used for the density predictions, given the momentum and scattering angle cuts,
+        and the closest approach quality cuts if `poca` is provided.
 
+        Returns:
+            mask (Tensor): Boolean tensor with size (mu).
+        """
         mask_E = (self.tracks.E > self.asr_params["p_range"][0]) & (  # type: ignore
             self.tracks.E < self.asr_params["p_range"][1]  # type: ignore
         )
@@ -418,20 +451,49 @@ class ASR(AbsSave, AbsVoxelInferer):
         else:
             mask = mask_E
 
-        print("\nAssigning voxels score")
-        for i, vox_list in enumerate(progress_bar(self.triggered_voxels)):
-            for vox in vox_list:
-                if mask[i]:
-                    score_list[vox[0]][vox[1]][vox[2]].append(score[i])
+        if self.poca is not None:
+            mask &= self.get_poca_quality_mask()
+
+        return mask
+
+    def get_muon_scores(self) -> Tensor:
+        r"""
+        Computes the muon-wise scores reduced into the density predictions: the log of the scattering angle
+        times momentum if `use_p`, the scattering angle otherwise.
+
+        Returns:
+            scores (Tensor): The scores, with size (mu).
+        """
+        if self.asr_params["use_p"]:  # type: ignore
+            return torch.log(self.tracks.dtheta * self.tracks.E)
+        else:
+            return self.tracks.dtheta
+
+    def get_xyz_voxel_pred(self) -> Tensor:
+        r"""
+        Computes the density predictions per voxel.
+
+        Returns:
+            vox_density_pred (Tensor): voxelwise density predictions
+        """
+
+        score = self.get_muon_scores()
+
+        mask = self.get_muon_mask()
 
-        vox_density_preds = torch.zeros(tuple(self.voi.n_vox_xyz))
+        # (voxel, score) pairs of the selected muons
+        offsets, voxel_ids = self.triggered_voxels_csr
+        muon_ids = torch.repeat_interleave(torch.arange(len(offsets) - 1, device=offsets.device), offsets.diff())  # (n_triggered_vox)
+        mask_pairs = mask.to(muon_ids.device)[muon_ids]
 
-        print("Compute final score")
-        for i in progress_bar(range(self.voi.n_vox_xyz[0])):
-            for j in range(self.voi.n_vox_xyz[1]):
-                for k in range(self.voi.n_vox_xyz[2]):
-                    if score_list[i][j][k] != []:
-                        vox_density_preds[i, j, k] = self.asr_params["score_method"](score_list[i][j][k])  # type: ignore
+        print("\nCompute final score")
+        vox_density_preds = segment_reduce(
+            values=score.to(muon_ids.device)[muon_ids[mask_pairs]],
+            segment_ids=voxel_ids[mask_pairs],
+            n_segments=math.prod(self.voi.n_vox_xyz),
+            score_method=self.asr_params["score_method"],  # type: ignore
+            to_numpy=True,
+        ).reshape(self.voi.n_vox_xyz)
 
         if vox_density_preds.isnan().any():
             raise ValueError("Prediction contains NaN values")
@@ -443,17 +505,35 @@ class ASR(AbsSave, AbsVoxelInferer):
         else:
             return vox_density_preds
 
+    def get_poca_quality_mask(self) -> Tensor:
+        r"""
+        Computes the mask of the muons passing the closest approach quality cuts of `poca`.
+        Muons without POCA point (parallel tracks or POCA point outside the voi) are kept.
+
+        Returns:
+            mask (Tensor): Boolean tensor with size (mu).
+        """
+        quality_mask = self.poca.get_quality_mask(
+            dca_range=self.asr_params["dca_range"],  # type: ignore
+            use_quality_flag=self.asr_params["use_quality_flag"],  # type: ignore
+        )
+
+        positions = self.tracks.get_positions(self.poca.tracks)
+        if (positions < 0).any():
+            raise ValueError("The POCA muons must be selected from the ASR muons.")
+
+        mask = torch.ones(self.tracks.n_mu, dtype=torch.bool, device=quality_mask.device)
+        mask[positions[~quality_mask]] = False
+
+        return mask
+
     def get_n_mu_per_vox(
         self,
     ) -> Tensor:
-        n_mu_per_vox = torch.zeros(self.voi.n_vox_xyz)
+        _, voxel_ids = self.triggered_voxels_csr
+        n_mu_per_vox = torch.bincount(voxel_ids, minlength=math.prod(self.voi.n_vox_xyz))
 
-        all_voxels = np.vstack([ev for ev in self.triggered_voxels if len(ev) > 0])
-        unique_voxels, counts = np.unique(all_voxels, axis=0, return_counts=True)
-        for (x, y, z), count in zip(unique_voxels, counts):
-            n_mu_per_vox[x, y, z] += count
-
-        return n_mu_per_vox
+        return n_mu_per_vox.reshape(self.voi.n_vox_xyz).float()
 
     def plot_asr_event(self, event: int, proj: str = "XZ", figname: Optional[str] = None) -> None:
         configure_plot_theme(font=font)  # type: ignore
@@ -473,9 +553,13 @@ class ASR(AbsSave, AbsVoxelInferer):
         # Y span
         y_span = abs(points_in_np[event, 2] - points_out_np[event, 2])
 
+        # Triggered voxels xyz indices
+        offsets, voxel_ids = self.triggered_voxels_csr
+        event_voxels = self.voi.unflatten_voxel_indices(voxel_ids[offsets[event] : offsets[event + 1]]).detach().cpu().numpy()
+
         fig, ax = plt.subplots(figsize=tracking_figsize)
-        if self.triggered_voxels[event].shape[0] > 0:
-            n_trig_vox = f"# triggered voxels = {self.triggered_voxels[event].shape[0]}"
+        if event_voxels.shape[0] > 0:
+            n_trig_vox = f"# triggered voxels = {event_voxels.shape[0]}"
         else:
             n_trig_vox = "no voxels triggered"
         fig.suptitle(
@@ -492,8 +576,8 @@ class ASR(AbsSave, AbsVoxelInferer):
         )
 
         # Plot triggered voxels
-        if self.triggered_voxels[event].shape[0] > 0:
-            for i, vox_idx in enumerate(self.triggered_voxels[event]):
+        if event_voxels.shape[0] > 0:
+            for i, vox_idx in enumerate(event_voxels):
                 ix, iy = vox_idx[dim_map[proj]["x"]], vox_idx[2]
                 vox_x = self.voi.voxel_centers[ix, 0, 0, 0] if proj == "XZ" else self.voi.voxel_centers[0, ix, 0, 1]
                 label = "Triggered voxel" if i == 0 else None
@@ -559,6 +643,8 @@ class ASR(AbsSave, AbsVoxelInferer):
             - Dict containing the parameters name and value. Only parameters with
             valid name and non `None` values wil be updated.
         """
+        # Parameters are copied, such that the defaults shared by all instances are not modified
+        self._asr_params = copy(self._asr_params)
         for key in value.keys():
             if key in self._asr_params.keys():
                 if value[key] is not None:
@@ -567,23 +653,36 @@ class ASR(AbsSave, AbsVoxelInferer):
         self._recompute_preds = True
 
     @property
-    def triggered_voxels(self) -> List[np.ndarray]:
+    def triggered_voxels_csr(self) -> Tuple[Tensor, Tensor]:
         r"""
-        The list of triggered voxels.
+        The triggered voxels as (offsets, voxel_ids), where voxel_ids[offsets[i] : offsets[i + 1]]
+        are the flat indices of the voxels triggered by muon i.
         """
-        if self._triggered_voxels is None:
-            self._triggered_voxels = self.get_triggered_voxels(
+        if self._triggered_voxels_csr is None:
+            self._triggered_voxels_csr = self.get_triggered_voxels(
                 self.tracks.points_in,
                 self.tracks.points_out,
                 self.voi,
                 self.theta_xy_in,
                 self.theta_xy_out,
             )
-        return self._triggered_voxels
+        return self._triggered_voxels_csr
+
+    @triggered_voxels_csr.setter
+    def triggered_voxels_csr(self, value: Tuple[Tensor, Tensor]) -> None:
+        self._triggered_voxels_csr = value
+
+    @property
+    def triggered_voxels(self) -> List[np.ndarray]:
+        r"""
+        The list of triggered voxels, where triggered_voxels[i] is an np.ndarray with shape (n, 3)
+        containing the xyz indices of the n voxels triggered by muon i.
+        """
+        return self.triggered_voxels_csr_to_list(self.triggered_voxels_csr, self.voi)
 
     @triggered_voxels.setter
     def triggered_voxels(self, value: List[np.ndarray]) -> None:
-        self._triggered_voxels = value
+        self._triggered_voxels_csr = self.triggered_voxels_list_to_csr(value, self.voi)
 
     @property
     def n_mu_per_vox(self) -> Tensor:
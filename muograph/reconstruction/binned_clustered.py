@@ -1,12 +1,15 @@
-from typing import Optional, Tuple, List, Dict, Union
+from typing import Optional, Tuple, Dict, Union, Iterator, List
 import torch
+import numpy as np
 from torch import Tensor
-from copy import deepcopy
 from functools import partial
+from copy import copy
 import math
 from pathlib import Path
 
 from muograph.utils.device import DEVICE
+from muograph.utils.datatype import dtype_n
+from muograph.utils.tools import segment_reduce
 from muograph.tracking.tracking import TrackingMST
 from muograph.reconstruction.poca import POCA
 from muograph.volume.volume import Volume
@@ -26,6 +29,7 @@ to detect high-Z material using cosmic muons, 2013 JINST 8 P10013,
 
 class BCA(POCA, AbsVoxelInferer):
     _hit_per_voxel: Optional[Tensor] = None  # (Nx, Ny, Nz)
+    _bca_selection: Optional[Tensor] = None  # (mu) indices of the POCA points selected by the BCA
 
     _bca_params: bca_params_type = {
         "n_max_per_vox": 50,
@@ -35,8 +39,13 @@ class BCA(POCA, AbsVoxelInferer):
         "p_range": (0.0, 10000000),  # MeV
         "dtheta_range": (0.0, math.pi / 3),
         "use_p": False,
+        "dca_range": (0.0, math.inf),  # mm
+        "use_quality_flag": False,
     }
 
+    # Metric methods applied to the metric values of all the voxels at once, as they act element-wise
+    _elementwise_metric_methods = (torch.log, torch.log10, torch.log2, torch.log1p, torch.sqrt, torch.exp, torch.abs, torch.square, np.log, np.log10, np.sqrt)
+
     _vars_to_save = ["xyz_voxel_pred", "n_poca_per_vox"]
 
     def __init__(
@@ -58,9 +67,7 @@ class BCA(POCA, AbsVoxelInferer):
         AbsVoxelInferer.__init__(self, voi=voi, tracking=tracking)
         POCA.__init__(self, tracking=tracking, voi=voi, output_dir=output_dir)
 
-        self.bca_indices: Tensor = deepcopy(self.poca_indices)
-        self.bca_poca_points: Tensor = deepcopy(self.poca_points)
-        self.bca_tracks: TrackingMST = deepcopy(self.tracks)
+        self._reset_selection()
 
     @staticmethod
     def compute_distance_2_points(points: Tensor) -> Tensor:
@@ -130,54 +137,158 @@ class BCA(POCA, AbsVoxelInferer):
             AFTER removing events,with size (Nx,Ny,Nz,1) with Ni the number of voxels along a given dimension.
         """
 
-        # Initialize hit counters
-        nhit = torch.zeros(voi.n_vox_xyz, dtype=torch.int64, device=DEVICE)
-        nhit_cut = torch.zeros(voi.n_vox_xyz, dtype=torch.int64, device=DEVICE)
+        flat_vox_indices = voi.get_flat_voxel_indices(bca_indices)
+
+        # Sort events by voxel, then by decreasing scattering angle within each voxel
+        order = torch.sort(dtheta, descending=True, stable=True)[1]
+        order = order[torch.sort(flat_vox_indices[order], stable=True)[1]]
 
-        flat_vox_indices = bca_indices[:, 0] * (voi.n_vox_xyz[1] * voi.n_vox_xyz[2]) + bca_indices[:, 1] * voi.n_vox_xyz[2] + bca_indices[:, 2]
+        # Number of hits per voxel and index of the first event of each voxel
+        nhit = torch.bincount(flat_vox_indices, minlength=math.prod(voi.n_vox_xyz))
+        first_event = torch.cumsum(nhit, dim=0) - nhit
 
-        # Use unique to find all distinct voxels and counts
-        unique_voxels, counts = torch.unique(flat_vox_indices, return_counts=True)
-        unique_voxels = unique_voxels.type(torch.int64)
+        # Rank of each event within its voxel, in decreasing scattering angle order
+        rank = torch.arange(len(order), device=order.device) - first_event[flat_vox_indices[order]]
 
-        # Scatter to get the number of hits per voxel
-        nhit.view(-1).scatter_(0, unique_voxels, counts)
+        # Keep only the n_max_per_voxel highest scattering events within each voxel
+        mask = torch.zeros_like(dtheta, dtype=torch.bool, device=DEVICE)
+        mask[order[rank < n_max_per_voxel]] = True
 
-        # Mask to identify which events should be rejected
-        rejected_events = torch.tensor([], dtype=torch.long, device=DEVICE)
+        nhit_cut = torch.clamp(nhit, max=n_max_per_voxel)
 
-        for voxel_idx in unique_voxels:
-            # Get mask for the current voxel
-            voxel_mask = flat_vox_indices == voxel_idx
+        nhit, nhit_cut = nhit.reshape(voi.n_vox_xyz).to(DEVICE), nhit_cut.reshape(voi.n_vox_xyz).to(DEVICE)
 
-            # Sort the scattering angles within the voxel
-            sorted_dtheta, order = torch.sort(dtheta[voxel_mask], descending=True)
+        return mask, nhit, nhit_cut
 
-            # Get the number of hits in the current voxel
-            num_hits = sorted_dtheta.size(0)
+    @staticmethod
+    def _compute_pairwise_metric_tiles(
+        use_p: bool,
+        n_min_per_vox: int,
+        voi: Volume,
+        bca_indices: Tensor,
+        poca_points: Tensor,
+        dtheta: Tensor,
+        momentum: Tensor,
+        metric_method: Optional[partial] = None,
+        max_pairs_per_tile: int = 1_000_000,
+    ) -> Iterator[Tuple[Tensor, Tensor]]:
+        r"""
+        Computes the pairwise scattering density metric between poca points located within the same voxel,
+        for voxels with more than `n_min_per_vox` poca points.
+        CREDITS: A binned clustering algorithm to detect high-Z material using cosmic muons,
+                 2013 JINST 8 P10013, (http://iopscience.iop.org/1748-0221/8/10/P10013)
 
-            # Update nhit_cut for this voxel
-            if num_hits > n_max_per_voxel:
-                nhit_cut.view(-1)[voxel_idx] = n_max_per_voxel
+        Poca points are grouped by voxel once, and only the pairs (i, j) with j < i are computed.
+        Pairs are processed in tiles of at most `max_pairs_per_tile` pairs, and the pairs of a voxel may span several tiles.
+        The metric values of such a voxel are concatenated across tiles, such that each voxel is yielded once, with all its metric values.
+        Only these metric values are kept across tiles, not the per-pair intermediate tensors.
 
-                # Get the indices of the events to reject
-                to_reject = torch.nonzero(voxel_mask)[order[n_max_per_voxel:]].squeeze()
+        Args:
+            - use_p (bool) If True, the muon momentum is used in the scattering weights computation.
+            - n_min_per_vox (int) Minimum number of POCA points required per voxel.
+            - voi (Volume) Instance of the `Volume` class.
+            - bca_indices (Tensor) Indices of voxels the poca points are located in.
+            - poca_points (Tensor) Coordinates of poca points.
+            - dtheta (Tensor) The muons scattering angle.
+            - momentum (Tensor) Muons momentum if available.
+            - metric_method (Optional[partial]): Function to compute the voxel-wise metric, applied to the metric values
+            of each voxel separately (see `apply_metric_method`).
+            - max_pairs_per_tile (int) The maximum number of pairs of poca points processed at once.
+
+        Yields:
+            - voxel_ids (Tensor) The flat voxel index of each pair.
+            - metric (Tensor) The scattering density metric of each pair, computed as `distance / (dtheta_i * p_i * dtheta_j * p_j)`.
+            Pairs with zero distance or zero weight are removed.
+        """
 
-                # Ensure to_reject is 2D before concatenation
-                if to_reject.dim() == 0:
-                    to_reject = to_reject.unsqueeze(0)
+        if use_p is False:
+            momentum = torch.ones_like(dtheta, device=DEVICE, dtype=torch.float32)
 
-                # Append rejected events
-                rejected_events = torch.cat((rejected_events, to_reject))
+        # Group poca points by voxel, preserving their original order within each voxel
+        flat_vox_indices, order = torch.sort(voi.get_flat_voxel_indices(bca_indices), stable=True)
+        unique_voxels, counts = torch.unique_consecutive(flat_vox_indices, return_counts=True)
+        first_poca = torch.cumsum(counts, dim=0) - counts
+
+        # Keep voxels with more than n_min_per_vox points
+        valid = counts > n_min_per_vox
+        unique_voxels, counts, first_poca = unique_voxels[valid], counts[valid], first_poca[valid]
+
+        # Number of pairs per voxel, and range of pair indices of each voxel
+        n_pairs = counts * (counts - 1) // 2
+        last_pair = torch.cumsum(n_pairs, dim=0)
+        first_pair = last_pair - n_pairs
+        total_pairs = int(last_pair[-1]) if len(last_pair) > 0 else 0
+
+        # Metric values of the voxel whose pairs continue in the next tile
+        pending_voxel_ids: List[Tensor] = []
+        pending_metric: List[Tensor] = []
+
+        for start in range(0, total_pairs, max_pairs_per_tile):
+            end = min(start + max_pairs_per_tile, total_pairs)
+            pairs = torch.arange(start, end, device=last_pair.device)
+            pair_voxels = torch.searchsorted(last_pair, pairs, right=True)
+
+            # Index of each pair within its voxel, ordered as the lower triangle of the voxel pairs matrix
+            t = pairs - first_pair[pair_voxels]
+            i = torch.floor((1 + torch.sqrt(1 + 8 * t.double())) / 2).long()
+            i = i - (i * (i - 1) // 2 > t).long()
+            i = i + ((i + 1) * i // 2 <= t).long()
+            j = t - i * (i - 1) // 2
+
+            idx_i, idx_j = order[first_poca[pair_voxels] + i], order[first_poca[pair_voxels] + j]
+
+            # Distance and scattering metrics
+            distance = torch.sqrt(torch.sum(torch.square(poca_points[idx_i] - poca_points[idx_j]), dim=-1))
+            weights = (dtheta[idx_i] * momentum[idx_j]) * (dtheta[idx_j] * momentum[idx_i])
+
+            metric = torch.where((distance != 0) & (weights != 0), distance / weights, 0.0)
+            non_zero = metric != 0.0
+
+            # Pairs are ordered by voxel: only the last voxel of the tile can continue in the next tile
+            complete = last_pair[pair_voxels] <= end
+            voxel_ids = unique_voxels[pair_voxels]
+
+            if not complete.any():
+                pending_voxel_ids.append(voxel_ids[non_zero])
+                pending_metric.append(metric[non_zero])
+                continue
+
+            # The voxel of the pending pairs is the first voxel of the tile, hence complete
+            tile_voxel_ids = torch.cat(pending_voxel_ids + [voxel_ids[non_zero & complete]])
+            tile_metric = torch.cat(pending_metric + [metric[non_zero & complete]])
+            pending_voxel_ids, pending_metric = [voxel_ids[non_zero & ~complete]], [metric[non_zero & ~complete]]
+
+            if metric_method is not None:
+                yield BCA.apply_metric_method(tile_voxel_ids, tile_metric, metric_method)
             else:
-                nhit_cut.view(-1)[voxel_idx] = num_hits
+                yield tile_voxel_ids, tile_metric
 
-        # Sort rejected events and create mask
-        rejected_events, _ = torch.sort(rejected_events)
-        mask = torch.ones_like(dtheta, dtype=torch.bool, device=DEVICE)
-        mask[rejected_events] = False
+    @staticmethod
+    def apply_metric_method(voxel_ids: Tensor, metric: Tensor, metric_method: partial) -> Tuple[Tensor, Tensor]:
+        r"""
+        Applies `metric_method` to the metric values of each voxel separately, as if it was called voxel by voxel.
+        Element-wise functions (see `_elementwise_metric_methods`) are applied to all the voxels at once.
 
-        return mask, nhit, nhit_cut
+        Args:
+            - voxel_ids (Tensor) The flat voxel index of each metric value, grouped by voxel, with size (n).
+            - metric (Tensor) The metric values, with size (n).
+            - metric_method (partial): Function to compute the voxel-wise metric.
+
+        Returns:
+            - voxel_ids (Tensor) The flat voxel index of each output value.
+            - metric (Tensor) The output of `metric_method` for each voxel, concatenated.
+        """
+        func = metric_method.func if isinstance(metric_method, partial) else metric_method
+        if func in BCA._elementwise_metric_methods:
+            return voxel_ids, metric_method(metric)
+
+        unique_voxels, counts = torch.unique_consecutive(voxel_ids, return_counts=True)
+        voxel_metrics = [metric_method(voxel_metric).reshape(-1) for voxel_metric in torch.split(metric, counts.tolist())]
+        if len(voxel_metrics) == 0:
+            return voxel_ids, metric
+
+        lengths = torch.tensor([len(voxel_metric) for voxel_metric in voxel_metrics], device=unique_voxels.device)
+        return torch.repeat_interleave(unique_voxels, lengths), torch.cat(voxel_metrics)
 
     def compute_vox_wise_metric(
         self,
@@ -206,40 +317,91 @@ class BCA(POCA, AbsVoxelInferer):
 
 
         Returns:
-            - full_metric (Tensor) The voxel-wise scattering density metric with size (n, n),
-            where n is the number of poca points within the voxel with indices vox_id and satisfies the condition on p and dtheta.
-            Zero elements are removed.
+            - full_metric (Tensor) The voxel-wise scattering density metric of the pairs of poca points within the voxel
+            with indices vox_id, ordered as the lower triangle of the pairs matrix. Zero elements are removed.
         """
 
         # Mask events outside the voxel
         poca_in_vox_mask = (bca_indices == vox_id).sum(dim=-1) == 3
 
-        # POCA points within the voxel
-        poca_in_vox = poca_points[poca_in_vox_mask]
+        metrics = [
+            metric
+            for _, metric in self._compute_pairwise_metric_tiles(
+                use_p=use_p,
+                n_min_per_vox=0,
+                voi=self.voi,
+                bca_indices=bca_indices[poca_in_vox_mask],
+                poca_points=poca_points[poca_in_vox_mask],
+                dtheta=dtheta[poca_in_vox_mask],
+                momentum=momentum[poca_in_vox_mask],
+                metric_method=metric_method,
+            )
+        ]
 
-        # Distance metric
-        distance_metric = self.compute_distance_2_points(points=poca_in_vox)
+        return torch.cat(metrics) if len(metrics) > 0 else torch.zeros(0, dtype=torch.float32, device=DEVICE)
 
-        # Scattering metric
-        if use_p is False:
-            momentum = torch.ones_like(dtheta, device=DEVICE, dtype=torch.float32)
-        scattering_weights = self.compute_scattering_momentum_weight(
-            dtheta=dtheta[poca_in_vox_mask],
-            p=momentum[poca_in_vox_mask],
-        )
+    @staticmethod
+    def compute_vox_wise_scores(
+        use_p: bool,
+        n_min_per_vox: int,
+        voi: Volume,
+        bca_indices: Tensor,
+        poca_points: Tensor,
+        dtheta: Tensor,
+        momentum: Tensor,
+        score_method: partial,
+        metric_method: Optional[partial] = None,
+        max_pairs_per_tile: int = 1_000_000,
+    ) -> Tuple[Tensor, Tensor]:
+        r"""
+        Computes the voxel-wise scattering density score.
+        CREDITS: A binned clustering algorithm to detect high-Z material using cosmic muons,
+                 2013 JINST 8 P10013, (http://iopscience.iop.org/1748-0221/8/10/P10013)
+
+        The pairwise metric is computed in tiles of bounded memory (see `_compute_pairwise_metric_tiles`),
+        and converted into voxel scores using `score_method` as soon as a tile is computed.
 
-        # Keep only lower triangle element within symmetric matrix
-        full_metric = torch.tril(
-            torch.where(
-                (distance_metric != 0) & (scattering_weights != 0),
-                distance_metric / scattering_weights,
-                0.0,
+        Args:
+            - use_p (bool) If True, the muon momentum is used in the scattering weights computation.
+            - n_min_per_vox (int) Minimum number of POCA points required per voxel.
+            - voi (Volume) Instance of the `Volume` class.
+            - bca_indices (Tensor) Indices of voxels the poca points are located in.
+            - poca_points (Tensor) Coordinates of poca points.
+            - dtheta (Tensor) The muons scattering angle.
+            - momentum (Tensor) Muons momentum if available.
+            - score_method (partial) The function used to convert the metric of a voxel into a float.
+            - metric_method (Optional[partial]): Function to compute the voxel-wise metric, applied voxel by voxel.
+            - max_pairs_per_tile (int) The maximum number of pairs of poca points processed at once.
+
+        Returns:
+             - final_voxel_scores (Tensor) containing the final voxel score with size (Nx, Ny, Nz),
+            where Ni is the number of voxels along a certain axis.
+             - hit_per_voxel (Tensor) containing the number of metric values used to compute the score of each voxel,
+            with size (Nx, Ny, Nz).
+        """
+
+        final_voxel_scores = torch.zeros(math.prod(voi.n_vox_xyz), device=DEVICE, dtype=torch.float32)
+        hit_per_voxel = torch.zeros(math.prod(voi.n_vox_xyz), device=DEVICE, dtype=dtype_n)
+
+        for voxel_ids, metric in BCA._compute_pairwise_metric_tiles(
+            use_p=use_p,
+            n_min_per_vox=n_min_per_vox,
+            voi=voi,
+            bca_indices=bca_indices,
+            poca_points=poca_points,
+            dtheta=dtheta,
+            momentum=momentum,
+            metric_method=metric_method,
+            max_pairs_per_tile=max_pairs_per_tile,
+        ):
+            tile_voxels, counts = torch.unique_consecutive(voxel_ids, return_counts=True)
+            offsets = torch.cat([torch.zeros(1, dtype=torch.int64, device=counts.device), torch.cumsum(counts, dim=0)])
+
+            final_voxel_scores[tile_voxels], hit_per_voxel[tile_voxels] = BCA.compute_final_scores(
+                voxel_metric=metric, offsets=offsets, score_method=score_method
             )
-        )
-        if metric_method is not None:
-            return metric_method(full_metric[full_metric != 0.0])
-        else:
-            return full_metric[full_metric != 0.0]
+
+        return final_voxel_scores.reshape(voi.n_vox_xyz), hit_per_voxel.reshape(voi.n_vox_xyz)
 
     def compute_voxels_distribution(
         self,
@@ -251,9 +413,9 @@ class BCA(POCA, AbsVoxelInferer):
         momentum: Tensor,
         dtheta: Tensor,
         metric_method: partial,
-    ) -> List:
+    ) -> Tuple[Tensor, Tensor]:
         r"""
-        Compute voxel-wise weight distribution, according to the `compute_vox_wise_metric()` method.
+        Compute voxel-wise weight distribution, according to the `_compute_pairwise_metric_tiles()` method.
 
         Args:
             - use_p (bool): Whether to include momentum in the computation.
@@ -266,88 +428,72 @@ class BCA(POCA, AbsVoxelInferer):
             - metric_method (partial): Function to compute voxel-wise metrics.
 
         Returns:
-             - score_list (List) List containing lists of scores for each voxel.
+             - voxel_metric (Tensor) The metric values grouped by voxel, with size (n_pairs).
+             - offsets (Tensor) The metric values of the voxel with flat index i are given by
+             `voxel_metric[offsets[i] : offsets[i + 1]]`, with size (Nx * Ny * Nz + 1).
         """
 
-        # Initialize score tensor with zeros
-        score_list = torch.zeros(voi.n_vox_xyz, dtype=torch.int16, device=DEVICE).tolist()
-
-        # Compute voxel indices and POCA point counts
-        flat_vox_indices = bca_indices[:, 0] * (voi.n_vox_xyz[1] * voi.n_vox_xyz[2]) + bca_indices[:, 1] * voi.n_vox_xyz[2] + bca_indices[:, 2]
-
-        unique_voxels, counts = torch.unique(flat_vox_indices, return_counts=True)
-
-        # Filter voxels with at least n_min_per_vox points
-        valid_voxels = unique_voxels[counts > n_min_per_vox]
+        voxel_ids, voxel_metric = [], []
+        for tile_voxel_ids, tile_metric in self._compute_pairwise_metric_tiles(
+            use_p=use_p,
+            n_min_per_vox=n_min_per_vox,
+            voi=voi,
+            bca_indices=bca_indices,
+            poca_points=poca_points,
+            dtheta=dtheta,
+            momentum=momentum,
+            metric_method=metric_method,
+        ):
+            voxel_ids.append(tile_voxel_ids)
+            voxel_metric.append(tile_metric)
+
+        # Tiles are ordered by voxel, the metric values are already grouped by voxel
+        offsets = torch.zeros(math.prod(voi.n_vox_xyz) + 1, dtype=torch.int64, device=DEVICE)
+        if len(voxel_ids) > 0:
+            offsets[1:] = torch.cumsum(torch.bincount(torch.cat(voxel_ids), minlength=math.prod(voi.n_vox_xyz)), dim=0)
+            return torch.cat(voxel_metric), offsets
+
+        return torch.zeros(0, dtype=torch.float32, device=DEVICE), offsets
 
-        # Convert flat indices back to 3D coordinates
-        voxel_coords = torch.stack(
-            [
-                valid_voxels // (voi.n_vox_xyz[1] * voi.n_vox_xyz[2]),
-                (valid_voxels % (voi.n_vox_xyz[1] * voi.n_vox_xyz[2])) // voi.n_vox_xyz[2],
-                valid_voxels % voi.n_vox_xyz[2],
-            ],
-            dim=-1,
-        )
-
-        # Compute metrics for valid voxels
-        for coord in voxel_coords:
-            i, j, k = coord.tolist()
-            score_list[i][j][k] = self.compute_vox_wise_metric(
-                metric_method=metric_method,
-                vox_id=torch.tensor([i, j, k], device=bca_indices.device),
-                use_p=use_p,
-                bca_indices=bca_indices,
-                poca_points=poca_points,
-                dtheta=dtheta,
-                momentum=momentum,
-            )
-
-        return score_list
-
-    def compute_final_scores(self, score_list: List, score_method: partial) -> Tuple[torch.Tensor, torch.Tensor]:
+    @staticmethod
+    def compute_final_scores(voxel_metric: Tensor, offsets: Tensor, score_method: partial) -> Tuple[Tensor, Tensor]:
         r"""
-        Compute voxel-wise scores from a voxel-wise list of scores.
+        Compute voxel-wise scores from the metric values grouped by voxel.
 
         Args:
-             - score_list (List) A list containing a list of scores for each voxel.
-             - score_method (partial) The function used to convert the list of scores into a float.
+             - voxel_metric (Tensor) The metric values grouped by voxel, as returned by `compute_voxels_distribution()`.
+             - offsets (Tensor) The metric values of voxel i are given by `voxel_metric[offsets[i] : offsets[i + 1]]`.
+             - score_method (partial) The function used to convert the metric values of a voxel into a float.
 
         Returns:
-             - final_voxel_scores (Tensor) containing the final voxel score with size (Nx, Ny, Nz),
-            where Ni is the number of voxels along a certain axis.
-             - hit_per_voxel (Tensor) containing the number of POCA points within each voxel,
-            with size (Nx, Ny, Nz).
+             - final_voxel_scores (Tensor) containing the final score of each voxel, with size (len(offsets) - 1).
+             Voxels without metric values have a score of 0.
+             - hit_per_voxel (Tensor) containing the number of metric values within each voxel,
+            with size (len(offsets) - 1).
         """
 
-        Nx, Ny, Nz = self.voi.n_vox_xyz
-        final_voxel_scores = torch.zeros((Nx, Ny, Nz), device=DEVICE, dtype=torch.float32)
-        hit_per_voxel = torch.zeros((Nx, Ny, Nz), device=DEVICE, dtype=torch.int16)
+        hit_per_voxel = offsets.diff()
+        segment_ids = torch.repeat_interleave(torch.arange(len(hit_per_voxel), device=offsets.device), hit_per_voxel)
 
-        # Iterate over each voxel in the score_list
-        for i in range(Nx):
-            for j in range(Ny):
-                for k in range(Nz):
-                    voxel_scores = score_list[i][j][k]
+        final_voxel_scores = segment_reduce(voxel_metric, segment_ids, len(hit_per_voxel), score_method)
 
-                    if isinstance(voxel_scores, Tensor):
-                        # Compute the final score using the provided score_method
-                        final_voxel_scores[i, j, k] = score_method(voxel_scores)
-                        # Count the number of POCA points (hits) in this voxel
-                        hit_per_voxel[i, j, k] = len(voxel_scores)
+        return final_voxel_scores.to(device=DEVICE, dtype=torch.float32), hit_per_voxel.to(device=DEVICE, dtype=dtype_n)
 
-        return final_voxel_scores, hit_per_voxel
+    def _reset_selection(self) -> None:
+        r"""
+        Selects all the POCA points.
+        """
+        self._bca_selection = torch.arange(self.n_mu, device=DEVICE)
 
     def _filter_events(self, mask: Tensor) -> None:
         r"""
-        Remove events specified as False in `mask`.
+        Remove events specified as False in `mask`. Only the selection is updated,
+        the selected data being gathered when read.
 
         Args:
             - mask (Tensor) events with False elements will be removed.
         """
-        self.bca_indices = self.bca_indices[mask]
-        self.bca_poca_points = self.bca_poca_points[mask]
-        self.bca_tracks._filter_muons(mask=mask)
+        self._bca_selection = self.bca_selection[mask]
 
     def get_dir_name(self) -> Path:
         """Returns the name of the BCA algo given its parameters.
@@ -366,7 +512,8 @@ class BCA(POCA, AbsVoxelInferer):
 
         Compute voxel-wise scattering density predictions.
 
-        Uses parameters stored in `_bca_params`. The algorithm calculates:
+        Uses parameters stored in `_bca_params`. POCA points failing the closest approach quality cuts
+        (`dca_range`, `use_quality_flag`, see `POCA.get_quality_mask`) are rejected first. The algorithm calculates:
             - Scattering density predictions (`pred`).
             - Number of POCA points used for each voxel's prediction (`hit_per_voxel`).
 
@@ -374,10 +521,17 @@ class BCA(POCA, AbsVoxelInferer):
             - pred (Tensor): Tensor of voxel-wise scattering density predictions.
         """
 
-        # Copy relevant features before event selection
-        self.bca_tracks = deepcopy(self.tracks)
-        self.bca_indices = deepcopy(self.poca_indices)
-        self.bca_poca_points = deepcopy(self.poca_points)
+        # Select all events before event selection
+        self._reset_selection()
+        dtheta, E = self.tracks.dtheta, self.tracks.E
+
+        # POCA quality cuts, from the closest approach features
+        quality_mask = self.get_quality_mask(
+            dca_range=self.bca_params["dca_range"],  # type: ignore
+            use_quality_flag=self.bca_params["use_quality_flag"],  # type: ignore
+        )
+        self._filter_events(quality_mask)
+        dtheta, E = dtheta[quality_mask], E[quality_mask]
 
         # Keep only the n poca points with highest scattering angle within a voxel
         (
@@ -388,41 +542,36 @@ class BCA(POCA, AbsVoxelInferer):
             n_max_per_voxel=int(self.bca_params["n_max_per_vox"]),  # type: ignore
             voi=self.voi,
             bca_indices=self.bca_indices,
-            dtheta=self.bca_tracks.dtheta,
+            dtheta=dtheta,
         )
         self._filter_events(self.mask)
+        dtheta, E = dtheta[self.mask], E[self.mask]
 
         # momentum cut
         if self.bca_params["use_p"]:
-            p_mask = (self.bca_tracks.E > self.bca_params["p_range"][0]) & (  # type: ignore
-                self.bca_tracks.E < self.bca_params["p_range"][1]  # type: ignore
-            )
+            p_mask = (E > self.bca_params["p_range"][0]) & (E < self.bca_params["p_range"][1])  # type: ignore
         else:
-            p_mask = torch.ones_like(self.bca_tracks.dtheta, dtype=torch.bool, device=DEVICE)
+            p_mask = torch.ones_like(dtheta, dtype=torch.bool, device=DEVICE)
 
         # scattering angle cut
-        dtheta_mask = (self.bca_tracks.dtheta > self.bca_params["dtheta_range"][0]) & (  # type: ignore
-            self.bca_tracks.dtheta < self.bca_params["dtheta_range"][1]  # type: ignore
-        )
+        dtheta_mask = (dtheta > self.bca_params["dtheta_range"][0]) & (dtheta < self.bca_params["dtheta_range"][1])  # type: ignore
 
         # apply dtheta, p cuts
         self._filter_events(mask=p_mask & dtheta_mask)
 
-        # compute voxels distribution
-        self.score_list = self.compute_voxels_distribution(
+        # compute voxel-wise scores
+        pred, self._hit_per_voxel = self.compute_vox_wise_scores(
+            score_method=self.bca_params["score_method"],  # type: ignore
             metric_method=self.bca_params["metric_method"],  # type: ignore
             use_p=self.bca_params["use_p"],  # type: ignore
             n_min_per_vox=self.bca_params["n_min_per_vox"],  # type: ignore
             voi=self.voi,
-            momentum=self.bca_tracks.E,
+            momentum=E[p_mask & dtheta_mask],
             bca_indices=self.bca_indices,
             poca_points=self.bca_poca_points,
-            dtheta=self.bca_tracks.dtheta,
+            dtheta=dtheta[p_mask & dtheta_mask],
         )
 
-        # compute fina scores
-        pred, self._hit_per_voxel = self.compute_final_scores(score_list=self.score_list, score_method=self.bca_params["score_method"])  # type: ignore
-
         self._recompute_preds = False
 
         return pred
@@ -476,6 +625,8 @@ class BCA(POCA, AbsVoxelInferer):
             - Dict containing the parameters name and value. Only parameters with
             valid name and non `None` values wil be updated.
         """
+        # Parameters are copied, such that the defaults shared by all instances are not modified
+        self._bca_params = copy(self._bca_params)
         for key in value.keys():
             if key in self._bca_params.keys():
                 if value[key] is not None:
@@ -487,6 +638,37 @@ class BCA(POCA, AbsVoxelInferer):
     def hit_per_voxel(self) -> Tensor:
         return self._hit_per_voxel
 
+    @property
+    def bca_selection(self) -> Tensor:
+        r"""
+        The indices of the POCA points selected by the BCA, with size (n_selected).
+        """
+        if self._bca_selection is None:
+            self._reset_selection()
+        return self._bca_selection  # type: ignore
+
+    @property
+    def bca_tracks(self) -> TrackingMST:
+        r"""
+        A view of the tracks of the POCA points selected by the BCA, see `AbsSelection.select`.
+        It is created when read, the selection itself only being stored as `bca_selection`.
+        """
+        return self.tracks.select(self.bca_selection)
+
+    @property
+    def bca_indices(self) -> Tensor:
+        r"""
+        The voxel indices of the POCA points selected by the BCA, with size (n_selected, 3).
+        """
+        return self.poca_indices[self.bca_selection]
+
+    @property
+    def bca_poca_points(self) -> Tensor:
+        r"""
+        The POCA points selected by the BCA, with size (n_selected, 3).
+        """
+        return self.poca_points[self.bca_selection]
+
     @property
     def dir_name(self) -> Path:
         """The path to the directory corresponding to the current set of parameters."""
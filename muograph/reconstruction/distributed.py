@@ -0,0 +1,288 @@
+import torch
+from torch import Tensor
+from typing import Optional, Tuple, Union, Callable, Iterable, Sequence, Dict, Any
+from concurrent.futures import Executor, ProcessPoolExecutor
+from copy import copy, deepcopy
+from functools import partial
+import numpy as np
+import math
+
+from muograph.tracking.tracking import TrackingMST
+from muograph.reconstruction.poca import POCA
+from muograph.reconstruction.asr import ASR
+from muograph.reconstruction.binned_clustered import bca_params_type
+from muograph.reconstruction.streaming import StreamingPOCA, VoxelStatistics, IncrementalBCA
+from muograph.volume.volume import Volume
+
+r"""
+Provides classes for distributing the reconstruction of hit files across processes or nodes,
+following the map-reduce pattern.
+"""
+
+
+class ShardReconstruction(StreamingPOCA):
+    r"""
+    A class computing compact per-voxel partial results of the POCA, ASR and BCA algorithms from a shard of the muons.
+
+    The partial results of independent shards are merged into the results of their union (see `merge`):
+        - POCA: the number of POCA points per voxel and the statistics of their scattering angle, see `StreamingPOCA`.
+        - ASR: the statistics of the score (scattering angle, or log of the scattering angle times momentum if `use_p`) of the
+        muons triggering each voxel, see `ASR.get_muon_scores` and `VoxelStatistics`. Means are exact, quantiles are approximated from histograms.
+        - BCA: the POCA points with the highest scattering angle of each voxel, see `IncrementalBCA`. Predictions are exact.
+
+    The muon-wise data are not kept in memory, and the size of the partial results only depends on the voxelization.
+    """
+
+    _algorithms = ("poca", "asr", "bca")
+
+    def __init__(
+        self,
+        voi: Volume,
+        plane_labels_in: Tuple[int, ...],
+        plane_labels_out: Tuple[int, ...],
+        algorithms: Tuple[str, ...] = ("poca", "asr", "bca"),
+        spatial_res: Optional[Union[Tensor, Tuple[float, float, float]]] = None,
+        energy_range: Optional[Tuple[float, float]] = None,
+        efficiency: Union[float, Tensor] = 1.0,
+        input_unit: str = "mm",
+        fit_method: str = "svd",
+        score_method: Callable = partial(np.quantile, q=0.5),
+        asr_params: Optional[Dict[str, Any]] = None,
+        bca_params: Optional[bca_params_type] = None,
+        dtheta_hist_range: Tuple[float, float] = (1e-5, math.pi),
+        log_dtheta_p_hist_range: Tuple[float, float] = (-7.0, 12.0),
+        n_bins: int = 128,
+    ) -> None:
+        r"""
+        Initializes the ShardReconstruction object.
+
+        Args:
+            - voi (Volume): Instance of the Volume class.
+            - plane_labels_in (Tuple[int, ...]): The labels of the detector planes above the object.
+            - plane_labels_out (Tuple[int, ...]): The labels of the detector planes below the object.
+            - algorithms (Tuple[str, ...]): The algorithms to compute partial results for, among 'poca', 'asr' and 'bca'.
+            The POCA partial results are always computed.
+            - spatial_res (Optional[Union[Tensor, Tuple[float, float, float]]]): The detector spatial resolution, see `Hits`.
+            - energy_range (Optional[Tuple[float, float]]): The muon energy range, see `Hits`.
+            - efficiency (Union[float, Tensor]): The detector panels efficiency, see `Hits`.
+            - input_unit (str): The unit of the hits, see `Hits`.
+            - fit_method (str): The track fitting method, see `Tracking.get_tracks_points_from_hits`.
+            - score_method (Callable): The POCA score method, see `StreamingPOCA`.
+            - asr_params (Optional[Dict[str, Any]]): The parameters of the ASR algorithm, see `ASR.asr_params`.
+            Parameters not provided take their default value. The `score_method` must be supported by `VoxelStatistics.get_score`.
+            - bca_params (Optional[bca_params_type]): The parameters of the BCA algorithm, see `BCA.bca_params`.
+            Parameters not provided take their default value.
+            - dtheta_hist_range (Tuple[float, float]): The support of the scattering angle histograms, in radians.
+            It is not a cut: the muons are selected by the `dtheta_range` parameters of ASR and BCA.
+            - log_dtheta_p_hist_range (Tuple[float, float]): The support of the linear histograms of the log of the scattering angle
+            times momentum, used for the ASR statistics if `use_p`.
+            - n_bins (int): The number of histogram bins.
+        """
+        if any(algorithm not in self._algorithms for algorithm in algorithms):
+            raise ValueError(f"algorithms must be among {self._algorithms}, not {algorithms}.")
+
+        super().__init__(
+            voi=voi,
+            plane_labels_in=plane_labels_in,
+            plane_labels_out=plane_labels_out,
+            spatial_res=spatial_res,
+            energy_range=energy_range,
+            efficiency=efficiency,
+            input_unit=input_unit,
+            fit_method=fit_method,
+            score_method=score_method,
+            dtheta_hist_range=dtheta_hist_range,
+            n_bins=n_bins,
+        )
+
+        self.algorithms = algorithms
+
+        self.asr_params = copy(ASR._asr_params)
+        self.asr_params.update({key: value for key, value in (asr_params or {}).items() if (key in self.asr_params) & (value is not None)})
+
+        # With use_p, the ASR scores are in logarithmic scale
+        use_p = self.asr_params["use_p"]
+        asr_value_range = log_dtheta_p_hist_range if use_p else dtheta_hist_range
+        self.asr_stats = VoxelStatistics(voi=voi, value_range=asr_value_range, n_bins=n_bins, log_bins=not use_p) if "asr" in algorithms else None
+        self.bca = IncrementalBCA(voi=voi, bca_params=bca_params) if "bca" in algorithms else None
+
+    def __repr__(self) -> str:
+        return f"Partial {', '.join(self.algorithms)} reconstruction of {self.n_mu:,d} muons."
+
+    def process_tracks(self, tracking: TrackingMST) -> None:
+        r"""
+        Computes the POCA points and triggered voxels of a batch of muons, and adds them to the partial results.
+
+        Args:
+            - tracking (TrackingMST): The incoming and outgoing tracks of the batch.
+        """
+        self._n_mu += tracking.n_mu
+
+        poca = POCA(tracking=tracking, voi=self.voi)
+        self.process_poca(poca)
+
+        if self.bca is not None:
+            self.bca.update(tracking, poca=poca, refresh=False)
+
+        if self.asr_stats is not None:
+            self.process_asr(ASR(voi=self.voi, tracking=tracking, poca=poca))
+
+    def process_asr(self, asr: ASR) -> None:
+        r"""
+        Adds the scores of the muons of a batch to the statistics of the voxels they trigger.
+
+        Args:
+            - asr (ASR): The ASR computed from the batch.
+        """
+        asr.asr_params = self.asr_params
+        mask = asr.get_muon_mask()
+        values = asr.get_muon_scores()
+
+        # (voxel, score) pairs of the selected muons
+        offsets, voxel_ids = asr.triggered_voxels_csr
+        muon_ids = torch.repeat_interleave(torch.arange(len(offsets) - 1, device=offsets.device), offsets.diff())  # (n_triggered_vox)
+        mask_pairs = mask.to(muon_ids.device)[muon_ids]
+
+        self.asr_stats.update(voxel_ids[mask_pairs], values.to(muon_ids.device)[muon_ids[mask_pairs]])  # type: ignore
+
+    def merge(self, other: "ShardReconstruction") -> None:  # type: ignore[override]
+        r"""
+        Merges the partial results of another instance, computed from an independent shard of the muons, in-place.
+
+        Args:
+            - other (ShardReconstruction): The instance to merge, with identical algorithms, voxelization and parameters.
+        """
+        if self.algorithms != other.algorithms:
+            raise ValueError("Cannot merge partial reconstructions of different algorithms.")
+
+        super().merge(other)
+
+        if (self.asr_stats is not None) & (other.asr_stats is not None):
+            self.asr_stats.merge(other.asr_stats)  # type: ignore
+
+        if (self.bca is not None) & (other.bca is not None):
+            self.bca.merge(other.bca, refresh=False)  # type: ignore
+
+    def get_xyz_voxel_pred(self, algorithm: str = "poca") -> Tensor:  # type: ignore[override]
+        r"""
+        Computes the scattering density predictions per voxel of an algorithm from the partial results.
+
+        Args:
+            - algorithm (str): The algorithm, one of `algorithms`:
+                - 'poca': `score_method` applied to the per-voxel POCA statistics, see `StreamingPOCA.get_xyz_voxel_pred`.
+                - 'asr': the ASR `score_method` applied to the per-voxel ASR statistics.
+                - 'bca': the BCA predictions, see `IncrementalBCA`.
+
+        Returns:
+            - vox_density_pred (Tensor): voxelwise density predictions, with size (nx, ny, nz).
+        """
+        if algorithm == "poca":
+            return super().get_xyz_voxel_pred()
+
+        elif algorithm not in self.algorithms:
+            raise ValueError(f"No partial results for the {algorithm} algorithm, computed algorithms are {self.algorithms}.")
+
+        elif algorithm == "asr":
+            preds = self.asr_stats.get_score(self.asr_params["score_method"]).float()  # type: ignore
+            return torch.exp(preds) if self.asr_params["use_p"] else preds
+
+        # The BCA predictions are not refreshed by updates and merges
+        self.bca.refresh()  # type: ignore
+        return self.bca.xyz_voxel_pred  # type: ignore
+
+    @property
+    def xyz_voxel_preds(self) -> Dict[str, Tensor]:
+        r"""
+        The scattering density predictions of each algorithm.
+        """
+        return {algorithm: self.get_xyz_voxel_pred(algorithm) for algorithm in self.algorithms}
+
+
+class MapReduceReconstruction:
+    r"""
+    A class distributing the reconstruction of a dataset split into shards of hit files, following the map-reduce pattern:
+        - map: each worker processes a shard into a compact per-voxel partial result, see `ShardReconstruction`.
+        - reduce: the partial results are merged into the result of the full dataset.
+
+    Workers are run by a `concurrent.futures.Executor`: a local pool of processes by default, or any executor with
+    the same interface to scale out across nodes (e.g. `mpi4py.futures.MPIPoolExecutor`), as long as the
+    hit files are accessible from the nodes. Partial results are reduced in the order of the shards, as they are
+    yielded by `Executor.map`, such that the result does not depend on the completion order of the workers.
+    """
+
+    def __init__(self, reconstruction: ShardReconstruction, chunk_size: int = 1_000_000) -> None:
+        r"""
+        Initializes the MapReduceReconstruction object.
+
+        Args:
+            - reconstruction (ShardReconstruction): An empty instance, defining the algorithms and parameters of the reconstruction.
+            It is copied by each worker for each shard.
+            - chunk_size (int): The number of muons per chunk when reading the hit files.
+        """
+        if reconstruction.n_mu > 0:
+            raise ValueError("The reconstruction must not contain any muon.")
+
+        self.reconstruction = reconstruction
+        self.chunk_size = chunk_size
+
+    def map(self, hit_files: Union[str, Sequence[str]]) -> ShardReconstruction:
+        r"""
+        Processes a shard of CSV hit files into a partial result.
+
+        Args:
+            - hit_files (Union[str, Sequence[str]]): The path to the CSV file(s) of the shard.
+
+        Returns:
+            - partial_result (ShardReconstruction): The partial result of the shard.
+        """
+        partial_result = deepcopy(self.reconstruction)
+
+        for hit_file in [hit_files] if isinstance(hit_files, str) else hit_files:
+            partial_result.process_csv(hit_file, chunk_size=self.chunk_size)
+
+        return partial_result
+
+    @staticmethod
+    def reduce(partial_results: Iterable[ShardReconstruction]) -> ShardReconstruction:
+        r"""
+        Merges partial results into the first one.
+
+        Args:
+            - partial_results (Iterable[ShardReconstruction]): The partial results of independent shards.
+
+        Returns:
+            - result (ShardReconstruction): The merged result.
+        """
+        iterator = iter(partial_results)
+
+        result = next(iterator, None)
+        if result is None:
+            raise ValueError("No partial results to reduce.")
+
+        for partial_result in iterator:
+            result.merge(partial_result)
+
+        return result
+
+    def run(self, shards: Sequence[Union[str, Sequence[str]]], n_workers: int = 1, executor: Optional[Executor] = None) -> ShardReconstruction:
+        r"""
+        Maps the shards to partial results, and reduces them in the order of the shards.
+        A partial result is only merged once the partial results of all the previous shards are merged.
+
+        Args:
+            - shards (Sequence[Union[str, Sequence[str]]]): The shards, each being the path to one or several CSV hit files.
+            - n_workers (int): The number of local worker processes, if `executor` is None. If 1, shards are processed sequentially.
+            - executor (Optional[Executor]): The executor running the workers, e.g. to distribute the shards across nodes.
+            If None, a local pool of `n_workers` processes is used.
+
+        Returns:
+            - result (ShardReconstruction): The result of the full dataset.
+        """
+        if executor is not None:
+            return self.reduce(executor.map(self.map, shards))
+
+        if (n_workers <= 1) | (len(shards) <= 1):
+            return self.reduce(map(self.map, shards))
+
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=torch.multiprocessing.get_context()) as local_executor:
+            return self.reduce(local_executor.map(self.map, shards))
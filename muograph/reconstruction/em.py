@@ -1,7 +1,6 @@
 import torch
 from typing import Tuple
 from torch import Tensor
-from torch.utils.data import DataLoader, TensorDataset
 from fastprogress import progress_bar
 from muograph.plotting.voxel import VoxelPlotting
 from muograph.volume.volume import Volume
@@ -62,9 +61,10 @@ class EM(VoxelPlotting):
             tracks.T,
         )
         self.Hit = tracks.Hit
+        self.muon_ids, self.voxel_ids = tracks.path_voxels  # (muon, voxel) indices of W, L, T and Hit entries
         self.Dx, self.Dy = tracks.Dx, tracks.Dy
 
-        num_empty_hits = sum([self.Hit[i].sum() == 0 for i in range(len(self.triggered_voxels))])
+        num_empty_hits = int((torch.bincount(self.muon_ids, minlength=len(self.triggered_voxels)) == 0).sum())
         print(f"Eventos sin impactos: {num_empty_hits}/{len(self.triggered_voxels)} ({100 * num_empty_hits / len(self.triggered_voxels):.2f}%)")
 
         # print("M stats:")
@@ -132,9 +132,67 @@ class EM(VoxelPlotting):
 
         return pr, _lambda_
 
-    def em_reconstruction(self, batch_size: int = 100) -> Tuple[Tensor, Tensor]:
+    @staticmethod
+    def _compute_batch_S(
+        W: Tensor,
+        lambda_path: Tensor,
+        hit: Tensor,
+        muon_ids: Tensor,
+        pr: Tensor,
+        Dx: Tensor,
+        Dy: Tensor,
+    ) -> Tensor:
+        """
+        Computes the expectation step for a batch of muons.
+
+        Args:
+            W (Tensor): The weight matrix of the (muon, voxel) pairs of the batch, with size (n_path_vox, 2, 2).
+            lambda_path (Tensor): The scattering density of the voxel of each (muon, voxel) pair, with size (n_path_vox).
+            hit (Tensor): The number of path segments of each (muon, voxel) pair, with size (n_path_vox).
+            muon_ids (Tensor): The index of the muon within the batch of each (muon, voxel) pair, with size (n_path_vox).
+            pr (Tensor): The p0 / p ratio of the muons of the batch, with size (n_mu).
+            Dx (Tensor): The observed data in the XZ plane of the muons of the batch, with size (n_mu, 2).
+            Dy (Tensor): The observed data in the YZ plane of the muons of the batch, with size (n_mu, 2).
+
+        Returns:
+            S (Tensor): The contribution of each (muon, voxel) pair to the scattering density of the voxel, with size (n_path_vox).
+        """
+
+        # sigma_D of each muon
+        w_h_sum = torch.zeros((len(pr), 2, 2), dtype=W.dtype, device=W.device).index_add_(0, muon_ids, W * lambda_path[:, None, None])
+        sigma_D = (pr[:, None, None] ** 2) * w_h_sum
+
+        # Closed form inverse of the 2x2 sigma_D matrices
+        a, b, c, d = sigma_D[:, 0, 0], sigma_D[:, 0, 1], sigma_D[:, 1, 0], sigma_D[:, 1, 1]
+        det_sigma_D = a * d - b * c
+        valid = det_sigma_D != 0
+        safe_det = torch.where(valid, det_sigma_D, torch.ones_like(det_sigma_D))
+        sigma_D_inv = torch.stack([d, -b, -c, a], dim=-1).reshape(-1, 2, 2) / safe_det[:, None, None]
+
+        # Per (muon, voxel) pair quantities
+        inv, pr2 = sigma_D_inv[muon_ids], pr[muon_ids] ** 2
+        Dx_path, Dy_path = Dx[muon_ids], Dy[muon_ids]
+
+        # D^T sigma_D^-1 W sigma_D^-1 D
+        mtr_x_4 = torch.einsum("ek,ekl,el->e", torch.einsum("ej,ejk->ek", Dx_path, inv), W, torch.einsum("ekl,el->ek", inv, Dx_path))
+        mtr_y_4 = torch.einsum("ek,ekl,el->e", torch.einsum("ej,ejk->ek", Dy_path, inv), W, torch.einsum("ekl,el->ek", inv, Dy_path))
+
+        # Tr(sigma_D^-1 W)
+        mtr_5 = torch.einsum("ekl,elk->e", inv, W)
+
+        Sx = 2 * lambda_path + (mtr_x_4 - mtr_5) * pr2 * (lambda_path**2)
+        Sy = 2 * lambda_path + (mtr_y_4 - mtr_5) * pr2 * (lambda_path**2)
+
+        mask = valid[muon_ids] & hit.bool()
+
+        return torch.where(mask, (Sx + Sy) / 2, torch.zeros_like(Sx))
+
+    def em_reconstruction(self, batch_size: int = 10_000) -> Tuple[Tensor, Tensor]:
         """
         Batch version of the EM reconstruction function to process events in smaller chunks.
+
+        Args:
+            batch_size (int): The number of muons processed at once in the expectation step.
         """
         n_events = len(self.triggered_voxels)
         Ni, Nj, Nk = self.voi.n_vox_xyz[0], self.voi.n_vox_xyz[1], self.voi.n_vox_xyz[2]
@@ -144,110 +202,36 @@ class EM(VoxelPlotting):
 
         print("Performing the Expectation and Maximization (EM) steps in batches.")
 
-        # Create a DataLoader for batching the events
-        dataset = TensorDataset(torch.arange(n_events))  # <-- NEW LINE
-        # Es como un objeto (parecido a una lista de elementos) donde cada elemento es una tupla (tensor,) donde el tensor es de un único valor (del 0 al n_events-1: tensor(0),tensor(1),tensor(2)...)
-        print(dataset[0][0], dataset[1])
-        dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=False)  # <-- NEW LINE
-        # DataLoader(...) crea un iterador que permite recorrer el dataset en batches del tamaño especificado por batch_size.
-        # shuffle=False significa que los datos se entregarán en orden secuencial (0, 1, 2, ...), sin mezclar.
-
-        for itr in progress_bar(
-            range(0, self.em_iter - 1)
-        ):  # es simplemente para mostrar la barra de progreso en el notebook cuando se ejecuta, de esta manera vemos cuanto le queda
-            sigma_D = torch.zeros(n_events, 2, 2)
-            w_h = torch.zeros(n_events, Ni, Nj, Nk, 2, 2)
-            w_h_sum = torch.zeros(n_events, 2, 2)
-            Sx = torch.zeros(n_events, Ni, Nj, Nk)
-            Sy = torch.zeros(n_events, Ni, Nj, Nk)
-            S = torch.zeros(n_events, Ni, Nj, Nk)
-            lambda_itr = scatter_density[itr]
-            print(f"Scatter Density at iteration {itr}: {scatter_density[itr]}")
-
-            for batch in dataloader:  # <-- NEW LINE
-                batch_indices = batch[0].tolist()  # Extract batch indices  # <-- NEW LINE
-                # print('Batch: ', batch)
-
-                for i in batch_indices:  # <-- UPDATED TO USE BATCHED DATA
-                    print("\t i: ", i)
-                    # el ultimo valor que tomara sera 9477
-                    # por loque entiendo, es como si estuvieramos tomando cada muon (i-muon)
-
-                    # pr_i = self.pr[self.indices[i]]
-                    pr_i = self.pr[i]
-                    tDx_i = torch.transpose(self.Dx[i], 0, -1)  # DiT
-                    tDy_i = torch.transpose(self.Dy[i], 0, -1)
-
-                    w_h[i, :, :, :, :, :] = self.W[i, :, :, :, :, :] * lambda_itr[:, :, :, None, None]
-                    w_h_sum[i, :, :] = torch.sum(w_h[i, :, :, :, :, :], (0, 1, 2))
-
-                    sigma_D[i, :, :] = (pr_i**2) * w_h_sum[i, :, :]
-                    det_sigma_D = torch.det(sigma_D[i, :, :])
-
-                    if det_sigma_D != 0:
-                        # print('det_sigma_D != 0')
-                        sigma_D_inv = torch.linalg.inv(sigma_D[i, :, :])
-                        xx, yy, zz = torch.meshgrid(torch.arange(Ni), torch.arange(Nj), torch.arange(Nk))
-                        mask = self.Hit[i].bool()
-                        # mask = self.M.bool()
-                        xx = xx[mask]
-                        yy = yy[mask]
-                        zz = zz[mask]
-                        lambda_j = lambda_itr[xx, yy, zz]
-                        w = self.W[i, xx, yy, zz, :, :]
-
-                        mtr_x_1 = torch.matmul(tDx_i, sigma_D_inv)
-                        mtr_x_2 = torch.matmul(mtr_x_1, w)
-                        mtr_x_3 = torch.matmul(mtr_x_2, sigma_D_inv)
-                        mtr_x_4 = torch.matmul(mtr_x_3, self.Dx[i])
-
-                        mtr_y_1 = torch.matmul(tDy_i, sigma_D_inv)
-                        mtr_y_2 = torch.matmul(mtr_y_1, w)
-                        mtr_y_3 = torch.matmul(mtr_y_2, sigma_D_inv)
-                        mtr_y_4 = torch.matmul(mtr_y_3, self.Dy[i])
-
-                        mtr_5 = (
-                            torch.einsum(
-                                "ijk,ikl->ijl",
-                                sigma_D_inv.unsqueeze(0).expand(len(xx), 2, 2),
-                                w,
-                            )
-                            .diagonal(dim1=1, dim2=2)
-                            .sum(dim=1)
-                        )
-
-                        Sx[i, mask] = 2 * lambda_j + (mtr_x_4 - mtr_5) * (pr_i**2) * (lambda_j**2)
-
-                        Sy[i, mask] = 2 * lambda_j + (mtr_y_4 - mtr_5) * (pr_i**2) * (lambda_j**2)
-
-                        # # comprobación de matrices y calculos:
-                        # # Solo para unos pocos eventos
-                        # if i in range(0, 10):  # Puedes cambiar estos valores
-                        #     print(f"\n[Iter {itr}] Muon {i}:")
-                        #     print(f"  pr_i = {pr_i.item():.3f}")
-                        #     print(f"  det(sigma_D) = {det_sigma_D.item():.3e}")
-                        #     print(f"  lambda_j stats: min={lambda_j.min():.2e}, max={lambda_j.max():.2e}, mean={lambda_j.mean():.2e}")
-
-                        #     diff = mtr_x_4 - mtr_5
-                        #     print(f"  (mtr_x_4 - mtr_5) stats: min={diff.min():.2e}, max={diff.max():.2e}, mean={diff.mean():.2e}")
-
-                        #     # Verificar tamaños
-                        #     print(f"  Shapes: mtr_x_4={mtr_x_4.shape}, mtr_5={mtr_5.shape}, lambda_j={lambda_j.shape}")
-
-                        # Si descomento estas lineas el codigo se peta y no se ejecuta
-                        # if torch.isnan(Sx).any() or torch.isnan(Sy).any():
-                        #     print(f"NaN en Sx o Sy en evento {i}")
-
-                        S[i, mask] = (Sx[i, mask] + Sy[i, mask]) / 2
-
-            # scatter_density[itr + 1, :, :, :] = torch.sum(S, dim=0) / (2 * self.M)
-
-            # denom = 2 * self.M
-            # denom[denom == 0] = 1e-12  # para evitar división por cero
-            # scatter_density[itr + 1, :, :, :] = torch.sum(S, dim=0) / denom
-
+        # Entries of muon i are given by offsets[i]: offsets[i + 1]
+        offsets = torch.zeros(n_events + 1, dtype=torch.int64)
+        offsets[1:] = torch.cumsum(torch.bincount(self.muon_ids, minlength=n_events), dim=0)
+        offsets_list = offsets.tolist()
+
+        for itr in progress_bar(range(0, self.em_iter - 1)):
+            lambda_path = scatter_density[itr].flatten()[self.voxel_ids]
+            S_voxels = torch.zeros(Ni * Nj * Nk)
+
+            # Expectation step
+            for first in range(0, n_events, batch_size):
+                last = min(first + batch_size, n_events)
+                start, end = offsets_list[first], offsets_list[last]
+
+                S = self._compute_batch_S(
+                    W=self.W[start:end],
+                    lambda_path=lambda_path[start:end],
+                    hit=self.Hit[start:end],
+                    muon_ids=self.muon_ids[start:end] - first,
+                    pr=self.pr[first:last],
+                    Dx=self.Dx[first:last],
+                    Dy=self.Dy[first:last],
+                )
+
+                # Sum the (muon, voxel) contributions of each voxel
+                S_voxels.index_add_(0, self.voxel_ids[start:end], S)
+
+            # Maximization step
             mask = self.M != 0
-            scatter_density[itr + 1][mask] = (torch.sum(S, dim=0) / (2 * self.M))[mask]
+            scatter_density[itr + 1][mask] = (S_voxels.reshape(Ni, Nj, Nk) / (2 * self.M))[mask]
 
         rad_len = (15e-3 / p_0) ** 2 / scatter_density
 
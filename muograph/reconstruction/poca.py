@@ -1,17 +1,16 @@
 import torch
 from torch import Tensor
-from copy import deepcopy
-from typing import Optional, Dict, Union
+from typing import Optional, Dict, Union, Tuple
 import matplotlib
 import matplotlib.pyplot as plt
-from fastprogress import progress_bar
 import numpy as np
 import seaborn as sns
 import math
+import h5py
 
 from muograph.utils.save import AbsSave
 from muograph.utils.device import DEVICE
-from muograph.utils.datatype import dtype_track, dtype_n
+from muograph.utils.datatype import dtype_n
 from muograph.volume.volume import Volume
 from muograph.tracking.tracking import TrackingMST
 from muograph.plotting.voxel import VoxelPlotting
@@ -23,11 +22,6 @@ Provides class for computing POCA locations and POCA-based voxelized scattering
 """
 
 
-def are_parallel(v1: Tensor, v2: Tensor, tol: float = 1e-5) -> bool:
-    cross_prod = torch.linalg.cross(v1, v2)
-    return bool(torch.all(torch.abs(cross_prod) < tol).detach().cpu().item())
-
-
 class POCA(AbsSave, VoxelPlotting):
     r"""
     A class for Point Of Closest Approach computation in the context of a Muon Scattering Tomography analysis.
@@ -39,18 +33,31 @@ class POCA(AbsSave, VoxelPlotting):
     _poca_indices: Optional[Tensor] = None  # (mu, 3)
     _mask_in_voi: Optional[Tensor] = None  # (mu)
 
-    _batch_size: int = 2048
+    # Closest approach features
+    _dca: Optional[Tensor] = None  # (mu)
+    _t_in: Optional[Tensor] = None  # (mu)
+    _t_out: Optional[Tensor] = None  # (mu)
+    _opening_angle: Optional[Tensor] = None  # (mu)
+    _poca_vars = ["_poca_points", "_poca_indices", "_dca", "_t_in", "_t_out", "_opening_angle"]
 
     _vars_to_save = [
         "poca_points",
         "n_poca_per_vox",
         "poca_indices",
+        "dca",
+        "t_in",
+        "t_out",
+        "opening_angle",
     ]
 
     _vars_to_load = [
         "poca_points",
         "n_poca_per_vox",
         "poca_indices",
+        "dca",
+        "t_in",
+        "t_out",
+        "opening_angle",
     ]
 
     def __init__(
@@ -59,33 +66,41 @@ class POCA(AbsSave, VoxelPlotting):
         voi: Optional[Volume] = None,
         poca_file: Optional[str] = None,
         output_dir: Optional[str] = None,
+        min_opening_angle: float = 1e-3,
     ) -> None:
         r"""
         Initializes the POCA object with either an instance of the TrackingMST class or a
         poca.hdf5 file.
 
+        Along with the POCA points, the distance of closest approach `dca`, the track parameters at
+        closest approach `t_in` and `t_out`, and the opening angle between the tracks are computed in the same pass.
+
         Args:
-            - tracking (Optional[TrackingMST]): Instance of the TrackingMST class.
+            - tracking (Optional[TrackingMST]): Instance of the TrackingMST class. It is not modified,
+            `tracks` being a filtered view of `tracking` (see `TrackingMST.select`).
             - voi (Optional[Volume]): Instance of the Volume class. If provided, muon events with
             poca locations outside the voi will be filtered out, the number of poca locations per voxel
             `n_poca_per_vox` as well as the voxel indices of each poca location will be computed.
             poca_file (Optional[str]): The path to the poca.hdf5 to load attributes from.
             - output_dir (Optional[str]): Path to a directory where to save POCA attributes
             in a hdf5 file.
+            - min_opening_angle (float): The minimum opening angle between the incoming and outgoing tracks, in [rad],
+            for the POCA point to be flagged as well-defined in `quality_flag`.
         """
         AbsSave.__init__(self, output_dir=output_dir)
         VoxelPlotting.__init__(self, voi)
+        self.min_opening_angle = min_opening_angle
 
         if tracking is None and poca_file is None:
             raise ValueError("Provide either poca.hdf5 file of TrackingMST instance.")
 
         # Compute poca attributes if TrackingMST is provided
         elif (tracking is not None) and (voi is not None):
-            self.tracks = deepcopy(tracking)
+            self.tracks = tracking
             self.voi = voi
 
-            # Remove parallel events
-            self.tracks._filter_muons(self.parallel_mask)
+            # Remove parallel events, as a filtered view of `tracking`
+            self.tracks = tracking.select(self.parallel_mask)
 
             # Remove POCAs outside voi
             self.tracks._filter_muons(self.mask_in_voi)
@@ -95,9 +110,12 @@ class POCA(AbsSave, VoxelPlotting):
             if output_dir is not None:
                 self.save_attr(self._vars_to_save, self.output_dir, filename="poca")
 
-        # Load poca attributes from hdf5 if poca_file is provided
+        # Load poca attributes from hdf5 if poca_file is provided.
+        # Files saved without the closest approach features are still supported.
         elif tracking is None and poca_file is not None:
-            self.load_attr(self._vars_to_load, poca_file)
+            with h5py.File(poca_file, "r") as f:
+                vars_to_load = [var for var in self._vars_to_load if var in f]
+            self.load_attr(vars_to_load, poca_file)
 
     def __repr__(self) -> str:
         return f"Collection of {self.n_mu} POCA locations."
@@ -125,12 +143,77 @@ class POCA(AbsSave, VoxelPlotting):
 
     def _filter_pocas(self, mask: Tensor) -> None:
         r"""
-        Remove poca points specified as False in `mask`.
+        Remove poca points, and their closest approach features, specified as False in `mask`.
 
         Arguments:
             mask: (N,) Boolean tensor. poca points with False elements will be removed.
         """
         self.poca_points = self.poca_points[mask]
+        for var in self._poca_vars[1:]:
+            if getattr(self, var) is not None:
+                setattr(self, var, getattr(self, var)[mask])
+
+    @staticmethod
+    def compute_closest_approach(
+        points_in: Tensor, points_out: Tensor, tracks_in: Tensor, tracks_out: Tensor, chunk_size: int = 200_000
+    ) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor]:
+        """
+        Computes the points of closest approach between the incoming and outgoing tracks, in closed form.
+
+        Given 2 lines L1, L2 aka incoming and outgoing tracks with parametric equation:
+        L1 = P1 + t1*V1, L2 = P2 + t2*V2
+
+        1- The segment Q1-Q2 of shortest length between L1 and L2 is parallel to N = V1 x V2.
+        2- Projecting P1 + t1*V1 - P2 - t2*V2 = s*N onto V2 x N and V1 x N gives, with W = P2 - P1:
+        t1 = W.(V2 x N) / N.N and t2 = W.(V1 x N) / N.N
+        3- The POCA location M is the middle of the segment Q1-Q2 where Q1,2 = P1,2 + t1,2*V1,2,
+        and the distance of closest approach is |Q1-Q2| = |W.N| / |N|.
+        4- The opening angle between the tracks is atan2(|N|, |V1.V2|), accurate for small angles.
+
+        Muons are processed in chunks of `chunk_size` on the device of the input tensors, without synchronization.
+        Parallel tracks (N = 0) yield non-finite values, and must be removed beforehand (see `compute_parallel_mask`).
+
+        Arguments:
+            points_in: xyz coordinates of a point on the incomming track, with size (n_mu, 3).
+            points_out: xyz coordinates of a point on the outgoing track, with size (n_mu, 3).
+            tracks_in: The incomming track, with size (n_mu, 3).
+            tracks_out: The outgoing track, with size (n_mu, 3).
+            chunk_size: The number of muons processed at once.
+
+        Returns:
+            poca_points: POCA points' coordinates, with size (n_mu, 3).
+            dca: The distance of closest approach between the tracks, with size (n_mu).
+            t_in: The incoming track parameter t1 at closest approach, with size (n_mu).
+            t_out: The outgoing track parameter t2 at closest approach, with size (n_mu).
+            opening_angle: The angle between the incoming and outgoing tracks in [rad], with size (n_mu).
+        """
+
+        def dot(a: Tensor, b: Tensor) -> Tensor:
+            return (a * b).sum(dim=-1)
+
+        n_mu = points_in.size(0)
+        poca_points = torch.empty_like(points_in)
+        dca, t_in, t_out, opening_angle = (torch.empty(n_mu, dtype=points_in.dtype, device=points_in.device) for _ in range(4))
+
+        for start in range(0, n_mu, chunk_size):
+            end = min(start + chunk_size, n_mu)
+            P1, P2 = points_in[start:end], points_out[start:end]
+            V1, V2 = tracks_in[start:end], tracks_out[start:end]
+
+            N = torch.linalg.cross(V1, V2, dim=-1)
+            W = P2 - P1
+            NN = dot(N, N)
+
+            t1 = dot(W, torch.linalg.cross(V2, N, dim=-1)) / NN
+            t2 = dot(W, torch.linalg.cross(V1, N, dim=-1)) / NN
+
+            Q1, Q2 = P1 + t1.unsqueeze(-1) * V1, P2 + t2.unsqueeze(-1) * V2
+            poca_points[start:end] = (Q1 + Q2) / 2
+            dca[start:end] = dot(W, N).abs() / NN.sqrt()
+            t_in[start:end], t_out[start:end] = t1, t2
+            opening_angle[start:end] = torch.atan2(NN.sqrt(), dot(V1, V2).abs())
+
+        return poca_points, dca, t_in, t_out, opening_angle
 
     @staticmethod
     def compute_poca_points(points_in: Tensor, points_out: Tensor, tracks_in: Tensor, tracks_out: Tensor) -> Tensor:
@@ -144,7 +227,11 @@ class POCA(AbsSave, VoxelPlotting):
         URL = {https://math.stackexchange.com/q/3334866}
         }
 
-        Compute POCA points.
+        Compute POCA points, see `compute_closest_approach`.
+
+        As `compute_closest_approach`, the POCA points of individual parallel tracks are not finite,
+        such that parallel tracks must be removed beforehand (see `compute_parallel_mask`).
+        A ValueError is raised if all the tracks are parallel or nearly parallel.
 
         Arguments:
             points_in: xyz coordinates of a point on the incomming track, with size (n_mu, 3).
@@ -154,56 +241,18 @@ class POCA(AbsSave, VoxelPlotting):
 
         Returns:
             POCA points' coordinate(n_mu, 3)
-
-        Given 2 lines L1, L2 aka incoming and outgoing tracks with parametric equation:
-        L1 = P1 + t*V1
-
-        1- A segment of shortest length between two 3D lines L1 L2 is perpendicular to both lines (if L1 L2 are neither parallele or in the same plane). One must compute V3, vector perpendicular to L1 and L2
-        2- Search for points where L3 = P1 + t1*V1 +t3*V3 crosses L2. One must find t1 and t2 for which:
-        L3 = P1 + t1*V1 +t3*V3 = P2 + t2*V2
-
-        3- Then POCA location M is the middle of the segment Q1-Q2 where Q1,2 = P1,2 +t1,2*V1,2
         """
-        from numpy import cross
-
-        P1, P2 = points_in[:], points_out[:]
-        V1, V2 = tracks_in[:], tracks_out[:]
-
-        V3 = torch.tensor(
-            cross(V2.detach().cpu().numpy(), V1.detach().cpu().numpy()),
-            dtype=dtype_track,
-            device=DEVICE,
+        poca_points, _, __, ___, opening_angle = POCA.compute_closest_approach(
+            points_in=points_in, points_out=points_out, tracks_in=tracks_in, tracks_out=tracks_out
         )
 
-        if are_parallel(V1, V2):
+        if (opening_angle < 1e-5).all():
             raise ValueError("Tracks are parallel or nearly parallel")
 
-        RES = P2 - P1
-        LES = torch.transpose(torch.stack([V1, -V2, V3]), 0, 1)
-        LES = torch.transpose(LES, -1, 1)
-
-        if LES.dtype != RES.dtype:
-            LES = torch.ones_like(LES, dtype=torch.float32) * LES
-            RES = torch.ones_like(RES, dtype=torch.float32) * RES
-
-        try:
-            ts = torch.linalg.solve(LES, RES)
-        except RuntimeError as e:
-            if "singular" in str(e):
-                raise ValueError(f"Singular matrix encountered for points: {P1}, {P2} with tracks: {V1}, {V2}")
-            else:
-                raise e
-
-        t1 = torch.stack([ts[:, 0], ts[:, 0], ts[:, 0]], -1)
-        t2 = torch.stack([ts[:, 1], ts[:, 1], ts[:, 1]], -1)
-
-        Q1s, Q2s = P1 + t1 * V1, P2 + t2 * V2
-        M = (Q2s - Q1s) / 2 + Q1s
-
-        return M
+        return poca_points
 
     @staticmethod
-    def assign_voxel_to_pocas(poca_points: Tensor, voi: Volume, batch_size: int) -> Tensor:
+    def assign_voxel_to_pocas(poca_points: Tensor, voi: Volume) -> Tensor:
         """
         Get the indinces of the voxel corresponding to each poca point.
 
@@ -212,84 +261,32 @@ class POCA(AbsSave, VoxelPlotting):
             - voi: An instance of the VolumeInterest class.
 
         Returns:
-            - poca points voxel indices as List[List[int]] with length n_mu.
+            - poca points voxel indices as Tensor with size (n_mu, 3).
+            Indices of poca points outside the voi are set to -1.
         """
-        indices = torch.ones((len(poca_points), 3), dtype=dtype_n, device=poca_points.device) * -1
-
-        # Process POCA points in batches
-        for start in progress_bar(range(0, len(poca_points), batch_size)):
-            end = min(start + batch_size, len(poca_points))
-            poca_batch = poca_points[start:end]  # Batch size is (batch_size, 3)
-
-            voxel_index = torch.full((poca_batch.size(0), 3), -1, dtype=dtype_n, device=poca_batch.device)
-
-            for dim in range(3):  # Loop over x, y, z dimensions
-                # Extract lower and upper bounds for voxels along the current dimension
-                lower_bounds = voi.voxel_edges[..., 0, dim]  # Shape: (vox_x, vox_y, vox_z)
-                upper_bounds = voi.voxel_edges[..., 1, dim]  # Shape: (vox_x, vox_y, vox_z)
-
-                # Broadcast comparison across the batch
-                mask_lower = poca_batch[:, dim].unsqueeze(1).unsqueeze(1).unsqueeze(1) >= lower_bounds  # Shape: (batch_size, vox_x, vox_y, vox_z)
-                mask_upper = poca_batch[:, dim].unsqueeze(1).unsqueeze(1).unsqueeze(1) <= upper_bounds  # Shape: (batch_size, vox_x, vox_y, vox_z)
-
-                valid_voxels = mask_lower & mask_upper  # Shape: (batch_size, vox_x, vox_y, vox_z)
-
-                # Find the first valid voxel index for each POCA point in the batch
-                valid_indices = valid_voxels.nonzero(as_tuple=False)  # Shape: (num_valid_points, 4) - (batch_idx, x_idx, y_idx, z_idx)
-
-                # Remove the loop by assigning voxel indices for the whole batch at once
-                # Get the first valid index for each POCA point using a mask
-                first_valid_indices = valid_indices[:, 1 + dim].view(-1)  # Extract indices for current dim (x_idx, y_idx, z_idx)
-
-                # Ensure that each POCA point gets a valid index
-                batch_indices = valid_indices[:, 0]  # Get the batch indices corresponding to each POCA point
-
-                # Use advanced indexing to assign voxel indices
-                voxel_index[batch_indices, dim] = first_valid_indices.to(dtype_n)
-
-            indices[start:end] = voxel_index
-        return indices
+        return voi.get_voxel_indices(poca_points)
 
     @staticmethod
     def compute_n_poca_per_vox(poca_points: Tensor, voi: Volume) -> Tensor:
         """
         Computes the number of POCA points per voxel, given a voxelized volume VOI.
+        POCA points are binned in a single pass on the device of `poca_points`.
 
         Arguments:
          - voi:VolumeIntrest, an instance of the VOI class.
          - poca_points: Tensor containing the poca points location, with size (n_mu, 3).
 
         Returns:
-         - n_poca_per_vox: torch.tensor(dtype=int64) with size (nvox_x,nvox_y,nvox_z),
+         - n_poca_per_vox: torch.tensor(dtype=int32) with size (nvox_x,nvox_y,nvox_z),
          the number of poca points per voxel.
         """
 
-        n_poca_per_vox = torch.zeros(tuple(voi.n_vox_xyz), device=DEVICE, dtype=dtype_n)
-
-        for i in range(voi.n_vox_xyz[2]):
-            z_min = voi.xyz_min[2] + i * voi.vox_width
-            z_max = z_min + voi.vox_width
-            mask_slice = (poca_points[:, 2] >= z_min) & ((poca_points[:, 2] <= z_max))
-
-            H, _, __ = np.histogram2d(
-                poca_points[mask_slice, 0].detach().cpu().numpy(),
-                poca_points[mask_slice, 1].detach().cpu().numpy(),
-                bins=(int(voi.n_vox_xyz[0]), int(voi.n_vox_xyz[1])),
-                range=(
-                    (
-                        voi.xyz_min[0].detach().cpu().numpy(),
-                        voi.xyz_max[0].detach().cpu().numpy(),
-                    ),
-                    (
-                        voi.xyz_min[1].detach().cpu().numpy(),
-                        voi.xyz_max[1].detach().cpu().numpy(),
-                    ),
-                ),
-            )
+        indices = voi.get_voxel_indices(poca_points)
+        indices = indices[(indices >= 0).all(dim=-1)]
 
-            n_poca_per_vox[:, :, i] = torch.tensor(H, dtype=dtype_n)
+        n_poca_per_vox = torch.bincount(voi.get_flat_voxel_indices(indices), minlength=math.prod(voi.n_vox_xyz))
 
-        return n_poca_per_vox
+        return n_poca_per_vox.reshape(voi.n_vox_xyz).to(dtype_n)
 
     @staticmethod
     def compute_mask_in_voi(poca_points: Tensor, voi: Volume) -> Tensor:
@@ -414,23 +411,106 @@ class POCA(AbsSave, VoxelPlotting):
         r"""The number of muons."""
         return self.poca_points.shape[0]
 
+    def _compute_closest_approach(self) -> None:
+        r"""
+        Computes the POCA points and closest approach features from the incoming and outgoing tracks.
+        Only the missing ones are set, such that features already computed, filtered or loaded are kept.
+        """
+        if not hasattr(self, "tracks"):
+            raise ValueError("The closest approach features are missing from the POCA file, and cannot be computed without tracks.")
+
+        features = self.compute_closest_approach(
+            points_in=self.tracks.points_in,
+            points_out=self.tracks.points_out,
+            tracks_in=self.tracks.tracks_in,
+            tracks_out=self.tracks.tracks_out,
+        )
+
+        for var, value in zip(["_poca_points", "_dca", "_t_in", "_t_out", "_opening_angle"], features):
+            if getattr(self, var) is None:
+                setattr(self, var, value)
+
+    def get_quality_mask(self, dca_range: Tuple[float, float] = (0.0, math.inf), use_quality_flag: bool = True) -> Tensor:
+        r"""
+        Computes the mask of the POCA points passing the closest approach quality cuts.
+
+        Args:
+            - dca_range (Tuple[float, float]): The range of accepted distance of closest approach, in [mm].
+            - use_quality_flag (bool): If True, POCA points with an opening angle below `min_opening_angle` are rejected.
+
+        Returns:
+            - mask (Tensor): Boolean tensor with size (mu), True if the POCA point passes the cuts.
+        """
+        mask = (self.dca >= dca_range[0]) & (self.dca <= dca_range[1])
+        if use_quality_flag:
+            mask &= self.quality_flag
+        return mask
+
     @property
     def poca_points(self) -> Tensor:
         r"""Tensor: The POCA points computed from the incoming and outgoing tracks."""
         if self._poca_points is None:
-            self._poca_points = self.compute_poca_points(
-                points_in=self.tracks.points_in,
-                points_out=self.tracks.points_out,
-                tracks_in=self.tracks.tracks_in,
-                tracks_out=self.tracks.tracks_out,
-            )
-        return self._poca_points
+            self._compute_closest_approach()
+        return self._poca_points  # type: ignore
 
     @poca_points.setter
     def poca_points(self, value: Tensor) -> None:
         r"""Set the POCA points."""
         self._poca_points = value
 
+    @property
+    def dca(self) -> Tensor:
+        r"""Tensor: The distance of closest approach between the incoming and outgoing tracks, in [mm]."""
+        if self._dca is None:
+            self._compute_closest_approach()
+        return self._dca  # type: ignore
+
+    @dca.setter
+    def dca(self, value: Tensor) -> None:
+        r"""Set the distance of closest approach."""
+        self._dca = value
+
+    @property
+    def t_in(self) -> Tensor:
+        r"""Tensor: The incoming track parameter at closest approach, the closest point being `points_in + t_in * tracks_in`."""
+        if self._t_in is None:
+            self._compute_closest_approach()
+        return self._t_in  # type: ignore
+
+    @t_in.setter
+    def t_in(self, value: Tensor) -> None:
+        r"""Set the incoming track parameters at closest approach."""
+        self._t_in = value
+
+    @property
+    def t_out(self) -> Tensor:
+        r"""Tensor: The outgoing track parameter at closest approach, the closest point being `points_out + t_out * tracks_out`."""
+        if self._t_out is None:
+            self._compute_closest_approach()
+        return self._t_out  # type: ignore
+
+    @t_out.setter
+    def t_out(self, value: Tensor) -> None:
+        r"""Set the outgoing track parameters at closest approach."""
+        self._t_out = value
+
+    @property
+    def opening_angle(self) -> Tensor:
+        r"""Tensor: The opening angle between the incoming and outgoing tracks, in [rad]."""
+        if self._opening_angle is None:
+            self._compute_closest_approach()
+        return self._opening_angle  # type: ignore
+
+    @opening_angle.setter
+    def opening_angle(self, value: Tensor) -> None:
+        r"""Set the opening angles."""
+        self._opening_angle = value
+
+    @property
+    def quality_flag(self) -> Tensor:
+        r"""Tensor: True if the opening angle is above `min_opening_angle`, i.e the POCA point is well-defined."""
+        return self.opening_angle >= self.min_opening_angle
+
     @property
     def mask_in_voi(self) -> Tensor:
         r"""Tensor: The mask indicating which POCA points are within the volume of interest (VOI)."""
@@ -454,7 +534,7 @@ class POCA(AbsSave, VoxelPlotting):
     def poca_indices(self) -> Tensor:
         r"""Tensor: The indices of the POCA points assigned to each voxel."""
         if self._poca_indices is None:
-            self._poca_indices = self.assign_voxel_to_pocas(poca_points=self.poca_points, voi=self.voi, batch_size=self._batch_size)
+            self._poca_indices = self.assign_voxel_to_pocas(poca_points=self.poca_points, voi=self.voi)
         return self._poca_indices
 
     @poca_indices.setter
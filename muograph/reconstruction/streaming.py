@@ -0,0 +1,924 @@
+import torch
+from torch import Tensor
+from typing import Optional, Tuple, Union, Callable, Iterable, Dict, Any
+from copy import copy
+from functools import partial
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import math
+
+from muograph.hits.hits import Hits, filter_nans
+from muograph.tracking.tracking import Tracking, TrackingMST
+from muograph.reconstruction.poca import POCA
+from muograph.reconstruction.binned_clustered import BCA, bca_params_type
+from muograph.volume.volume import Volume
+from muograph.plotting.voxel import VoxelPlotting
+from muograph.utils.device import DEVICE
+from muograph.utils.datatype import dtype_n, dtype_track, dtype_E
+from muograph.utils.tools import get_segment_quantile
+
+r"""
+Provides classes for streaming muon batches from hits to voxel-wise predictions in bounded memory.
+"""
+
+
+class TensorBuffer:
+    r"""
+    A tensor growing along its first dimension. The storage capacity is doubled when full,
+    such that appending n rows has an amortized cost proportional to n.
+    """
+
+    def __init__(self, row_shape: Tuple[int, ...] = (), dtype: torch.dtype = torch.float32, capacity: int = 1024) -> None:
+        r"""
+        Initializes the TensorBuffer object.
+
+        Args:
+            - row_shape (Tuple[int, ...]): The shape of each row, e.g (3,) for points.
+            - dtype (torch.dtype): The data type of the tensor.
+            - capacity (int): The initial number of rows allocated.
+        """
+        self._data = torch.empty((max(capacity, 1),) + tuple(row_shape), dtype=dtype, device=DEVICE)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, rows: Tensor) -> None:
+        r"""
+        Appends rows at the end of the tensor.
+
+        Args:
+            - rows (Tensor): The rows to append, with size (n, *row_shape).
+        """
+        size = self._size + len(rows)
+        if size > len(self._data):
+            data = torch.empty((max(size, 2 * len(self._data)),) + self._data.shape[1:], dtype=self._data.dtype, device=self._data.device)
+            data[: self._size] = self._data[: self._size]
+            self._data = data
+
+        self._data[self._size : size] = rows
+        self._size = size
+
+    @property
+    def data(self) -> Tensor:
+        r"""
+        The appended rows, as a view of the storage, with size (n, *row_shape).
+        """
+        return self._data[: self._size]
+
+
+class VoxelStatistics:
+    r"""
+    A class accumulating the per-voxel sufficient statistics of a muon-wise feature (e.g. the scattering angle),
+    without keeping the muon-wise values in memory:
+
+        - The number of values per voxel.
+        - The sum and sum of squares of the values per voxel, giving the exact mean and root mean square.
+        - A histogram of the values per voxel, with logarithmic or linear bins, used as a sketch to compute approximate quantiles.
+
+    Histograms are only allocated for the voxels containing values, such that the memory scales with the number of
+    non-empty voxels rather than the total number of voxels. Instances computed from independent batches of muons can be merged.
+    """
+
+    def __init__(
+        self,
+        voi: Volume,
+        value_range: Tuple[float, float] = (1e-5, math.pi),
+        n_bins: int = 128,
+        log_bins: bool = True,
+    ) -> None:
+        r"""
+        Initializes the VoxelStatistics object.
+
+        Args:
+            - voi (Volume): Instance of the Volume class.
+            - value_range (Tuple[float, float]): The range of the histogram bins. Values outside of the range
+            are counted in the underflow and overflow bins. Defaults to (1e-5, pi), suited for scattering angles in radians.
+            - n_bins (int): The number of histogram bins. With logarithmic bins, the relative precision of the quantiles is of the order of
+            (value_range[1] / value_range[0]) ** (1 / n_bins) - 1.
+            - log_bins (bool): If True, the bins are evenly spaced in logarithmic scale, and the values must be positive.
+            Otherwise, the bins are evenly spaced in linear scale, e.g for values already in logarithmic scale.
+        """
+        if value_range[1] <= value_range[0]:
+            raise ValueError("value_range must be increasing.")
+        if log_bins & (value_range[0] <= 0):
+            raise ValueError("value_range must be positive with logarithmic bins.")
+
+        self.voi = voi
+        self.value_range = value_range
+        self.n_bins = n_bins
+        self.log_bins = log_bins
+
+        n_vox = math.prod(voi.n_vox_xyz)
+
+        # Per-voxel statistics
+        self.counts = torch.zeros(n_vox, dtype=torch.int64, device=DEVICE)
+        self.sums = torch.zeros(n_vox, dtype=torch.float64, device=DEVICE)
+        self.sums_sq = torch.zeros(n_vox, dtype=torch.float64, device=DEVICE)
+
+        # Row of the histogram of each voxel, -1 if the voxel contains no value
+        self._rows = torch.full((n_vox,), -1, dtype=torch.int64, device=DEVICE)
+
+        # Histograms of the non-empty voxels: underflow, n_bins bins, overflow
+        self._hist = TensorBuffer((n_bins + 2,), torch.int32)
+
+        # Bin edges, in logarithmic scale if log_bins, with size (n_bins + 1)
+        low, high = (math.log(value_range[0]), math.log(value_range[1])) if log_bins else value_range
+        self.edges = torch.linspace(low, high, n_bins + 1, dtype=torch.float64, device=DEVICE)
+
+    def __repr__(self) -> str:
+        return f"Voxel-wise statistics of {self.counts.sum().item():,d} values in {self.counts.numel():,d} voxels."
+
+    def __getstate__(self) -> Dict[str, Any]:
+        r"""
+        Only the statistics of the non-empty voxels and the non-empty histogram bins are pickled,
+        such that statistics sent between processes are compact.
+        """
+        state = copy(self.__dict__)
+
+        voxels = torch.nonzero(self._rows >= 0).flatten()
+        state["counts"], state["sums"], state["sums_sq"] = self.counts[voxels], self.sums[voxels], self.sums_sq[voxels]
+        state.pop("_rows")
+        state["_voxels"] = voxels
+
+        hist = self._hist.data[self._rows[voxels]]
+        bins = torch.nonzero(hist.view(-1)).flatten()
+        state["_hist"] = hist.view(-1)[bins]
+        state["_bins"] = bins
+
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        voxels, bins = state.pop("_voxels"), state.pop("_bins")
+        n_vox = math.prod(state["voi"].n_vox_xyz)
+
+        for var in ("counts", "sums", "sums_sq"):
+            values = state[var]
+            state[var] = torch.zeros(n_vox, dtype=values.dtype, device=DEVICE)
+            state[var][voxels] = values.to(DEVICE)
+
+        state["_rows"] = torch.full((n_vox,), -1, dtype=torch.int64, device=DEVICE)
+        state["_rows"][voxels] = torch.arange(len(voxels), device=DEVICE)
+
+        hist = torch.zeros((len(voxels), state["n_bins"] + 2), dtype=torch.int32, device=DEVICE)
+        hist.view(-1)[bins] = state["_hist"].to(DEVICE)
+        state["_hist"] = TensorBuffer((state["n_bins"] + 2,), torch.int32, capacity=len(voxels))
+        state["_hist"].append(hist)
+
+        self.__dict__.update(state)
+
+    @property
+    def voxels(self) -> Tensor:
+        r"""
+        The sorted flat indices of the non-empty voxels, with size (n_non_empty_vox).
+        """
+        return torch.nonzero(self._rows >= 0).flatten()
+
+    @property
+    def hist(self) -> Tensor:
+        r"""
+        The histograms of the non-empty voxels, ordered as `voxels`, with size (n_non_empty_vox, n_bins + 2).
+        The first and last bins count the underflow and overflow values.
+        """
+        return self._hist.data[self._rows[self.voxels]]
+
+    def _allocate(self, flat_voxel_indices: Tensor) -> None:
+        r"""
+        Allocates the histograms of the voxels containing values for the first time.
+        """
+        touched_voxels = torch.unique(flat_voxel_indices)
+        new_voxels = touched_voxels[self._rows[touched_voxels] < 0]
+        self._rows[new_voxels] = torch.arange(len(self._hist), len(self._hist) + len(new_voxels), device=DEVICE)
+        self._hist.append(torch.zeros((len(new_voxels), self.n_bins + 2), dtype=torch.int32, device=DEVICE))
+
+    def update(self, flat_voxel_indices: Tensor, values: Tensor) -> None:
+        r"""
+        Adds a batch of values to the statistics of their voxel.
+
+        Args:
+            - flat_voxel_indices (Tensor): The flat voxel index of each value, as returned by `Volume.get_flat_voxel_indices`, with size (n,).
+            - values (Tensor): The values, with size (n,).
+        """
+        flat_voxel_indices = flat_voxel_indices.long().to(DEVICE)
+        values = values.double().to(DEVICE)
+
+        self.counts += torch.bincount(flat_voxel_indices, minlength=len(self.counts))
+        self.sums.index_add_(0, flat_voxel_indices, values)
+        self.sums_sq.index_add_(0, flat_voxel_indices, values**2)
+
+        # Histogram bin of each value, 0 for underflow and n_bins + 1 for overflow
+        scaled_values = torch.log(values.clamp(min=torch.finfo(torch.float64).tiny)) if self.log_bins else values
+        bins = torch.bucketize(scaled_values, self.edges, right=True)
+        bins = torch.where(values >= self.value_range[1], self.n_bins + 1, bins)
+
+        self._allocate(flat_voxel_indices)
+        rows = self._rows[flat_voxel_indices]
+        self._hist.data.view(-1).index_add_(0, rows * (self.n_bins + 2) + bins, torch.ones_like(bins, dtype=torch.int32))
+
+    def merge(self, other: "VoxelStatistics") -> None:
+        r"""
+        Merges the statistics of another instance, computed from an independent batch of muons, in-place.
+
+        Args:
+            - other (VoxelStatistics): The statistics to merge, with identical voxelization and histogram bins.
+        """
+        if (
+            (self.counts.size() != other.counts.size())
+            | (self.n_bins != other.n_bins)
+            | (self.value_range != other.value_range)
+            | (self.log_bins != other.log_bins)
+        ):
+            raise ValueError("Cannot merge voxel statistics with different voxelization or histogram bins.")
+
+        self.counts += other.counts.to(DEVICE)
+        self.sums += other.sums.to(DEVICE)
+        self.sums_sq += other.sums_sq.to(DEVICE)
+
+        voxels = other.voxels.to(DEVICE)
+        self._allocate(voxels)
+        self._hist.data[self._rows[voxels]] += other.hist.to(DEVICE)
+
+    @property
+    def mean(self) -> Tensor:
+        r"""
+        The mean of the values per voxel, with size (nx, ny, nz). Empty voxels are set to 0.
+        """
+        return (self.sums / self.counts.clamp(min=1)).reshape(self.voi.n_vox_xyz)
+
+    @property
+    def rms(self) -> Tensor:
+        r"""
+        The root mean square of the values per voxel, with size (nx, ny, nz). Empty voxels are set to 0.
+        """
+        return torch.sqrt(self.sums_sq / self.counts.clamp(min=1)).reshape(self.voi.n_vox_xyz)
+
+    def quantile(self, q: float) -> Tensor:
+        r"""
+        Approximates the q-th quantile of the values per voxel from the histogram, with an interpolation within the bins
+        in the scale of the bins. Quantiles falling in the underflow (overflow) bin are set to the lower (upper) bound of `value_range`.
+
+        Args:
+            - q (float): The quantile to compute, in [0, 1].
+
+        Returns:
+            - quantiles (Tensor): The quantiles, with size (nx, ny, nz). Empty voxels are set to 0.
+        """
+        voxels = self.voxels
+        hist = self._hist.data[self._rows[voxels]].long()  # (n_non_empty_vox, n_bins + 2)
+        cum_counts = torch.cumsum(hist, dim=1)
+
+        # Position of the quantile within the sorted values of each voxel, and the bin it falls in
+        position = q * (self.counts[voxels].double() - 1).clamp(min=0)
+        bins = torch.searchsorted(cum_counts.double(), position[:, None], right=True).squeeze(1).clamp(max=self.n_bins + 1)
+
+        # The values of a bin are assumed to be evenly spread within the bin
+        count_before = torch.where(bins > 0, cum_counts.gather(1, (bins - 1).clamp(min=0)[:, None]).squeeze(1), 0).double()
+        count_bin = hist.gather(1, bins[:, None]).squeeze(1).double()
+        fraction = ((position - count_before + 0.5) / count_bin.clamp(min=1)).clamp(0.0, 1.0)
+
+        # Interpolation within the bin
+        inner_bins = (bins - 1).clamp(0, self.n_bins - 1)
+        low, high = self.edges[inner_bins], self.edges[inner_bins + 1]
+        values = low + fraction * (high - low)
+        if self.log_bins:
+            values = torch.exp(values)
+
+        values = torch.where(bins == 0, self.value_range[0], values)
+        values = torch.where(bins == self.n_bins + 1, self.value_range[1], values)
+
+        quantiles = torch.zeros(len(self.counts), dtype=torch.float64, device=DEVICE)
+        quantiles[voxels] = values
+
+        return quantiles.reshape(self.voi.n_vox_xyz)
+
+    def get_score(self, score_method: Callable) -> Tensor:
+        r"""
+        Computes the per-voxel score corresponding to `score_method` from the statistics.
+
+        Args:
+            - score_method (Callable): Either `np.mean` / `torch.mean`, `np.median`, or a `np.quantile` / `torch.quantile`
+            partial with a scalar `q`.
+
+        Returns:
+            - scores (Tensor): The scores, with size (nx, ny, nz).
+        """
+        q = get_segment_quantile(score_method)
+        if q is not None:
+            return self.quantile(q)
+        elif score_method in (np.mean, torch.mean):
+            return self.mean
+        raise ValueError(f"score_method {score_method} cannot be computed from the voxel statistics.")
+
+
+class IncrementalPOCA(VoxelPlotting):
+    r"""
+    A class accumulating the POCA points of batches of muons, e.g during data taking.
+
+    Each update only processes the new batch: its POCA points and closest approach features are appended
+    to the current ones, and the number of POCA points per voxel is updated in place. The POCA points are
+    ordered as the batches were added, and the current state can be read at any time.
+    """
+
+    _n_mu: int = 0
+
+    # The POCA features accumulated, with their per-POCA shape and data type
+    _features: Dict[str, Tuple[Tuple[int, ...], torch.dtype]] = {
+        "poca_points": ((3,), dtype_track),
+        "poca_indices": ((3,), dtype_n),
+        "dtheta": ((), dtype_track),
+        "E": ((), dtype_E),
+        "dca": ((), dtype_track),
+        "opening_angle": ((), dtype_track),
+    }
+
+    def __init__(self, voi: Volume, min_opening_angle: float = 1e-3, capacity: int = 100_000) -> None:
+        r"""
+        Initializes the IncrementalPOCA object.
+
+        Args:
+            - voi (Volume): Instance of the Volume class. Only POCA points within the voi are kept.
+            - min_opening_angle (float): The minimum opening angle for a POCA point to be well-defined, see `POCA`.
+            - capacity (int): The initial number of POCA points allocated.
+        """
+        super().__init__(voi=voi)
+
+        self.min_opening_angle = min_opening_angle
+        self.buffers = {feature: TensorBuffer(row_shape, dtype, capacity) for feature, (row_shape, dtype) in self._features.items()}
+        self.n_poca_per_vox = torch.zeros(voi.n_vox_xyz, dtype=dtype_n, device=DEVICE)
+
+    def __repr__(self) -> str:
+        return f"Incremental POCA of {self.n_mu:,d} muons, with {self.n_poca:,d} POCA points in the volume."
+
+    def update(self, tracking: TrackingMST) -> Tensor:
+        r"""
+        Computes the POCA points of a new batch of muons, and adds them to the current state.
+
+        Args:
+            - tracking (TrackingMST): The incoming and outgoing tracks of the batch.
+
+        Returns:
+            - flat_indices (Tensor): The flat voxel indices of the new POCA points, with size (n_poca_batch).
+        """
+        self._n_mu += tracking.n_mu
+
+        poca = POCA(tracking=tracking, voi=self.voi, min_opening_angle=self.min_opening_angle)
+        batch = {
+            "poca_points": poca.poca_points,
+            "poca_indices": poca.poca_indices,
+            "dtheta": poca.tracks.dtheta,
+            "E": poca.tracks.E,
+            "dca": poca.dca,
+            "opening_angle": poca.opening_angle,
+        }
+        for feature, values in batch.items():
+            self.buffers[feature].append(values)
+
+        flat_indices = self.voi.get_flat_voxel_indices(poca.poca_indices)
+        self.n_poca_per_vox.view(-1).index_add_(0, flat_indices, torch.ones_like(flat_indices, dtype=dtype_n))
+
+        return flat_indices
+
+    def update_batches(self, batches: Iterable[TrackingMST]) -> None:
+        r"""
+        Adds an iterable of TrackingMST batches.
+
+        Args:
+            - batches (Iterable[TrackingMST]): The batches of incoming and outgoing tracks.
+        """
+        for tracking in batches:
+            self.update(tracking)
+
+    @property
+    def n_mu(self) -> int:
+        r"""
+        The number of muons processed, after detector efficiency.
+        """
+        return self._n_mu
+
+    @property
+    def n_poca(self) -> int:
+        r"""
+        The number of POCA points within the volume of interest.
+        """
+        return len(self.buffers["poca_points"])
+
+    @property
+    def poca_points(self) -> Tensor:
+        r"""Tensor: The POCA points, with size (n_poca, 3)."""
+        return self.buffers["poca_points"].data
+
+    @property
+    def poca_indices(self) -> Tensor:
+        r"""Tensor: The voxel indices of the POCA points, with size (n_poca, 3)."""
+        return self.buffers["poca_indices"].data
+
+    @property
+    def dtheta(self) -> Tensor:
+        r"""Tensor: The scattering angle of the muons, with size (n_poca)."""
+        return self.buffers["dtheta"].data
+
+    @property
+    def E(self) -> Tensor:
+        r"""Tensor: The energy of the muons, with size (n_poca)."""
+        return self.buffers["E"].data
+
+    @property
+    def dca(self) -> Tensor:
+        r"""Tensor: The distance of closest approach between the incoming and outgoing tracks, with size (n_poca)."""
+        return self.buffers["dca"].data
+
+    @property
+    def opening_angle(self) -> Tensor:
+        r"""Tensor: The opening angle between the incoming and outgoing tracks, with size (n_poca)."""
+        return self.buffers["opening_angle"].data
+
+    @property
+    def quality_flag(self) -> Tensor:
+        r"""Tensor: True if the opening angle is above `min_opening_angle`, see `POCA.quality_flag`."""
+        return self.opening_angle >= self.min_opening_angle
+
+
+class IncrementalBCA(VoxelPlotting):
+    r"""
+    A class computing the BCA voxel-wise scattering density predictions (see `BCA`) from batches of muons.
+
+    The per-voxel state is the set of the `n_max_per_vox` POCA points with the highest scattering angle of the voxel,
+    the only POCA points the BCA algorithm uses. It is updated with each new batch of muons, and states computed from
+    independent partitions of the data can be merged, the top `n_max_per_vox` POCA points of a union being the top
+    `n_max_per_vox` of the union of the top `n_max_per_vox` POCA points of its parts. The pairwise metric of a voxel,
+    involving at most n_max_per_vox * (n_max_per_vox - 1) / 2 pairs, is recomputed exactly when the voxel is touched by
+    an update, such that the predictions of the other voxels are not recomputed.
+
+    Only voxels containing POCA points are allocated, and the muon-wise data are not kept in memory.
+    """
+
+    _n_mu: int = 0
+
+    # The BCA parameters, with the default values of `BCA`
+    _bca_params: bca_params_type = copy(BCA._bca_params)
+
+    # Parameters defining the per-voxel state, which cannot be modified after initialization
+    _state_params = ["n_max_per_vox", "dca_range", "use_quality_flag"]
+
+    def __init__(self, voi: Volume, bca_params: Optional[bca_params_type] = None, min_opening_angle: float = 1e-3) -> None:
+        r"""
+        Initializes the IncrementalBCA object.
+
+        Args:
+            - voi (Volume): Instance of the Volume class.
+            - bca_params (Optional[bca_params_type]): The parameters of the BCA algorithm, see `BCA.bca_params`.
+            Parameters not provided take their default value.
+            - min_opening_angle (float): The minimum opening angle for a POCA point to be well-defined, see `POCA`.
+        """
+        super().__init__(voi=voi)
+
+        self._bca_params = copy(self._bca_params)
+        self._bca_params.update({key: value for key, value in (bca_params or {}).items() if (key in self._bca_params) & (value is not None)})
+        self.min_opening_angle = min_opening_angle
+
+        n_vox, n_max = math.prod(voi.n_vox_xyz), int(self._bca_params["n_max_per_vox"])  # type: ignore
+
+        # Row of the per-voxel state of each voxel, -1 if the voxel contains no POCA point
+        self._rows = torch.full((n_vox,), -1, dtype=torch.int64, device=DEVICE)
+
+        # Per-voxel state: voxel, number of POCA points kept, and their features sorted by decreasing scattering angle
+        self._state = {
+            "voxel": TensorBuffer((), torch.int64),
+            "n_kept": TensorBuffer((), torch.int64),
+            "dtheta": TensorBuffer((n_max,), dtype_track),
+            "E": TensorBuffer((n_max,), dtype_E),
+            "poca_points": TensorBuffer((n_max, 3), dtype_track),
+        }
+
+        self.n_poca_per_vox = torch.zeros(voi.n_vox_xyz, dtype=dtype_n, device=DEVICE)
+        self._xyz_voxel_pred = torch.zeros(n_vox, dtype=torch.float32, device=DEVICE)
+        self._hit_per_voxel = torch.zeros(n_vox, dtype=dtype_n, device=DEVICE)
+
+    def __repr__(self) -> str:
+        return f"Incremental BCA of {self.n_mu:,d} muons, with {len(self._state['voxel']):,d} voxels containing POCA points."
+
+    def update(self, tracking: TrackingMST, poca: Optional[POCA] = None, refresh: bool = True) -> Tensor:
+        r"""
+        Computes the POCA points of a new batch of muons, adds them to the per-voxel state,
+        and refreshes the predictions of the voxels they are located in.
+
+        Args:
+            - tracking (TrackingMST): The incoming and outgoing tracks of the batch.
+            - poca (Optional[POCA]): The POCA computed from `tracking`, computed if None.
+            - refresh (bool): If False, the predictions are not refreshed, e.g. to refresh them once with `refresh`
+            after several updates.
+
+        Returns:
+            - touched_voxels (Tensor): The flat indices of the voxels touched by the update.
+        """
+        self._n_mu += tracking.n_mu
+
+        if poca is None:
+            poca = POCA(tracking=tracking, voi=self.voi, min_opening_angle=self.min_opening_angle)
+        mask = poca.get_quality_mask(
+            dca_range=self.bca_params["dca_range"],  # type: ignore
+            use_quality_flag=self.bca_params["use_quality_flag"],  # type: ignore
+        )
+
+        return self.add_pocas(
+            flat_voxel_indices=self.voi.get_flat_voxel_indices(poca.poca_indices[mask]),
+            poca_points=poca.poca_points[mask],
+            dtheta=poca.tracks.dtheta[mask],
+            E=poca.tracks.E[mask],
+            refresh=refresh,
+        )
+
+    def update_batches(self, batches: Iterable[TrackingMST]) -> None:
+        r"""
+        Adds an iterable of TrackingMST batches.
+
+        Args:
+            - batches (Iterable[TrackingMST]): The batches of incoming and outgoing tracks.
+        """
+        for tracking in batches:
+            self.update(tracking)
+
+    def add_pocas(self, flat_voxel_indices: Tensor, poca_points: Tensor, dtheta: Tensor, E: Tensor, refresh: bool = True) -> Tensor:
+        r"""
+        Adds POCA points to the per-voxel state, and refreshes the predictions of the voxels they are located in.
+
+        Args:
+            - flat_voxel_indices (Tensor): The flat voxel index of the POCA points, with size (n).
+            - poca_points (Tensor): The POCA points, with size (n, 3).
+            - dtheta (Tensor): The muons scattering angle, with size (n).
+            - E (Tensor): The muons energy, with size (n).
+            - refresh (bool): If False, the predictions are not refreshed.
+
+        Returns:
+            - touched_voxels (Tensor): The flat indices of the voxels touched by the update.
+        """
+        flat_voxel_indices = flat_voxel_indices.long()
+        self.n_poca_per_vox.view(-1).index_add_(0, flat_voxel_indices, torch.ones_like(flat_voxel_indices, dtype=dtype_n))
+
+        touched_voxels = self._insert(flat_voxel_indices, poca_points, dtheta, E)
+        if refresh:
+            self.refresh(touched_voxels)
+
+        return touched_voxels
+
+    def merge(self, other: "IncrementalBCA", refresh: bool = True) -> Tensor:
+        r"""
+        Merges the per-voxel state of another instance, computed from an independent partition of the muons, in-place.
+        The predictions of the voxels containing POCA points of `other` are refreshed.
+
+        Args:
+            - other (IncrementalBCA): The instance to merge, with identical voxelization and per-voxel state parameters.
+            - refresh (bool): If False, the predictions are not refreshed, e.g. to refresh them once with `refresh`
+            after several merges.
+
+        Returns:
+            - touched_voxels (Tensor): The flat indices of the voxels touched by the merge.
+        """
+        if (self.voi.n_vox_xyz != other.voi.n_vox_xyz) | any(self.bca_params[key] != other.bca_params[key] for key in self._state_params):
+            raise ValueError("Cannot merge incremental BCA with different voxelization or per-voxel state parameters.")
+
+        self._n_mu += other.n_mu
+        self.n_poca_per_vox += other.n_poca_per_vox.to(self.n_poca_per_vox.device)
+
+        voxels, dtheta, E, poca_points = other._get_kept_pocas()
+        touched_voxels = self._insert(voxels, poca_points, dtheta, E)
+        if refresh:
+            self.refresh(touched_voxels)
+
+        return touched_voxels
+
+    def _get_kept_pocas(self, voxels: Optional[Tensor] = None) -> Tuple[Tensor, Tensor, Tensor, Tensor]:
+        r"""
+        Returns the POCA points kept in the per-voxel state, sorted by voxel then by decreasing scattering angle.
+
+        Args:
+            - voxels (Optional[Tensor]): The flat indices of the voxels, with allocated state, to consider. All the voxels if None.
+
+        Returns:
+            - flat_voxel_indices (Tensor): The flat voxel index of the POCA points, with size (n).
+            - dtheta (Tensor): The muons scattering angle, with size (n).
+            - E (Tensor): The muons energy, with size (n).
+            - poca_points (Tensor): The POCA points, with size (n, 3).
+        """
+        rows = self._rows[voxels] if voxels is not None else torch.arange(len(self._state["voxel"]), device=DEVICE)
+        n_max = self._state["dtheta"].data.size(1)
+
+        kept = torch.arange(n_max, device=DEVICE) < self._state["n_kept"].data[rows].unsqueeze(-1)  # (n_rows, n_max)
+
+        return (
+            self._state["voxel"].data[rows].unsqueeze(-1).expand(-1, n_max)[kept],
+            self._state["dtheta"].data[rows][kept],
+            self._state["E"].data[rows][kept],
+            self._state["poca_points"].data[rows][kept],
+        )
+
+    def _insert(self, flat_voxel_indices: Tensor, poca_points: Tensor, dtheta: Tensor, E: Tensor) -> Tensor:
+        r"""
+        Inserts POCA points in the per-voxel state, keeping the `n_max_per_vox` highest scattering angles of each voxel.
+        In case of equal scattering angles, the POCA points already in the state are kept first.
+
+        Returns:
+            - touched_voxels (Tensor): The sorted flat indices of the voxels of the POCA points.
+        """
+        touched_voxels = torch.unique(flat_voxel_indices)
+        n_max = self._state["dtheta"].data.size(1)
+
+        # Allocate the state of the voxels touched for the first time
+        new_voxels = touched_voxels[self._rows[touched_voxels] < 0]
+        self._rows[new_voxels] = torch.arange(len(self._state["voxel"]), len(self._state["voxel"]) + len(new_voxels), device=DEVICE)
+        self._state["voxel"].append(new_voxels)
+        self._state["n_kept"].append(torch.zeros_like(new_voxels))
+        for feature in ("dtheta", "E", "poca_points"):
+            self._state[feature].append(
+                torch.zeros((len(new_voxels),) + self._state[feature].data.shape[1:], dtype=self._state[feature].data.dtype, device=DEVICE)
+            )
+
+        # Candidates: the POCA points in the state of the touched voxels, followed by the new POCA points
+        old_voxels, old_dtheta, old_E, old_points = self._get_kept_pocas(touched_voxels)
+        voxels = torch.cat((old_voxels, flat_voxel_indices.to(DEVICE)))
+        candidates = {
+            "dtheta": torch.cat((old_dtheta, dtheta.to(old_dtheta))),
+            "E": torch.cat((old_E, E.to(old_E))),
+            "poca_points": torch.cat((old_points, poca_points.to(old_points))),
+        }
+
+        # Sort candidates by voxel, then by decreasing scattering angle, and rank them within their voxel
+        order = torch.sort(candidates["dtheta"], descending=True, stable=True)[1]
+        order = order[torch.sort(voxels[order], stable=True)[1]]
+        local = torch.searchsorted(touched_voxels, voxels[order])
+        n_candidates = torch.bincount(local, minlength=len(touched_voxels))
+        rank = torch.arange(len(order), device=DEVICE) - (torch.cumsum(n_candidates, dim=0) - n_candidates)[local]
+
+        keep = rank < n_max
+        rows, slots = self._rows[touched_voxels][local[keep]], rank[keep]
+        for feature, values in candidates.items():
+            self._state[feature].data[rows, slots] = values[order[keep]]
+        self._state["n_kept"].data[self._rows[touched_voxels]] = n_candidates.clamp(max=n_max)
+
+        return touched_voxels
+
+    def refresh(self, voxels: Optional[Tensor] = None) -> None:
+        r"""
+        Recomputes the predictions of the given voxels from their state, see `BCA.compute_vox_wise_scores`.
+
+        Args:
+            - voxels (Optional[Tensor]): The flat indices of the voxels, with allocated state, to refresh. All the voxels if None.
+        """
+        voxels = voxels if voxels is not None else self._state["voxel"].data
+        if len(voxels) == 0:
+            return
+
+        flat_voxel_indices, dtheta, E, poca_points = self._get_kept_pocas(voxels)
+
+        # Momentum and scattering angle cuts
+        mask = (dtheta > self.bca_params["dtheta_range"][0]) & (dtheta < self.bca_params["dtheta_range"][1])  # type: ignore
+        if self.bca_params["use_p"]:
+            mask &= (E > self.bca_params["p_range"][0]) & (E < self.bca_params["p_range"][1])  # type: ignore
+
+        pred, hit_per_voxel = BCA.compute_vox_wise_scores(
+            score_method=self.bca_params["score_method"],  # type: ignore
+            metric_method=self.bca_params["metric_method"],  # type: ignore
+            use_p=self.bca_params["use_p"],  # type: ignore
+            n_min_per_vox=self.bca_params["n_min_per_vox"],  # type: ignore
+            voi=self.voi,
+            momentum=E[mask],
+            bca_indices=self.voi.unflatten_voxel_indices(flat_voxel_indices[mask]),
+            poca_points=poca_points[mask],
+            dtheta=dtheta[mask],
+        )
+
+        self._xyz_voxel_pred[voxels] = pred.flatten()[voxels]
+        self._hit_per_voxel[voxels] = hit_per_voxel.flatten()[voxels]
+
+    @property
+    def bca_params(self) -> Dict[str, Any]:
+        r"""
+        The parameters of the bca algorithm.
+        """
+        return self._bca_params
+
+    @bca_params.setter
+    def bca_params(self, value: bca_params_type) -> None:
+        r"""
+        Sets the parameters of the bca algorithm, and refreshes the predictions of all the voxels.
+        The parameters defining the per-voxel state (`n_max_per_vox`, `dca_range`, `use_quality_flag`) cannot be modified.
+
+        Args:
+            - Dict containing the parameters name and value. Only parameters with
+            valid name and non `None` values wil be updated.
+        """
+        for key in value.keys():
+            if (key in self._state_params) & (value[key] is not None) & (value[key] != self._bca_params.get(key)):
+                raise ValueError(f"The {key} parameter defines the per-voxel state and cannot be modified.")
+            if key in self._bca_params.keys():
+                if value[key] is not None:
+                    self._bca_params[key] = value[key]
+
+        self.refresh()
+
+    @property
+    def n_mu(self) -> int:
+        r"""
+        The number of muons processed, after detector efficiency.
+        """
+        return self._n_mu
+
+    @property
+    def xyz_voxel_pred(self) -> Tensor:
+        r"""
+        The scattering density predictions, with size (nx, ny, nz).
+        """
+        return self._xyz_voxel_pred.reshape(self.voi.n_vox_xyz)
+
+    @property
+    def hit_per_voxel(self) -> Tensor:
+        r"""
+        The number of metric values used to compute the prediction of each voxel, with size (nx, ny, nz).
+        """
+        return self._hit_per_voxel.reshape(self.voi.n_vox_xyz)
+
+
+class StreamingPOCA(VoxelPlotting):
+    r"""
+    A class streaming batches of muons through tracking, POCA computation and voxel assignment.
+
+    Only the per-voxel sufficient statistics are accumulated (see `VoxelStatistics`),
+    such that arbitrarily large datasets are processed in bounded memory:
+        - `n_poca_per_vox`: the number of POCA points per voxel.
+        - `dtheta_stats`: the statistics of the scattering angle of the muons whose POCA point is located in each voxel.
+        - `dtheta_p_stats` (if `use_p`): the statistics of the scattering angle times momentum.
+    """
+
+    _n_mu: int = 0
+
+    def __init__(
+        self,
+        voi: Volume,
+        plane_labels_in: Tuple[int, ...],
+        plane_labels_out: Tuple[int, ...],
+        spatial_res: Optional[Union[Tensor, Tuple[float, float, float]]] = None,
+        energy_range: Optional[Tuple[float, float]] = None,
+        efficiency: Union[float, Tensor] = 1.0,
+        input_unit: str = "mm",
+        fit_method: str = "svd",
+        score_method: Callable = partial(np.quantile, q=0.5),
+        dtheta_hist_range: Tuple[float, float] = (1e-5, math.pi),
+        use_p: bool = False,
+        dtheta_p_hist_range: Tuple[float, float] = (1e-3, 1e5),
+        n_bins: int = 128,
+    ) -> None:
+        r"""
+        Initializes the StreamingPOCA object.
+
+        Args:
+            - voi (Volume): Instance of the Volume class.
+            - plane_labels_in (Tuple[int, ...]): The labels of the detector planes above the object.
+            - plane_labels_out (Tuple[int, ...]): The labels of the detector planes below the object.
+            - spatial_res (Optional[Union[Tensor, Tuple[float, float, float]]]): The detector spatial resolution, see `Hits`.
+            - energy_range (Optional[Tuple[float, float]]): The muon energy range, see `Hits`.
+            - efficiency (Union[float, Tensor]): The detector panels efficiency, see `Hits`.
+            - input_unit (str): The unit of the hits, see `Hits`.
+            - fit_method (str): The track fitting method, see `Tracking.get_tracks_points_from_hits`.
+            - score_method (Callable): The function used to convert the per-voxel scattering angle distribution into a score.
+            See `VoxelStatistics.get_score` for the supported functions.
+            - dtheta_hist_range (Tuple[float, float]): The support of the scattering angle histograms, in radians.
+            Unlike the `dtheta_range` cut of ASR and BCA, values outside of it are counted in the underflow and overflow bins.
+            - use_p (bool): If True, the statistics of the scattering angle times momentum are also accumulated,
+            and used for the voxel predictions.
+            - dtheta_p_hist_range (Tuple[float, float]): The support of the scattering angle times momentum histograms.
+            - n_bins (int): The number of histogram bins.
+        """
+        super().__init__(voi=voi)
+
+        self.plane_labels_in = plane_labels_in
+        self.plane_labels_out = plane_labels_out
+        self.hits_params = {"spatial_res": spatial_res, "energy_range": energy_range, "efficiency": efficiency, "input_unit": input_unit}
+        self.fit_method = fit_method
+        self.score_method = score_method
+        self.use_p = use_p
+
+        self.n_poca_per_vox = torch.zeros(voi.n_vox_xyz, dtype=dtype_n, device=DEVICE)
+        self.dtheta_stats = VoxelStatistics(voi=voi, value_range=dtheta_hist_range, n_bins=n_bins)
+        self.dtheta_p_stats = VoxelStatistics(voi=voi, value_range=dtheta_p_hist_range, n_bins=n_bins) if use_p else None
+
+    def __repr__(self) -> str:
+        return f"Streaming POCA reconstruction of {self.n_mu:,d} muons with {self.n_poca_per_vox.sum().item():,d} POCA points in the volume."
+
+    def process_tracks(self, tracking: TrackingMST) -> None:
+        r"""
+        Computes the POCA points of a batch of muons, and adds them to the per-voxel statistics.
+
+        Args:
+            - tracking (TrackingMST): The incoming and outgoing tracks of the batch.
+        """
+        self._n_mu += tracking.n_mu
+
+        self.process_poca(POCA(tracking=tracking, voi=self.voi))
+
+    def process_poca(self, poca: POCA) -> None:
+        r"""
+        Adds the POCA points of a batch of muons to the per-voxel statistics.
+
+        Args:
+            - poca (POCA): The POCA computed from the batch.
+        """
+        flat_indices = self.voi.get_flat_voxel_indices(poca.poca_indices)
+
+        self.n_poca_per_vox.view(-1).add_(torch.bincount(flat_indices, minlength=self.n_poca_per_vox.numel()).to(dtype_n))
+        self.dtheta_stats.update(flat_indices, poca.tracks.dtheta)
+        if self.dtheta_p_stats is not None:
+            self.dtheta_p_stats.update(flat_indices, poca.tracks.dtheta * poca.tracks.E)
+
+    def process_hits(self, hits_in: Hits, hits_out: Hits) -> None:
+        r"""
+        Computes the tracks of a batch of muons from their hits, and adds them to the per-voxel statistics.
+
+        Args:
+            - hits_in (Hits): The hits on the detector planes above the object.
+            - hits_out (Hits): The hits on the detector planes below the object.
+        """
+        filter_nans(hits_in, hits_out)
+
+        tracks_in = Tracking(label="above", hits=hits_in, fit_method=self.fit_method)
+        tracks_out = Tracking(label="below", hits=hits_out, fit_method=self.fit_method)
+
+        self.process_tracks(TrackingMST(trackings=(tracks_in, tracks_out)))
+
+    def process_df(self, df: pd.DataFrame) -> None:
+        r"""
+        Processes a batch of muons from a DataFrame with columns "X0, Y0, Z0, ..., Xi, Yi, Zi, E".
+
+        Args:
+            - df (pd.DataFrame): The DataFrame containing the hits and energy of the batch.
+        """
+        hits_in = Hits(df=df, plane_labels=self.plane_labels_in, **self.hits_params)  # type: ignore
+        hits_out = Hits(df=df, plane_labels=self.plane_labels_out, **self.hits_params)  # type: ignore
+
+        self.process_hits(hits_in, hits_out)
+
+    def process_csv(self, csv_filename: str, chunk_size: int = 1_000_000) -> None:
+        r"""
+        Streams the muons of a CSV file by chunks of `chunk_size` muons.
+
+        Args:
+            - csv_filename (str): The path to the CSV file containing hit and energy data.
+            - chunk_size (int): The number of muons per chunk.
+        """
+        if not Path(csv_filename).exists():
+            raise FileNotFoundError(f"The file {csv_filename} does not exist.")
+
+        for df in pd.read_csv(csv_filename, chunksize=chunk_size):
+            self.process_df(df)
+            print(f"{self.n_mu:,d} muons processed")
+
+    def process_batches(self, batches: Iterable[TrackingMST]) -> None:
+        r"""
+        Streams an iterable of TrackingMST batches.
+
+        Args:
+            - batches (Iterable[TrackingMST]): The batches of incoming and outgoing tracks.
+        """
+        for tracking in batches:
+            self.process_tracks(tracking)
+
+    def merge(self, other: "StreamingPOCA") -> None:
+        r"""
+        Merges the per-voxel statistics of another instance, computed from an independent batch of muons, in-place.
+
+        Args:
+            - other (StreamingPOCA): The instance to merge, with identical voxelization and histogram bins.
+        """
+        if (self.dtheta_p_stats is None) != (other.dtheta_p_stats is None):
+            raise ValueError("Cannot merge streaming POCA with and without momentum statistics.")
+
+        self._n_mu += other.n_mu
+        self.n_poca_per_vox += other.n_poca_per_vox.to(self.n_poca_per_vox.device)
+        self.dtheta_stats.merge(other.dtheta_stats)
+        if (self.dtheta_p_stats is not None) & (other.dtheta_p_stats is not None):
+            self.dtheta_p_stats.merge(other.dtheta_p_stats)  # type: ignore
+
+    def get_xyz_voxel_pred(self) -> Tensor:
+        r"""
+        Computes the scattering density predictions per voxel, by applying `score_method`
+        to the per-voxel scattering angle statistics (or scattering angle times momentum if `use_p`).
+
+        Returns:
+            - vox_density_pred (Tensor): voxelwise density predictions, with size (nx, ny, nz).
+        """
+        stats = self.dtheta_p_stats if self.dtheta_p_stats is not None else self.dtheta_stats
+        return stats.get_score(self.score_method).float()
+
+    @property
+    def n_mu(self) -> int:
+        r"""
+        The number of muons processed, after detector efficiency.
+        """
+        return self._n_mu
+
+    @property
+    def xyz_voxel_pred(self) -> Tensor:
+        r"""
+        The scattering density predictions.
+        """
+        return self.get_xyz_voxel_pred()
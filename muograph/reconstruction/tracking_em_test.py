@@ -40,9 +40,11 @@ class TrackingEM(VoxelPlotting):
 
     _M_voxels: Optional[Tensor] = None  # is the number of muons hitting each voxel (Nx, Ny, Nz)
 
-    _Hit: Optional[Tensor] = None
+    _Hit: Optional[Tensor] = None  # number of muon path segments within each triggered voxel (n_path_vox)
 
-    _W: Optional[Tensor] = None  # weight matrix
+    _W: Optional[Tensor] = None  # weight matrix (n_path_vox, 2, 2)
+
+    _path_voxels: Optional[Tuple[Tensor, Tensor]] = None  # (muon, flat voxel) indices of the triggered voxels (n_path_vox), (n_path_vox)
 
     def __init__(self, voi: Volume, tracking: TrackingMST, n_events: int = 1000, batch_size: int = 100, muon_path: str = "poca") -> None:
         # The voxelized volume of inetrest
@@ -63,8 +65,6 @@ class TrackingEM(VoxelPlotting):
         self.momentum = torch.sqrt(2 * 105.7 * self.poca.tracks.E[:]) * 1e-3  # mom in GeV
 
         self.M_voxels = self.set_M_voxels()
-        # print('osfwe')
-        self.Hit = self.set_Hit()
 
         self.verify = False
 
@@ -204,23 +204,16 @@ class TrackingEM(VoxelPlotting):
 
         return intersection_coordinates_list
 
-    def _compute_triggered_voxels(self, muon_intersection_coordinates: Tensor, voi: Volume, idx_hit: int) -> Tensor:
+    def _compute_triggered_voxels(self, muon_intersection_coordinates: Tensor, voi: Volume) -> Tensor:
         if muon_intersection_coordinates.shape[0] < 2:  # A muon with less than 2 intersections points doesn't trigger any voxels
             triggered_voxels = torch.empty((0, 3), dtype=torch.int32)
+            self._muon_hit = torch.empty((0,), dtype=torch.int64)
         else:
             # We calculate the point in between the two intersection points
             points_mid = (muon_intersection_coordinates[:-1] + muon_intersection_coordinates[1:]) / 2
 
             # Now we transform the coordinates of that middle point into the indices of the triggered voxel
-            x_idx = ((points_mid[:, 0] + abs(voi.xyz_min[0])) / voi.vox_width).floor().clamp(0, voi.voxel_centers.shape[0] - 1).to(torch.int32)
-            y_idx = ((points_mid[:, 1] + abs(voi.xyz_min[1])) / voi.vox_width).floor().clamp(0, voi.voxel_centers.shape[1] - 1).to(torch.int32)
-            z_idx = ((points_mid[:, 2] + abs(voi.xyz_min[2])) / voi.vox_width).floor().clamp(0, voi.voxel_centers.shape[2] - 1).to(torch.int32)
-            # Si pongo .round() empeoro la situacion porque caluclo menos voxels aun
-            # x_idx = ((points_mid[:, 0] + abs(voi.xyz_min[0])) / voi.vox_width).round().clamp(0, voi.voxel_centers.shape[0] - 1).to(torch.int32)
-            # y_idx = ((points_mid[:, 1] + abs(voi.xyz_min[1])) / voi.vox_width).round().clamp(0, voi.voxel_centers.shape[1] - 1).to(torch.int32)
-            # z_idx = ((points_mid[:, 2] + abs(voi.xyz_min[2])) / voi.vox_width).round().clamp(0, voi.voxel_centers.shape[2] - 1).to(torch.int32)
-
-            indices = torch.stack([x_idx, y_idx, z_idx], dim=1)
+            indices = voi.get_voxel_indices(points_mid, clamp=True)
 
             # Flatten cada fila en un número único para encontrar duplicados
             # indices_flat = indices.flatten(start_dim=1)
@@ -262,9 +255,8 @@ class TrackingEM(VoxelPlotting):
             # Increment volume at given indices
             self._M_voxels.index_put_(tuple(flat_indices), self._M_voxels[tuple(flat_indices)] + 1)
 
-            # Hit
-            # indices_for_hit = torch.stack([x_idx, y_idx, z_idx], dim=1)
-            self._Hit[idx_hit].index_put_(tuple(flat_indices), self._Hit[idx_hit][tuple(flat_indices)] + 1)
+            # Hit: number of path segments within each triggered voxel
+            self._muon_hit = torch.bincount(mapped_indices, minlength=len(idx_first))
             # print('idx=', idx)
             # self._Hit[idx].index_put_(tuple(flat_indices), self._Hit[idx][tuple(flat_indices)] + 1)
             # if idx_hit == 0:
@@ -296,19 +288,29 @@ class TrackingEM(VoxelPlotting):
         if self._intersection_coordinates is None:
             self._intersection_coordinates = self.get_intersection_coordinates()
         triggered_voxels_list = []
+        hit_list = []
         # estas dos variables las voy a necesitar para despues hacer los L y T paths
         self._idx_first_list = []
         self._mapped_indices_list = []
 
-        # self.Hit = torch.zeros(len(self._valid_poca), self.voi.n_vox_xyz[0], self.voi.n_vox_xyz[1], self.voi.n_vox_xyz[2])
-
         for i in range(len(self._valid_poca)):
             # print(' -> Muon ', i)
-            triggered_voxels = self._compute_triggered_voxels(self._intersection_coordinates[i], self.voi, idx_hit=i)  # No repeated voxels
+            triggered_voxels = self._compute_triggered_voxels(self._intersection_coordinates[i], self.voi)  # No repeated voxels
             triggered_voxels_list.append(triggered_voxels)
+            hit_list.append(self._muon_hit)
             self._idx_first_list.append(self._idx_first)
             self._mapped_indices_list.append(self._mapped_indices)
 
+        # Sparse (muon, voxel) representation of the triggered voxels
+        n_vox_per_muon = torch.tensor([len(triggered_voxels) for triggered_voxels in triggered_voxels_list], dtype=torch.int64)
+        muon_ids = torch.repeat_interleave(torch.arange(len(triggered_voxels_list)), n_vox_per_muon)
+        voxel_ids = (
+            self.voi.get_flat_voxel_indices(torch.cat(triggered_voxels_list)) if len(triggered_voxels_list) > 0 else torch.empty((0,), dtype=torch.int64)
+        )
+
+        self._path_voxels = (muon_ids, voxel_ids)
+        self._Hit = torch.cat(hit_list) if len(hit_list) > 0 else torch.empty((0,), dtype=torch.int64)
+
         print("\t Done!")
 
         return triggered_voxels_list
@@ -363,23 +365,24 @@ class TrackingEM(VoxelPlotting):
 
         return L, T
 
-    def _compute_weight_matrix(self, voxels: Tensor, L: Tensor, T: Tensor, idx: int) -> None:
+    @staticmethod
+    def _compute_weight_matrix(L: Tensor, T: Tensor) -> Tensor:
         """
         Calcula la matriz de pesos W para el algoritmo de Expectación-Maximización.
-        """
 
-        if len(voxels) > 0 and len(L) > 0:
-            L = L.float()  # Convertir a float32
-            T = T.float()  # Convertir a float32
+        Args:
+            L (Tensor): The path length of the muons within each triggered voxel, with size (n_path_vox).
+            T (Tensor): The path length from each triggered voxel to the end of the muon path, with size (n_path_vox).
+
+        Returns:
+            W (Tensor): The weight matrix of each (muon, voxel) pair, with size (n_path_vox, 2, 2).
+        """
+        L = L.float()  # Convertir a float32
+        T = T.float()  # Convertir a float32
 
-            # Índices de los voxeles en el grid
-            x_idx, y_idx, z_idx = voxels[:, 0], voxels[:, 1], voxels[:, 2]
+        W_xy = (L**2) / 2 + L * T
 
-            # Calcular los elementos de W
-            self._W[idx, x_idx, y_idx, z_idx, 0, 0] = L
-            self._W[idx, x_idx, y_idx, z_idx, 0, 1] = (L**2) / 2 + L * T
-            self._W[idx, x_idx, y_idx, z_idx, 1, 0] = (L**2) / 2 + L * T
-            self._W[idx, x_idx, y_idx, z_idx, 1, 1] = (L**3) / 3 + (L**2) * T + L * (T**2)
+        return torch.stack([L, W_xy, W_xy, (L**3) / 3 + (L**2) * T + L * (T**2)], dim=-1).reshape(-1, 2, 2)
 
     def get_weight_matrix(self) -> None:
         if not self.verify:  # si es la primera vez que hacemos valid_muons
@@ -394,12 +397,11 @@ class TrackingEM(VoxelPlotting):
         if self._L is None or self.T is None:
             self._L, self._T = self.get_L_T_pathlength()
 
-        Ni, Nj, Nk = self.voi.n_vox_xyz
-        n_events = len(self._valid_poca)
-        self._W = torch.zeros(n_events, Ni, Nj, Nk, 2, 2, device=self._valid_poca.device)
-
-        for i in range(len(self._valid_poca)):
-            self._compute_weight_matrix(self._triggered_voxels[i], self._L[i], self._T[i], i)
+        # Sparse weight matrix, with one 2x2 matrix per (muon, voxel) pair in `path_voxels`
+        if len(self._L) > 0:
+            self._W = self._compute_weight_matrix(L=torch.cat(self._L), T=torch.cat(self._T)).to(self._valid_poca.device)
+        else:
+            self._W = torch.zeros((0, 2, 2), device=self._valid_poca.device)
 
     def _compute_observed_data(self, idx: int) -> None:
         """
@@ -1721,14 +1723,23 @@ class TrackingEM(VoxelPlotting):
             self._M_voxels = torch.zeros(self.voi.n_vox_xyz)
         return self._M_voxels
 
-    def set_Hit(self) -> Tensor:
+    @property
+    def path_voxels(self) -> Tuple[Tensor, Tensor]:
+        """The muon indices and flat voxel indices of the triggered voxels of all muons, with size (n_path_vox)"""
+        if self._path_voxels is None:
+            self._triggered_voxels = self.get_triggered_voxels()
+        return self._path_voxels
+
+    @property
+    def Hit(self) -> Tensor:
+        """The number of path segments of each muon within its triggered voxels, aligned with `path_voxels`"""
         if self._Hit is None:
-            self._Hit = torch.zeros(len(self.momentum), self.voi.n_vox_xyz[0], self.voi.n_vox_xyz[1], self.voi.n_vox_xyz[2])
+            self._triggered_voxels = self.get_triggered_voxels()
         return self._Hit
 
     @property
     def W(self) -> Tensor:
-        """Weight matrix"""
+        """Weight matrix of each (muon, voxel) pair, aligned with `path_voxels`, with size (n_path_vox, 2, 2)"""
         if self._W is None:
             self.get_weight_matrix()
         return self._W
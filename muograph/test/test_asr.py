@@ -1,6 +1,7 @@
 from muograph.hits.hits import Hits
 from muograph.tracking.tracking import Tracking, TrackingMST
-from muograph.reconstruction.asr import ASR
+from muograph.reconstruction.asr import ASR, value_type
+from muograph.reconstruction.poca import POCA
 from muograph.volume.volume import Volume
 import os
 from pathlib import Path
@@ -8,6 +9,9 @@ from muograph.utils.save import muograph_path
 import numpy as np
 from functools import partial
 import math
+import torch
+import h5py
+from typing import Dict, List, Tuple, Callable
 
 # Test data file path
 TEST_HIT_FILE = os.path.dirname(__file__) + "/../data/iron_barrel/barrel_and_cubes_scattering.csv"
@@ -58,3 +62,97 @@ def test_asr_predictions() -> None:
     assert (
         n_poca_uranium_x_region > n_poca_empty_x_region
     ), "The voxel scattering density in the uranium x region {n_poca_uranium_x_region} must be higher than in the empty region {n_poca_empty_x_region}"
+
+
+def test_asr_triggered_voxels() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+
+    asr = ASR(voi=VOI, tracking=mst)
+
+    offsets, voxel_ids = asr.triggered_voxels_csr
+
+    assert len(offsets) == mst.n_mu + 1, "The triggered voxels offsets must have size n_mu + 1."
+    assert (offsets.diff() >= 0).all() and offsets[-1] == len(voxel_ids), "The triggered voxels offsets must be increasing."
+    assert asr.n_mu_per_vox.sum() == len(voxel_ids), "Each triggered voxel must be counted once."
+
+    offsets_list, voxel_ids_list = ASR.triggered_voxels_list_to_csr(asr.triggered_voxels, VOI)
+
+    assert torch.equal(offsets, offsets_list) and torch.equal(voxel_ids, voxel_ids_list), "Conversion between list and CSR triggered voxels must be lossless."
+
+
+def test_asr_triggered_voxels_io() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+
+    asr = ASR(voi=VOI, tracking=mst, output_dir=OUPUT_DIR)
+    offsets, voxel_ids = asr.triggered_voxels_csr
+
+    # Loading from the CSR file
+    asr_loaded = ASR(voi=VOI, tracking=mst, triggered_vox_file=OUPUT_DIR + "/triggered_voxels.hdf5")
+    offsets_loaded, voxel_ids_loaded = asr_loaded.triggered_voxels_csr
+
+    assert torch.equal(offsets, offsets_loaded) and torch.equal(voxel_ids, voxel_ids_loaded), "Mismatch between saved and loaded triggered voxels."
+
+    # Loading a range of muons
+    start, end = 100, 200
+    offsets_range, voxel_ids_range = ASR.load_triggered_vox(OUPUT_DIR + "/triggered_voxels.hdf5", VOI, muon_range=(start, end))
+
+    assert torch.equal(offsets_range, offsets[start : end + 1] - offsets[start]), "Mismatch between loaded range and triggered voxels offsets."
+    assert torch.equal(voxel_ids_range, voxel_ids[offsets[start] : offsets[end]]), "Mismatch between loaded range and triggered voxels indices."
+
+    # Loading triggered voxels saved with one dataset per muon
+    with h5py.File(OUPUT_DIR + "/triggered_voxels_per_muon.hdf5", "w") as f:
+        for i, vox in enumerate(asr.triggered_voxels):
+            f.create_dataset(str(i), data=vox)
+
+    offsets_legacy, voxel_ids_legacy = ASR.load_triggered_vox(OUPUT_DIR + "/triggered_voxels_per_muon.hdf5", VOI)
+
+    assert torch.equal(offsets, offsets_legacy) and torch.equal(voxel_ids, voxel_ids_legacy), "Triggered voxels saved per muon must load identically."
+
+
+def test_asr_score_methods() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+
+    asr = ASR(voi=VOI, tracking=mst)
+
+    # Reference scores, computed voxel by voxel
+    score_list: Dict[Tuple[int, int, int], List[float]] = {}
+    for i, vox_list in enumerate(asr.triggered_voxels):
+        for vox in vox_list:
+            score_list.setdefault(tuple(vox), []).append(mst.dtheta[i].item())
+
+    score_methods: List[Callable] = [partial(np.quantile, q=0.8), np.median, np.mean, partial(np.std)]
+    for score_method in score_methods:
+        params: Dict[str, value_type] = {
+            "score_method": score_method,
+            "p_range": (0.0, 10000000),  # MeV
+            "dtheta_range": (0.0, math.pi / 3),
+            "use_p": False,
+        }
+        asr.asr_params = params
+
+        expected = torch.zeros(VOI.n_vox_xyz)
+        for (i, j, k), scores in score_list.items():
+            expected[i, j, k] = float(score_method(scores))
+
+        assert torch.allclose(asr.xyz_voxel_pred.cpu(), expected, atol=1e-6), f"Mismatch between voxel scores and the reference {score_method} scores."
+
+
+def test_asr_poca_quality_cuts() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    poca = POCA(tracking=mst, voi=VOI)
+
+    asr = ASR(voi=VOI, tracking=mst, poca=poca)
+    asr.asr_params = {"dca_range": (0.0, math.inf), "use_quality_flag": False}
+
+    assert asr.get_poca_quality_mask().all(), "No muon must be rejected without quality cuts."
+
+    asr.asr_params = {"dca_range": (0.0, 5.0), "use_quality_flag": True}
+    mask = asr.get_poca_quality_mask()
+
+    # Muons of the POCA failing the cuts are rejected, other muons are kept
+    positions = mst.get_positions(poca.tracks)
+    quality_mask = (poca.dca <= 5.0) & (poca.opening_angle >= poca.min_opening_angle)
+
+    assert torch.equal(mask[positions], quality_mask), "Mismatch between the ASR mask and the POCA quality cuts."
+    assert mask.sum() == mst.n_mu - (~quality_mask).sum(), "Muons without POCA point must be kept."
+    assert not asr.xyz_voxel_pred.isnan().any(), "Predictions must be computed with quality cuts."
@@ -9,6 +9,7 @@ import torch
 import os
 from pathlib import Path
 from functools import partial
+from copy import copy
 import math
 
 # Test data file path
@@ -62,3 +63,122 @@ def test_bca_predictions() -> None:
     assert (
         n_poca_uranium_x_region > n_poca_empty_x_region
     ), "The voxel scattering density in the uranium x region {n_poca_uranium_x_region} must be higher than in the empty region {n_poca_empty_x_region}"
+
+
+def test_bca_low_theta_events_mask() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+
+    bca = BCA(voi=VOI, tracking=mst)
+
+    n_max_per_vox = 5
+    mask, nhit, nhit_cut = bca.compute_low_theta_events_voxel_wise_mask(
+        n_max_per_voxel=n_max_per_vox,
+        bca_indices=bca.poca_indices,
+        dtheta=bca.tracks.dtheta,
+        voi=VOI,
+    )
+
+    flat_indices = VOI.get_flat_voxel_indices(bca.poca_indices)
+
+    assert torch.equal(nhit.flatten(), torch.bincount(flat_indices, minlength=nhit.numel())), "nhit must count the POCA points within each voxel."
+    assert torch.equal(
+        nhit_cut.flatten(), torch.bincount(flat_indices[mask], minlength=nhit.numel())
+    ), "nhit_cut must count the selected POCA points within each voxel."
+    assert (nhit_cut <= n_max_per_vox).all(), f"At most {n_max_per_vox} POCA points must be selected per voxel."
+
+    # The selected events must have the highest scattering angles within their voxel
+    min_kept = torch.full((nhit.numel(),), math.inf).scatter_reduce_(0, flat_indices[mask], bca.tracks.dtheta[mask], reduce="amin")
+    max_rejected = torch.full((nhit.numel(),), -math.inf).scatter_reduce_(0, flat_indices[~mask], bca.tracks.dtheta[~mask], reduce="amax")
+
+    assert (max_rejected <= min_kept).all(), "Rejected events must have lower scattering angles than selected ones."
+
+
+def test_bca_vox_wise_metric() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+
+    bca = BCA(voi=VOI, tracking=mst)
+
+    params = {
+        "use_p": False,
+        "n_min_per_vox": 3,
+        "voi": VOI,
+        "bca_indices": bca.poca_indices,
+        "poca_points": bca.poca_points,
+        "dtheta": bca.tracks.dtheta,
+        "momentum": bca.tracks.E,
+        "score_method": partial(torch.quantile, q=0.5),
+        "metric_method": partial(torch.log),
+    }
+
+    scores, hit_per_voxel = bca.compute_vox_wise_scores(**params)  # type: ignore
+    scores_tiled, hit_per_voxel_tiled = bca.compute_vox_wise_scores(max_pairs_per_tile=10, **params)  # type: ignore
+
+    assert torch.equal(scores, scores_tiled) and torch.equal(hit_per_voxel, hit_per_voxel_tiled), "Voxel scores must not depend on the tile size."
+
+    # Scores computed from the voxel-wise distribution of the metric
+    voxel_metric, offsets = bca.compute_voxels_distribution(**{key: value for key, value in params.items() if key != "score_method"})  # type: ignore
+    scores_distribution, hit_per_voxel_distribution = bca.compute_final_scores(voxel_metric, offsets, score_method=partial(torch.quantile, q=0.5))
+
+    assert torch.equal(scores.flatten(), scores_distribution), "Mismatch between the voxel scores computed from tiles and from the voxel distribution."
+    assert torch.equal(hit_per_voxel.flatten(), hit_per_voxel_distribution), "hit_per_voxel must match the length of the voxel distribution segments."
+
+    # Reference metric computed from the full pairwise matrix of the densest voxel
+    flat_indices = VOI.get_flat_voxel_indices(bca.poca_indices)
+    densest_voxel = torch.bincount(flat_indices).argmax()
+    mask = flat_indices == densest_voxel
+
+    full_metric = torch.tril(
+        bca.compute_distance_2_points(bca.poca_points[mask])
+        / bca.compute_scattering_momentum_weight(bca.tracks.dtheta[mask], torch.ones_like(bca.tracks.dtheta[mask]))
+    )
+    expected = torch.quantile(torch.log(full_metric[full_metric != 0]), q=0.5)
+    i, j, k = VOI.unflatten_voxel_indices(densest_voxel.unsqueeze(0))[0].tolist()
+
+    assert torch.isclose(scores[i, j, k], expected), "Mismatch between the voxel score and the reference pairwise metric."
+    assert hit_per_voxel[i, j, k] == (full_metric != 0).sum(), "hit_per_voxel must count the pairs of POCA points within the voxel."
+
+    # Pairwise metric of a single voxel
+    vox_metric = bca.compute_vox_wise_metric(
+        vox_id=torch.tensor([i, j, k]),
+        use_p=False,
+        bca_indices=bca.poca_indices,
+        poca_points=bca.poca_points,
+        dtheta=bca.tracks.dtheta,
+        momentum=bca.tracks.E,
+        metric_method=partial(torch.log),
+    )
+    assert torch.allclose(vox_metric, torch.log(full_metric[full_metric != 0])), "Mismatch between the voxel metric and the reference pairwise metric."
+
+    # Non element-wise metric methods are applied voxel by voxel
+    params["metric_method"] = partial(torch.nn.functional.normalize, dim=0)
+    scores_normalized, _ = bca.compute_vox_wise_scores(max_pairs_per_tile=10, **params)  # type: ignore
+    expected = torch.quantile(torch.nn.functional.normalize(full_metric[full_metric != 0], dim=0), q=0.5)
+    assert torch.isclose(scores_normalized[i, j, k], expected), "The metric method must be applied to the metric values of each voxel separately."
+
+
+def test_bca_tracking_not_modified() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    n_mu, dtheta = mst.n_mu, mst.dtheta.clone()
+
+    bca = BCA(voi=VOI, tracking=mst)
+    bca.xyz_voxel_pred
+
+    assert mst.n_mu == n_mu and torch.equal(mst.dtheta, dtheta), "The input tracking must not be modified by the event selection."
+    assert bca.tracks.n_mu == bca.poca_points.size(0), "The POCA tracks must match the POCA points."
+
+    # The BCA tracks are a view of the selected POCA points
+    assert bca.bca_tracks.n_mu == bca.bca_indices.size(0) == bca.bca_poca_points.size(0), "The BCA tracks must match the BCA selection."
+    assert torch.equal(bca.bca_tracks.dtheta, bca.tracks.dtheta[bca.bca_selection]), "Mismatch between the BCA tracks and the selected POCA tracks."
+    assert torch.equal(bca.bca_tracks.muon_indices, bca.tracks.muon_indices[bca.bca_selection]), "Mismatch between the BCA and POCA muon indices."
+
+
+def test_bca_params_not_shared() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    defaults = copy(BCA._bca_params)
+
+    bca, bca_other = BCA(voi=VOI, tracking=mst), BCA(voi=VOI, tracking=mst)
+    bca.bca_params = {"n_min_per_vox": 5, "use_p": True}
+
+    assert bca.bca_params["n_min_per_vox"] == 5 and bca.bca_params["use_p"], "The parameters must be updated."
+    assert bca_other.bca_params == defaults, "The parameters of an instance must not modify the parameters of other instances."
+    assert BCA._bca_params == defaults, "The parameters of an instance must not modify the default parameters."
@@ -0,0 +1,117 @@
+from muograph.hits.hits import Hits
+from muograph.tracking.tracking import Tracking, TrackingMST
+from muograph.reconstruction.poca import POCA
+from muograph.reconstruction.asr import ASR
+from muograph.reconstruction.streaming import IncrementalBCA
+from muograph.reconstruction.distributed import ShardReconstruction, MapReduceReconstruction
+from muograph.volume.volume import Volume
+from muograph.utils.save import muograph_path
+
+import os
+from pathlib import Path
+from typing import List, Tuple, Dict, Any
+from functools import partial
+import pandas as pd
+import numpy as np
+import torch
+
+# Test data file path
+TEST_HIT_FILE = os.path.dirname(__file__) + "/../data/iron_barrel/barrel_and_cubes_scattering.csv"
+VOI = Volume(position=(0, 0, -1200), dimension=(1000, 600, 600), voxel_width=50)
+OUPUT_DIR = str(Path(muograph_path) / "../output_test/")
+
+
+def get_shards(hits_file: str, n_shards: int) -> List[str]:
+    df = pd.read_csv(hits_file)
+    shard_size = -(-len(df) // n_shards)
+
+    directory = Path(OUPUT_DIR) / "shards"
+    directory.mkdir(parents=True, exist_ok=True)
+
+    shards = []
+    for i in range(n_shards):
+        shard = str(directory / f"shard_{i}.csv")
+        df.iloc[i * shard_size : (i + 1) * shard_size].to_csv(shard, index=False)
+        shards.append(shard)
+
+    return shards
+
+
+def get_mst(hits_file: str) -> TrackingMST:
+    hits_in = Hits(plane_labels=(0, 1, 2), csv_filename=hits_file, energy_range=(0.0, 1_000_000))
+    hits_out = Hits(plane_labels=(3, 4, 5), csv_filename=hits_file, energy_range=(0.0, 1_000_000))
+
+    return TrackingMST(trackings=(Tracking(label="above", hits=hits_in), Tracking(label="below", hits=hits_out)))
+
+
+def get_map_reduce(asr_params: Dict[str, Any], algorithms: Tuple[str, ...] = ("poca", "asr", "bca")) -> MapReduceReconstruction:
+    reconstruction = ShardReconstruction(
+        voi=VOI,
+        plane_labels_in=(0, 1, 2),
+        plane_labels_out=(3, 4, 5),
+        algorithms=algorithms,
+        energy_range=(0.0, 1_000_000),
+        asr_params=asr_params,
+        bca_params={"n_max_per_vox": 20},
+    )
+
+    return MapReduceReconstruction(reconstruction=reconstruction, chunk_size=7_000)
+
+
+def test_map_reduce_reconstruction() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    shards = get_shards(TEST_HIT_FILE, n_shards=3)
+
+    result = get_map_reduce(asr_params={"score_method": np.mean}).run(shards)
+
+    # POCA counts
+    poca = POCA(tracking=mst, voi=VOI)
+    assert result.n_mu == mst.n_mu, "All the muons must be processed."
+    assert torch.equal(result.n_poca_per_vox, poca.n_poca_per_vox), "Mismatch between the reduced and full number of POCA points per voxel."
+
+    # ASR scores, exact for the mean
+    asr = ASR(voi=VOI, tracking=mst)
+    asr.asr_params = {"score_method": np.mean}  # type: ignore
+    assert torch.allclose(result.get_xyz_voxel_pred("asr"), asr.xyz_voxel_pred.float(), rtol=1e-4), "Mismatch between the reduced and full ASR predictions."
+
+    # BCA scores
+    bca = IncrementalBCA(voi=VOI, bca_params={"n_max_per_vox": 20})
+    bca.update(mst)
+    assert torch.equal(result.get_xyz_voxel_pred("bca"), bca.xyz_voxel_pred), "Mismatch between the reduced and full BCA predictions."
+
+    try:
+        result.merge(ShardReconstruction(voi=VOI, plane_labels_in=(0, 1, 2), plane_labels_out=(3, 4, 5), algorithms=("poca",)))
+        raise AssertionError("A ValueError must be raised when merging partial results of different algorithms.")
+    except ValueError:
+        pass
+
+
+def test_map_reduce_asr_momentum() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    shards = get_shards(TEST_HIT_FILE, n_shards=3)
+
+    result = get_map_reduce(asr_params={"score_method": np.mean, "use_p": True}, algorithms=("poca", "asr")).run(shards)
+
+    # The log of the scattering angle times momentum is averaged, as in ASR
+    asr = ASR(voi=VOI, tracking=mst)
+    asr.asr_params = {"score_method": np.mean, "use_p": True}  # type: ignore
+    assert torch.allclose(
+        result.get_xyz_voxel_pred("asr"), asr.xyz_voxel_pred.float(), rtol=1e-4
+    ), "Mismatch between the reduced and full ASR predictions with momentum."
+
+
+def test_map_reduce_process_backend() -> None:
+    shards = get_shards(TEST_HIT_FILE, n_shards=3)
+    map_reduce = get_map_reduce(asr_params={"score_method": partial(np.quantile, q=0.5)})
+
+    result = map_reduce.run(shards)
+    result_processes = map_reduce.run(shards, n_workers=2)
+
+    assert result_processes.n_mu == result.n_mu, "All the muons must be processed."
+    for algorithm, pred in result.xyz_voxel_preds.items():
+        assert torch.equal(
+            result_processes.get_xyz_voxel_pred(algorithm), pred
+        ), f"Mismatch between the {algorithm} predictions of local processes and serial runs."
+
+    # The empty template is not modified by the workers
+    assert map_reduce.reconstruction.n_mu == 0, "The reconstruction template must not be modified."
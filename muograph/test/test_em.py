@@ -0,0 +1,126 @@
+from muograph.hits.hits import Hits
+from muograph.tracking.tracking import Tracking, TrackingMST
+from muograph.reconstruction.tracking_em_test import TrackingEM
+from muograph.reconstruction.em import EM
+from muograph.volume.volume import Volume
+
+import os
+from typing import Tuple
+import torch
+from torch import Tensor
+
+# Test data file path
+TEST_HIT_FILE = os.path.dirname(__file__) + "/../data/iron_barrel/barrel_and_cubes_scattering.csv"
+VOI = Volume(position=(0, 0, -1200), dimension=(1000, 600, 600), voxel_width=50)
+
+
+def get_mst(hits_file: str) -> TrackingMST:
+    hits_in = Hits(plane_labels=(0, 1, 2), csv_filename=hits_file, energy_range=(0.0, 1_000_000))
+    hits_out = Hits(plane_labels=(3, 4, 5), csv_filename=hits_file, energy_range=(0.0, 1_000_000))
+
+    return TrackingMST(trackings=(Tracking(label="above", hits=hits_in), Tracking(label="below", hits=hits_out)))
+
+
+def get_dense_system_matrix(tracks: TrackingEM) -> Tuple[Tensor, Tensor]:
+    r"""
+    Dense reference of the weight matrix and hits, with size (n_mu, Nx, Ny, Nz, 2, 2) and (n_mu, Nx, Ny, Nz).
+    """
+    n_mu = len(tracks.triggered_voxels)
+    W = torch.zeros((n_mu, *VOI.n_vox_xyz, 2, 2))
+    Hit = torch.zeros((n_mu, *VOI.n_vox_xyz))
+
+    for i, (voxels, L, T) in enumerate(zip(tracks.triggered_voxels, tracks.L, tracks.T)):
+        L, T = L.float(), T.float()
+        x_idx, y_idx, z_idx = voxels[:, 0].long(), voxels[:, 1].long(), voxels[:, 2].long()
+        W[i, x_idx, y_idx, z_idx, 0, 0] = L
+        W[i, x_idx, y_idx, z_idx, 0, 1] = (L**2) / 2 + L * T
+        W[i, x_idx, y_idx, z_idx, 1, 0] = (L**2) / 2 + L * T
+        W[i, x_idx, y_idx, z_idx, 1, 1] = (L**3) / 3 + (L**2) * T + L * (T**2)
+        Hit[i, x_idx, y_idx, z_idx] = 1
+
+    return W, Hit
+
+
+def get_dense_scatter_density(em: EM, W: Tensor, Hit: Tensor) -> Tensor:
+    r"""
+    Dense reference of the EM scattering density, with one muon processed at a time.
+    """
+    scatter_density = torch.zeros(em.em_iter, *VOI.n_vox_xyz)
+    scatter_density[0] = em._lambda_
+
+    for itr in range(em.em_iter - 1):
+        lambda_itr = scatter_density[itr]
+        S = torch.zeros((len(W), *VOI.n_vox_xyz))
+
+        for i in range(len(W)):
+            sigma_D = (em.pr[i] ** 2) * torch.sum(W[i] * lambda_itr[..., None, None], (0, 1, 2))
+            if torch.det(sigma_D) != 0:
+                sigma_D_inv = torch.linalg.inv(sigma_D)
+                mask = Hit[i].bool()
+                lambda_j, w = lambda_itr[mask], W[i][mask]
+
+                mtr_x_4 = em.Dx[i] @ sigma_D_inv @ w @ sigma_D_inv @ em.Dx[i]
+                mtr_y_4 = em.Dy[i] @ sigma_D_inv @ w @ sigma_D_inv @ em.Dy[i]
+                mtr_5 = (sigma_D_inv @ w).diagonal(dim1=1, dim2=2).sum(dim=1)
+
+                Sx = 2 * lambda_j + (mtr_x_4 - mtr_5) * (em.pr[i] ** 2) * (lambda_j**2)
+                Sy = 2 * lambda_j + (mtr_y_4 - mtr_5) * (em.pr[i] ** 2) * (lambda_j**2)
+                S[i, mask] = (Sx + Sy) / 2
+
+        mask = em.M != 0
+        scatter_density[itr + 1][mask] = (torch.sum(S, dim=0) / (2 * em.M))[mask]
+
+    return scatter_density
+
+
+def test_em_sparse_system_matrix() -> None:
+    tracks = TrackingEM(voi=VOI, tracking=get_mst(TEST_HIT_FILE), n_events=50)
+    em = EM(voi=VOI, tracks=tracks, em_iter=3)
+
+    W_ref, Hit_ref = get_dense_system_matrix(tracks)
+    n_mu, n_vox = len(W_ref), Hit_ref[0].numel()
+
+    # Scatter the (muon, voxel) entries into dense tensors
+    muon_ids, voxel_ids = tracks.path_voxels
+    W = torch.zeros((n_mu, n_vox, 2, 2)).index_put_((muon_ids, voxel_ids), tracks.W).reshape(W_ref.shape)
+    Hit = torch.zeros((n_mu, n_vox)).index_put_((muon_ids, voxel_ids), tracks.Hit.float()).reshape(Hit_ref.shape)
+
+    assert len(muon_ids) == len(torch.unique(muon_ids * n_vox + voxel_ids)), "Each (muon, voxel) pair must be stored once."
+    assert torch.equal(W, W_ref), "Mismatch between the sparse and dense weight matrices."
+    assert torch.equal(Hit.bool(), Hit_ref.bool()), "Mismatch between the sparse and dense hits."
+
+    scatter_density_ref = get_dense_scatter_density(em, W_ref, Hit_ref)
+    assert torch.allclose(em.scattering_density, scatter_density_ref, rtol=1e-4), "Mismatch between the sparse and dense EM scattering densities."
+
+
+def test_em_batch_expectation_step() -> None:
+    tracks = TrackingEM(voi=VOI, tracking=get_mst(TEST_HIT_FILE), n_events=50)
+    em = EM(voi=VOI, tracks=tracks, em_iter=3)
+
+    muon_ids, voxel_ids = tracks.path_voxels
+    n_mu = len(tracks.triggered_voxels)
+    lambda_path = em._lambda_.flatten()[voxel_ids]
+
+    S = EM._compute_batch_S(W=tracks.W, lambda_path=lambda_path, hit=tracks.Hit, muon_ids=muon_ids, pr=em.pr[:n_mu], Dx=em.Dx, Dy=em.Dy)
+
+    # Reference with one matrix inversion per muon
+    S_ref = torch.zeros_like(S)
+    for i in range(n_mu):
+        entries = muon_ids == i
+        w, lambda_j, pr_i = tracks.W[entries], lambda_path[entries], em.pr[i]
+        sigma_D_inv = torch.linalg.inv((pr_i**2) * torch.sum(w * lambda_j[:, None, None], dim=0))
+
+        mtr_x_4 = em.Dx[i] @ sigma_D_inv @ w @ sigma_D_inv @ em.Dx[i]
+        mtr_y_4 = em.Dy[i] @ sigma_D_inv @ w @ sigma_D_inv @ em.Dy[i]
+        mtr_5 = (sigma_D_inv @ w).diagonal(dim1=1, dim2=2).sum(dim=1)
+
+        Sx = 2 * lambda_j + (mtr_x_4 - mtr_5) * (pr_i**2) * (lambda_j**2)
+        Sy = 2 * lambda_j + (mtr_y_4 - mtr_5) * (pr_i**2) * (lambda_j**2)
+        S_ref[entries] = (Sx + Sy) / 2
+
+    assert torch.allclose(S, S_ref, rtol=1e-4), "Mismatch between the batched and per-muon expectation steps."
+
+    # Batches not dividing the number of muons, including a batch of a single muon
+    for batch_size in (1, 7, n_mu - 1):
+        rad_len, scattering_density = em.em_reconstruction(batch_size=batch_size)
+        assert torch.allclose(scattering_density, em.scattering_density), f"The scattering density must not depend on the batch size ({batch_size})."
@@ -1,9 +1,12 @@
 import os
-from muograph.hits.hits import Hits
+from pathlib import Path
+from muograph.hits.hits import Hits, DetectorResponse, convert_csv_to_hdf5
+from muograph.utils.save import muograph_path
 import torch
 
 # Test data file path
 test_hit_file = os.path.dirname(__file__) + "/../data/iron_barrel/barrel_and_cubes_scattering.csv"
+output_dir = Path(muograph_path) / "../output_test/"
 
 
 def get_hits(hits_file: str) -> Hits:
@@ -78,3 +81,139 @@ def test_hits_efficiency() -> None:
         assert abs(effective_efficiency - expected_efficiency) <= tolerance, (
             f"Expected efficiency close to {hits.efficiency}, but got {effective_efficiency} " f"(tolerance: {tolerance})."
         )
+
+
+def test_hits_hdf5() -> None:
+    """
+    Test the conversion of the hits CSV file into HDF5, and the memory-mapped loading of the HDF5 file.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    hdf5_file = str(output_dir / "hits.hdf5")
+    convert_csv_to_hdf5(test_hit_file, hdf5_file, input_unit="cm", chunk_size=7000)
+
+    hits_csv = Hits(csv_filename=test_hit_file, plane_labels=(3, 4, 5), input_unit="cm")
+    hits_hdf5 = Hits(hdf5_filename=hdf5_file, plane_labels=(3, 4, 5))
+
+    assert torch.equal(hits_csv.gen_hits, hits_hdf5.gen_hits), "Mismatch between the hits loaded from the CSV and HDF5 files."
+    assert torch.equal(hits_csv.E, hits_hdf5.E), "Mismatch between the energy loaded from the CSV and HDF5 files."
+    assert hits_hdf5.gen_hits.dtype == torch.float32, "The hits loaded from the HDF5 file must be float32."
+
+    # Consecutive planes are a view of the memory-mapped (3, 6, n_mu) block, hence not contiguous
+    if hits_hdf5.gen_hits.device == torch.device("cpu"):
+        assert not hits_hdf5.gen_hits.is_contiguous(), "The hits must be memory-mapped from the HDF5 file without copy."
+
+    # Non consecutive planes
+    hits_hdf5 = Hits(hdf5_filename=hdf5_file, plane_labels=(0, 5))
+    hits_csv = Hits(csv_filename=test_hit_file, plane_labels=(0, 5), input_unit="cm")
+
+    assert torch.equal(hits_csv.gen_hits, hits_hdf5.gen_hits), "Mismatch between the hits of non consecutive planes."
+
+
+def test_hits_hdf5_row_count() -> None:
+    """
+    Test that the HDF5 conversion counts the muons parsed from the CSV file, ignoring blank lines.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    df = Hits.get_data_frame_from_csv(test_hit_file).iloc[:3]
+
+    # Trailing blank lines
+    csv_file, hdf5_file = str(output_dir / "hits_blank_lines.csv"), str(output_dir / "hits_blank_lines.hdf5")
+    with open(csv_file, "w") as f:
+        f.write(df.to_csv(index=False) + "\n\n")
+    convert_csv_to_hdf5(csv_file, hdf5_file, chunk_size=2)
+
+    hits, E, _ = Hits.get_hits_energy_from_hdf5(hdf5_file)
+    assert hits.size() == (3, 6, 3), f"Blank lines must not be converted into muons, got hits with size {tuple(hits.size())}."
+    assert torch.equal(E, Hits.get_energy_from_df(df)), "Mismatch between the energy of the CSV and HDF5 files."
+
+    # Header without data rows
+    csv_file, hdf5_file = str(output_dir / "hits_empty.csv"), str(output_dir / "hits_empty.hdf5")
+    df.iloc[:0].to_csv(csv_file, index=False)
+    convert_csv_to_hdf5(csv_file, hdf5_file)
+
+    hits, E, plane_labels = Hits.get_hits_energy_from_hdf5(hdf5_file)
+    assert (hits.size() == (3, 6, 0)) and (len(E) == 0), "A CSV file without data rows must be converted into empty datasets."
+    assert plane_labels == (0, 1, 2, 3, 4, 5), "The plane labels must be read from the CSV header."
+
+
+def test_hits_from_df() -> None:
+    """
+    Test the hits ordering and data type returned by `get_hits_from_df`.
+    """
+    df = Hits.get_data_frame_from_csv(test_hit_file)
+    plane_labels = (4, 0, 2)
+
+    hits = Hits.get_hits_from_df(df, plane_labels)
+
+    assert hits.size() == (3, len(plane_labels), len(df)), "Hits must have size (3, n_plane, n_mu)."
+    for i, plane in enumerate(plane_labels):
+        for j, coord in enumerate(("X", "Y", "Z")):
+            expected = torch.tensor(df[f"{coord}{plane}"].values, dtype=hits.dtype)
+            assert torch.equal(hits[j, i].cpu(), expected), f"Mismatch for column {coord}{plane}."
+
+    hits_half = Hits.get_hits_from_df(df, plane_labels, dtype=torch.float16)
+
+    assert hits_half.dtype == torch.float16, "Hits must be returned with the requested data type."
+    assert torch.allclose(hits_half.float(), hits, rtol=1e-3), "Mismatch between the lower precision and the default hits."
+
+
+def test_hits_detector_response() -> None:
+    """
+    Test the reproducibility and the plane-wise parameters of the detector response.
+    """
+    hits = Hits(csv_filename=test_hit_file, plane_labels=(0, 1, 2), spatial_res=(1.0, 1.0, 0.0), efficiency=0.9, seed=42)
+    hits_same_seed = Hits(csv_filename=test_hit_file, plane_labels=(0, 1, 2), spatial_res=(1.0, 1.0, 0.0), efficiency=0.9, seed=42)
+
+    assert torch.equal(hits.reco_hits, hits_same_seed.reco_hits), "The reconstructed hits must be reproducible with the same seed."
+    assert torch.equal(hits.hits_eff, hits_same_seed.hits_eff), "The hits efficiency must be reproducible with the same seed."
+
+    # Without seed, the detector response follows the global random number generator
+    torch.manual_seed(0)
+    hits_global_seed = Hits(csv_filename=test_hit_file, plane_labels=(0, 1, 2), spatial_res=(1.0, 1.0, 0.0), efficiency=0.9)
+    torch.manual_seed(0)
+    hits_same_global_seed = Hits(csv_filename=test_hit_file, plane_labels=(0, 1, 2), spatial_res=(1.0, 1.0, 0.0), efficiency=0.9)
+
+    assert torch.equal(hits_global_seed.reco_hits, hits_same_global_seed.reco_hits), "The reconstructed hits must be reproducible with torch.manual_seed."
+    assert torch.equal(hits_global_seed.hits_eff, hits_same_global_seed.hits_eff), "The hits efficiency must be reproducible with torch.manual_seed."
+
+    # New detector response, simulated in-place
+    gen_hits, reco_hits = hits.gen_hits, hits.reco_hits
+    spatial_res = torch.tensor([[0.0, 0.0, 0.0], [2.0, 2.0, 0.0], [50.0, 50.0, 0.0]])
+    efficiency = torch.tensor([1.0, 0.5, 0.0])
+    hits.simulate_detector_response(DetectorResponse(spatial_res=spatial_res, efficiency=efficiency, seed=0))
+
+    assert hits.reco_hits is reco_hits, "The reconstructed hits must be updated in-place."
+    assert hits.gen_hits is gen_hits, "The generated hits must not be reloaded."
+
+    assert torch.equal(hits.reco_hits[:, 0], hits.gen_hits[:, 0]), "Hits on a plane with zero spatial resolution must not be smeared."
+    assert torch.equal(hits.reco_hits[2], hits.gen_hits[2]), "Hits must not be smeared along an axis with zero spatial resolution."
+    for plane in (1, 2):
+        std = (hits.reco_hits[:2, plane] - hits.gen_hits[:2, plane]).std().item()
+        assert abs(std - spatial_res[plane, 0].item()) < 0.05 * spatial_res[plane, 0].item(), f"Wrong spatial resolution on plane {plane}."
+
+    effective_efficiency = hits.hits_eff.float().mean(dim=-1)
+    assert torch.allclose(effective_efficiency, efficiency, atol=0.01), f"Expected plane-wise efficiency {efficiency}, but got {effective_efficiency}."
+
+
+def test_hits_plane_wise_response() -> None:
+    """
+    Test the plane-wise spatial resolution and efficiency of the detector panels.
+    """
+    spatial_res = torch.tensor([[1.0, 1.0, 0.0], [0.0, 0.0, 0.0], [10.0, 5.0, 0.0]])
+    efficiency = torch.tensor([0.9, 1.0, 0.5])
+
+    hits = Hits(csv_filename=test_hit_file, plane_labels=(0, 1, 2), spatial_res=spatial_res, efficiency=efficiency, seed=0)
+
+    assert torch.equal(hits.reco_hits[:, 1], hits.gen_hits[:, 1]), "Hits on a plane with zero spatial resolution must not be smeared."
+
+    smearing_std = (hits.reco_hits - hits.gen_hits).std(dim=-1).T  # (n_plane, 3)
+    assert torch.allclose(smearing_std, spatial_res, rtol=0.05), f"Expected plane-wise spatial resolution {spatial_res}, but got {smearing_std}."
+
+    effective_efficiency = hits.hits_eff.float().mean(dim=-1)
+    assert torch.allclose(effective_efficiency, efficiency, atol=0.01), f"Expected plane-wise efficiency {efficiency}, but got {effective_efficiency}."
+
+    try:
+        Hits(csv_filename=test_hit_file, plane_labels=(0, 1), spatial_res=spatial_res)
+        raise AssertionError("A ValueError must be raised when the spatial resolution does not match the number of planes.")
+    except ValueError:
+        pass
@@ -77,6 +77,11 @@ def test_poca_loading() -> None:
 
     assert all(comparison_results), "Mismatch between reference and loaded POCA instances."
 
+    # Quality cuts on a loaded POCA need no tracks
+    assert torch.equal(
+        poca.get_quality_mask(dca_range=(0.0, 5.0)), poca_loaded.get_quality_mask(dca_range=(0.0, 5.0))
+    ), "Mismatch between the quality cuts of the reference and loaded POCA instances."
+
 
 def test_poca_predictions() -> None:
     mst = get_mst(TEST_HIT_FILE)
@@ -89,3 +94,69 @@ def test_poca_predictions() -> None:
     assert (
         n_poca_uranium_x_region > n_poca_empty_x_region
     ), "The average number of POCA points per voxel in the uranium x region {n_poca_uranium_x_region} must be higher than in the empty region {n_poca_empty_x_region}"
+
+
+def test_n_poca_per_vox() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+
+    poca = POCA(mst, voi=VOI)
+
+    assert poca.n_poca_per_vox.sum() == poca.n_mu, "Each POCA point within the voi must be counted exactly once."
+
+    indices = poca.poca_indices.long()
+    n_poca_per_vox = torch.zeros(VOI.n_vox_xyz, dtype=torch.int64, device=indices.device)
+    n_poca_per_vox.index_put_(
+        (indices[:, 0], indices[:, 1], indices[:, 2]), torch.ones(len(indices), dtype=torch.int64, device=indices.device), accumulate=True
+    )
+
+    assert torch.equal(n_poca_per_vox, poca.n_poca_per_vox.long()), "The number of POCA points per voxel must match the POCA points voxel indices."
+
+
+def test_closest_approach() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    mask = POCA.compute_parallel_mask(mst.tracks_in, mst.tracks_out)
+    P1, P2, V1, V2 = (x[mask].double() for x in (mst.points_in, mst.points_out, mst.tracks_in, mst.tracks_out))
+
+    poca_points, dca, t_in, t_out, opening_angle = POCA.compute_closest_approach(P1, P2, V1, V2, chunk_size=7_000)
+
+    # The segment of closest approach is perpendicular to both tracks
+    Q1, Q2 = P1 + t_in.unsqueeze(-1) * V1, P2 + t_out.unsqueeze(-1) * V2
+    segment = Q2 - Q1
+    for V in (V1, V2):
+        cos = (segment * V).sum(dim=-1) / (segment.norm(dim=-1) * V.norm(dim=-1))
+        assert (cos[dca > 1e-3].abs() < 1e-6).all(), "The segment of closest approach must be perpendicular to the tracks."
+
+    assert torch.allclose(dca, segment.norm(dim=-1)), "The DCA must be the length of the segment of closest approach."
+    assert torch.allclose(poca_points, (Q1 + Q2) / 2), "The POCA points must be the middle of the segment of closest approach."
+    cos = (V1 * V2).sum(dim=-1).abs() / (V1.norm(dim=-1) * V2.norm(dim=-1))
+    assert torch.allclose(opening_angle, torch.acos(cos.clamp(max=1.0)), atol=1e-6), "Mismatch between the opening angle and the angle between the tracks."
+
+    # Reference linear solve
+    V3 = torch.linalg.cross(V2, V1, dim=-1)
+    ts = torch.linalg.solve(torch.stack([V1, -V2, V3], dim=-1), P2 - P1)
+    assert torch.allclose(t_in, ts[:, 0]) and torch.allclose(t_out, ts[:, 1]), "Mismatch with the track parameters from the linear solve."
+
+    try:
+        POCA.compute_poca_points(P1, P2, V1, V1)
+        raise AssertionError("A ValueError must be raised when all the tracks are parallel.")
+    except ValueError:
+        pass
+
+
+def test_poca_closest_approach_features() -> None:
+    mst = get_mst(TEST_HIT_FILE)
+    poca = POCA(mst, voi=VOI)
+
+    for feature in (poca.dca, poca.t_in, poca.t_out, poca.opening_angle, poca.quality_flag):
+        assert len(feature) == poca.n_mu, "The closest approach features must be filtered as the POCA points."
+
+    Q1 = poca.tracks.points_in + poca.t_in.unsqueeze(-1) * poca.tracks.tracks_in
+    Q2 = poca.tracks.points_out + poca.t_out.unsqueeze(-1) * poca.tracks.tracks_out
+
+    assert torch.allclose(poca.poca_points, (Q1 + Q2) / 2, atol=1e-2), "The POCA points must be the middle of the closest approach segment."
+    # The closest approach of nearly parallel tracks is ill-conditioned in single precision
+    flag = poca.quality_flag
+    assert torch.allclose(poca.dca[flag], (Q2 - Q1).norm(dim=-1)[flag], rtol=1e-3, atol=5e-2), "Mismatch between the DCA and the closest approach segment."
+
+    mask = poca.get_quality_mask(dca_range=(0.0, 10.0), use_quality_flag=True)
+    assert torch.equal(mask, (poca.dca <= 10.0) & (poca.opening_angle >= poca.min_opening_angle)), "Wrong POCA quality mask."
@@ -0,0 +1,144 @@
+from muograph.hits.hits import Hits
+from muograph.tracking.tracking import Tracking, TrackingMST
+from muograph.reconstruction.poca import POCA
+from muograph.reconstruction.streaming import StreamingPOCA, VoxelStatistics, IncrementalPOCA, IncrementalBCA
+from muograph.reconstruction.binned_clustered import BCA, bca_params_type
+from muograph.volume.volume import Volume
+from muograph.utils.tools import segment_reduce
+
+import os
+import math
+import pickle
+import pandas as pd
+from typing import Iterator
+from functools import partial
+import torch
+import numpy as np
+
+# Test data file path
+TEST_HIT_FILE = os.path.dirname(__file__) + "/../data/iron_barrel/barrel_and_cubes_scattering.csv"
+VOI = Volume(position=(0, 0, -1200), dimension=(1000, 600, 600), voxel_width=20)
+
+
+def get_poca(hits_file: str) -> POCA:
+    hits_in = Hits(plane_labels=(0, 1, 2), csv_filename=hits_file, energy_range=(0.0, 1_000_000))
+    hits_out = Hits(plane_labels=(3, 4, 5), csv_filename=hits_file, energy_range=(0.0, 1_000_000))
+
+    mst = TrackingMST(trackings=(Tracking(label="above", hits=hits_in), Tracking(label="below", hits=hits_out)))
+
+    return POCA(tracking=mst, voi=VOI)
+
+
+def test_streaming_poca() -> None:
+    poca = get_poca(TEST_HIT_FILE)
+
+    streaming = StreamingPOCA(voi=VOI, plane_labels_in=(0, 1, 2), plane_labels_out=(3, 4, 5), energy_range=(0.0, 1_000_000))
+    streaming.process_csv(TEST_HIT_FILE, chunk_size=7_000)
+
+    assert streaming.n_mu == poca.tracks.n_mu + (~poca.parallel_mask).sum() + (~poca.mask_in_voi).sum(), "All the muons must be processed."
+    assert torch.equal(streaming.n_poca_per_vox, poca.n_poca_per_vox), "Mismatch between the streamed and full number of POCA points per voxel."
+
+    # Exact per-voxel mean
+    flat_indices = VOI.get_flat_voxel_indices(poca.poca_indices)
+    n_vox = math.prod(VOI.n_vox_xyz)
+    mean = segment_reduce(poca.tracks.dtheta.double(), flat_indices, n_vox, np.mean).reshape(VOI.n_vox_xyz)
+
+    assert torch.allclose(streaming.dtheta_stats.mean, mean), "Mismatch between the streamed and full per-voxel mean scattering angle."
+
+    # Approximate per-voxel median
+    median = segment_reduce(poca.tracks.dtheta, flat_indices, n_vox, partial(np.quantile, q=0.5)).reshape(VOI.n_vox_xyz)
+    mask = poca.n_poca_per_vox > 10
+    relative_error = ((streaming.xyz_voxel_pred - median).abs() / median)[mask]
+
+    assert relative_error.median() < 0.05, f"The streamed median scattering angle deviates by {relative_error.median():.2f} from the exact median."
+
+
+def test_voxel_statistics_merge() -> None:
+    torch.manual_seed(0)
+    n_vox = math.prod(VOI.n_vox_xyz)
+
+    flat_indices = torch.randint(0, n_vox, (10_000,))
+    values = torch.rand(10_000) * 0.1
+
+    stats = VoxelStatistics(voi=VOI)
+    stats.update(flat_indices, values)
+
+    stats_merged = VoxelStatistics(voi=VOI)
+    stats_partition = VoxelStatistics(voi=VOI)
+    stats_merged.update(flat_indices[:3_000], values[:3_000])
+    stats_partition.update(flat_indices[3_000:], values[3_000:])
+    stats_merged.merge(stats_partition)
+
+    assert torch.equal(stats.counts, stats_merged.counts) and torch.equal(stats.hist, stats_merged.hist), "Merged histograms must match."
+    assert torch.allclose(stats.mean, stats_merged.mean) and torch.allclose(stats.rms, stats_merged.rms), "Merged moments must match."
+    assert torch.equal(stats.quantile(0.5), stats_merged.quantile(0.5)), "Merged quantiles must match."
+
+    # Histograms are only allocated for the non-empty voxels
+    assert torch.equal(stats.voxels, torch.nonzero(stats.counts).flatten()), "Histograms must be allocated for the non-empty voxels only."
+    assert len(stats.hist) == len(stats.voxels), "Histograms must be allocated for the non-empty voxels only."
+
+    stats_pickled = pickle.loads(pickle.dumps(stats_merged))
+    assert torch.equal(stats.hist, stats_pickled.hist) and torch.equal(stats.quantile(0.5), stats_pickled.quantile(0.5)), "Pickled statistics must match."
+
+
+def iter_tracking(hits_file: str, chunk_size: int) -> Iterator[TrackingMST]:
+    for df in pd.read_csv(hits_file, chunksize=chunk_size):
+        hits_in = Hits(plane_labels=(0, 1, 2), df=df, energy_range=(0.0, 1_000_000))
+        hits_out = Hits(plane_labels=(3, 4, 5), df=df, energy_range=(0.0, 1_000_000))
+
+        yield TrackingMST(trackings=(Tracking(label="above", hits=hits_in), Tracking(label="below", hits=hits_out)))
+
+
+def test_incremental_poca() -> None:
+    poca = get_poca(TEST_HIT_FILE)
+
+    incremental = IncrementalPOCA(voi=VOI, capacity=1_000)
+    incremental.update_batches(iter_tracking(TEST_HIT_FILE, chunk_size=7_000))
+
+    assert incremental.n_poca == poca.n_mu, "All the POCA points within the volume must be accumulated."
+    assert torch.equal(incremental.n_poca_per_vox, poca.n_poca_per_vox), "Mismatch between the incremental and full number of POCA points per voxel."
+    assert torch.equal(incremental.poca_points, poca.poca_points), "Mismatch between the incremental and full POCA points."
+    assert torch.equal(incremental.poca_indices, poca.poca_indices), "Mismatch between the incremental and full POCA voxel indices."
+    assert torch.equal(incremental.dtheta, poca.tracks.dtheta) and torch.equal(incremental.dca, poca.dca), "Mismatch between the POCA features."
+
+
+def test_incremental_bca() -> None:
+    bca_params: bca_params_type = {"n_max_per_vox": 20, "n_min_per_vox": 3, "dtheta_range": (0.05 * math.pi / 180, 20 * math.pi / 180)}
+
+    bca = BCA(voi=VOI, tracking=next(iter_tracking(TEST_HIT_FILE, chunk_size=60_000)))
+    bca.bca_params = bca_params
+
+    batches = list(iter_tracking(TEST_HIT_FILE, chunk_size=7_000))
+    incremental = IncrementalBCA(voi=VOI, bca_params=bca_params)
+    incremental.update_batches(batches)
+
+    assert torch.equal(incremental.xyz_voxel_pred, bca.xyz_voxel_pred), "Mismatch between the incremental and full BCA predictions."
+    assert torch.equal(incremental.hit_per_voxel, bca.hit_per_voxel), "Mismatch between the incremental and full BCA hit per voxel."
+
+    # Merge of independent partitions
+    incremental_merged = IncrementalBCA(voi=VOI, bca_params=bca_params)
+    incremental_partition = IncrementalBCA(voi=VOI, bca_params=bca_params)
+    incremental_merged.update_batches(batches[:4])
+    incremental_partition.update_batches(batches[4:])
+    incremental_merged.merge(incremental_partition)
+
+    assert torch.equal(incremental_merged.xyz_voxel_pred, bca.xyz_voxel_pred), "Mismatch between the merged and full BCA predictions."
+    assert torch.equal(incremental_merged.n_poca_per_vox, incremental.n_poca_per_vox), "Merged POCA counts must match."
+
+    # Only the voxels of the new POCA points are refreshed
+    pred = incremental.xyz_voxel_pred.flatten().clone()
+    touched_voxels = incremental.update(batches[0])
+    untouched = torch.ones_like(pred, dtype=torch.bool)
+    untouched[touched_voxels] = False
+    assert torch.equal(incremental.xyz_voxel_pred.flatten()[untouched], pred[untouched]), "The predictions of untouched voxels must not be modified."
+
+    # Score parameters can be modified, unlike the per-voxel state parameters
+    bca.bca_params = {"n_min_per_vox": 5}
+    incremental_merged.bca_params = {"n_min_per_vox": 5}
+    assert torch.equal(incremental_merged.xyz_voxel_pred, bca.xyz_voxel_pred), "Mismatch between the BCA predictions after a parameter change."
+
+    try:
+        incremental_merged.bca_params = {"n_max_per_vox": 10}
+        raise AssertionError("A ValueError must be raised when modifying the per-voxel state parameters.")
+    except ValueError:
+        pass
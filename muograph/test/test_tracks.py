@@ -1,4 +1,4 @@
-from muograph.hits.hits import Hits
+from muograph.hits.hits import Hits, iter_hits_from_csv
 from muograph.tracking.tracking import Tracking
 from muograph.utils.save import muograph_path
 
@@ -124,3 +124,84 @@ def test_tracks_zenith() -> None:
     for tracks in [tracks_in, tracks_out]:
         assert (tracks.theta < 0.71 + tol).all(), f"Muon zenith angle exceeds 0.71 rad (40 deg) for {tracks.label} tracks."
         assert abs(tracks.theta.mean() - 0.25) < tol, f"Mean muon zenith angle deviates from 0.25 rad (14 deg) for {tracks.label} tracks."
+
+
+def test_tracks_from_hits_chunks() -> None:
+    r"""
+    Tests that tracks computed chunk by chunk match the tracks computed from the full hits file.
+    """
+    params = {"plane_labels": (0, 1, 2), "energy_range": (0.0, 1_000_000), "input_unit": "mm"}
+
+    tracks = Tracking(label="above", hits=Hits(csv_filename=str(TEST_HIT_FILE), **params))  # type: ignore
+    tracks_chunks = Tracking(label="above", hits_chunks=iter_hits_from_csv(str(TEST_HIT_FILE), chunk_size=7_000, **params))  # type: ignore
+
+    assert tracks_chunks.n_mu == tracks.n_mu, "The number of muons must not depend on the chunk size."
+
+    for attr in ["tracks", "points", "E", "tracks_eff", "angular_error"]:
+        assert torch.allclose(getattr(tracks, attr).float(), getattr(tracks_chunks, attr).float()), f"Mismatch in {attr} between full and chunked tracking."
+
+
+def test_tracks_fit_methods() -> None:
+    r"""
+    Tests that the covariance and regression track fits match the SVD track fit.
+    """
+    hits = Hits(csv_filename=str(TEST_HIT_FILE), plane_labels=(3, 4, 5), spatial_res=(1.0, 1.0, 0.0), seed=0)
+
+    tracks_svd, points_svd = Tracking.get_tracks_points_from_hits(hits.reco_hits, fit_method="svd")
+
+    for fit_method in ["covariance", "regression"]:
+        tracks, points = Tracking.get_tracks_points_from_hits(hits.reco_hits, fit_method=fit_method)
+
+        assert (tracks[:, 2] <= 0).all(), f"Tracks fitted with the {fit_method} method must point downward."
+        assert torch.allclose(torch.linalg.norm(tracks, dim=-1), torch.ones(len(tracks)), atol=1e-5), f"Tracks fitted with {fit_method} must be normalized."
+        assert torch.allclose(tracks, tracks_svd, atol=1e-4), f"Mismatch between the tracks fitted with the {fit_method} and svd methods."
+        assert torch.equal(points, points_svd), f"Mismatch between the points fitted with the {fit_method} and svd methods."
+
+
+def test_tracks_parallel_fit() -> None:
+    r"""
+    Tests that the tracks fitted by a pool of workers are identical to the tracks fitted sequentially.
+    """
+    hits = Hits(csv_filename=str(TEST_HIT_FILE), plane_labels=(0, 1, 2), spatial_res=(1.0, 1.0, 0.0), seed=0)
+
+    tracks, points = Tracking.get_tracks_points_from_hits(hits.reco_hits, chunk_size=5_000)
+
+    for backend in ["thread", "process"]:
+        tracks_parallel, points_parallel = Tracking.get_tracks_points_from_hits(hits.reco_hits, chunk_size=5_000, n_workers=2, backend=backend)
+
+        assert torch.equal(tracks, tracks_parallel), f"Mismatch between the tracks fitted sequentially and with the {backend} backend."
+        assert torch.equal(points, points_parallel), f"Mismatch between the points fitted sequentially and with the {backend} backend."
+
+    # The backend is forwarded by the Tracking class
+    tracking = Tracking(label="above", hits=hits, n_workers=2, backend="process")
+    assert tracking.backend == "process", "The backend must be forwarded to the track fitting."
+    assert torch.equal(tracking.tracks, tracks) and torch.equal(
+        tracking.points, points
+    ), "Mismatch between the tracks fitted by the Tracking class and sequentially."
+
+    try:
+        Tracking(label="above", hits=hits, backend="gpu")
+        raise AssertionError("A ValueError must be raised for an unknown backend.")
+    except ValueError:
+        pass
+
+
+def test_tracks_selection() -> None:
+    r"""
+    Tests that composed muon selections match the eagerly filtered tracks.
+    """
+    tracks_in, _ = get_tracks(str(TEST_HIT_FILE))
+    tracks, E, hits = tracks_in.tracks.clone(), tracks_in.E.clone(), tracks_in.hits.reco_hits.clone()
+
+    mask_theta = tracks_in.theta < 0.5
+    tracks_in._filter_muons(mask_theta)
+    mask_E = tracks_in.E > tracks_in.E.median()
+    tracks_in._filter_muons(mask_E)
+
+    indices = torch.arange(len(tracks))[mask_theta][mask_E]
+
+    assert torch.equal(tracks_in.muon_indices, indices), "The muon indices must refer to the unfiltered tracks."
+    assert torch.equal(tracks_in.tracks, tracks[indices]), "Mismatch between the selected and the eagerly filtered tracks."
+    assert torch.equal(tracks_in.E, E[indices]), "Mismatch between the selected and the eagerly filtered energy."
+    assert torch.equal(tracks_in.hits.reco_hits, hits[:, :, indices]), "Mismatch between the selected and the eagerly filtered hits."
+    assert tracks_in.n_mu == len(indices), "The number of muons must match the selection."
@@ -0,0 +1,27 @@
+from muograph.volume.volume import Volume
+
+import torch
+
+VOI = Volume(position=(0, 0, -1200), dimension=(1000, 600, 600), voxel_width=20)
+
+
+def test_voxel_indices() -> None:
+    r"""
+    Tests that the analytic voxel lookup matches the voxel edges of the volume.
+    """
+    torch.manual_seed(0)
+    points = VOI.xyz_min + torch.rand((1000, 3), device=VOI.xyz.device) * VOI.dxyz
+
+    indices = VOI.get_voxel_indices(points).long()
+    edges = VOI.voxel_edges[indices[:, 0], indices[:, 1], indices[:, 2]]  # (n, 2, 3)
+
+    assert ((points >= edges[:, 0]) & (points <= edges[:, 1])).all(), "Points must lie within the edges of their voxel."
+
+    # Points outside the volume
+    points_out = torch.stack([VOI.xyz_max + 1.0, VOI.xyz_min - 1.0])
+
+    assert (VOI.get_voxel_indices(points_out) == -1).all(), "Voxel indices of points outside the volume must be -1."
+
+    nx, ny, nz = VOI.n_vox_xyz
+    expected = torch.tensor([[nx - 1, ny - 1, nz - 1], [0, 0, 0]], device=points_out.device)
+    assert (VOI.get_voxel_indices(points_out, clamp=True) == expected).all(), "Points outside the volume must be assigned to the closest voxel."
@@ -1,7 +1,8 @@
 import torch
 from torch import Tensor
-from typing import Tuple, Optional, Dict, Union
+from typing import Tuple, Optional, Dict, Union, Iterable, List
 import math
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import matplotlib.pyplot as plt
 import matplotlib
 import seaborn as sns
@@ -9,6 +10,7 @@ import pandas as pd
 import numpy as np
 
 from muograph.utils.save import AbsSave
+from muograph.utils.selection import AbsSelection
 from muograph.hits.hits import Hits
 from muograph.volume.volume import Volume
 from muograph.plotting.params import n_bins, font, alpha_sns, titlesize, hist_figsize, hist2_figsize, labelsize, tracking_figsize, configure_plot_theme
@@ -20,7 +22,7 @@ muon tracks usable for image reconstruction purposes.
 """
 
 
-class Tracking(AbsSave):
+class Tracking(AbsSave, AbsSelection):
     r"""
     A class for tracking muons based on hits data.
 
@@ -38,16 +40,23 @@ class Tracking(AbsSave):
     the standard deviation of the distribution of the error on theta. The error on theta,
     is computed by comparing the values of theta computed from the generated hits (Hits.gen_hits) and
     from the smeared hits (Hits.reco_hits).
+
+    Muon events are selected through indices (see `AbsSelection`), the muon-wise attributes
+    being gathered when read.
     """
 
-    _tracks: Optional[Tensor] = None  # (mu, 3)
-    _points: Optional[Tensor] = None  # (mu, 3)
+    # Muon-wise attributes, None until computed
+    _tracks: Optional[Tensor]  # (mu, 3)
+    _points: Optional[Tensor]  # (mu, 3)
+    _angular_error: Optional[Tensor]  # (mu)
+    _E: Optional[Tensor]  # (mu)
+    _tracks_eff: Optional[Tensor]  # (mu)
+    _muon_wise_vars = ["_tracks", "_points", "_angular_error", "_E", "_tracks_eff", "hits"]
+
     _theta: Optional[Tensor] = None  # (mu)
     _theta_xy: Optional[Tensor] = None  # (mu)
-    _angular_error: Optional[Tensor] = None  # (mu)
     _angular_res: Optional[float] = None
-    _E: Optional[Tensor] = None  # (mu)
-    _tracks_eff: Optional[Tensor] = None  # (mu)
+
     _vars_to_save = [
         "tracks",
         "points",
@@ -67,14 +76,20 @@ class Tracking(AbsSave):
         tracks_hdf5: Optional[str] = None,
         tracks_df: Optional[pd.DataFrame] = None,
         measurement_type: Optional[str] = None,
+        hits_chunks: Optional[Iterable[Hits]] = None,
+        fit_method: str = "svd",
+        n_workers: int = 1,
+        backend: str = "thread",
     ) -> None:
         r"""
         Initializes the Tracking object.
 
-        The instantiation can be done in three ways:
+        The instantiation can be done in four ways:
         - By providing `hits`: Computes tracks and saves them as HDF5 files in `output_dir`.
         - By providing `tracks_hdf5`: Loads tracking features from the specified HDF5 file.
         - By providing `tracks_df`: Loads tracking features from the specified Pandas DataFrame.
+        - By providing `hits_chunks`: Computes tracks chunk by chunk from an iterable of `Hits`
+        (e.g `iter_hits_from_csv`), and saves them as HDF5 files in `output_dir`.
 
 
         Args:
@@ -84,15 +99,28 @@ class Tracking(AbsSave):
             tracks_hdf5 (Optional[str]): Path to an HDF5 file with previously saved Tracking data.
             tracks_df (Optional[pd.DataFrame]): Pandas DataFrame with previously saved Tracking data.
             measurement_type (Optional[str]): Type of measurement campaign, either 'absorption' or 'freesky'.
+            hits_chunks (Optional[Iterable[Hits]]): Iterable of Hits instances, e.g chunks of a large file.
+            Only the tracking features are kept in memory.
+            fit_method (str): The track fitting method used to compute tracks from hits, either 'svd', 'covariance' or 'regression'.
+            See `get_tracks_points_from_hits`.
+            n_workers (int): The number of workers fitting chunks of muons concurrently. Defaults to 1 (sequential).
+            backend (str): The type of workers, either 'thread' or 'process'. See `get_tracks_points_from_hits`.
         """
 
         self._label = self._validate_label(label)
         self._measurement_type = self._validate_measurement_type(measurement_type)
+        self.fit_method = fit_method
+        self.n_workers = n_workers
+        self.backend = self._validate_backend(backend)
 
         super().__init__(output_dir=output_dir)
 
-        if (hits is not None) & (tracks_hdf5 is None) & (tracks_df is None):
-            self.hits = hits
+        if ((hits is not None) | (hits_chunks is not None)) & (tracks_hdf5 is None) & (tracks_df is None):
+            if hits_chunks is not None:
+                self.hits = None
+                self.load_from_hits_chunks(hits_chunks=hits_chunks)
+            else:
+                self.hits = hits
 
             if self.output_dir is not None:
                 filename = "tracks_" + self.label if self._measurement_type == "" else "tracks_" + self.label + "_" + self._measurement_type
@@ -123,6 +151,12 @@ class Tracking(AbsSave):
             raise ValueError("Label must be either 'above' or 'below'.")
         return label
 
+    @staticmethod
+    def _validate_backend(backend: str) -> str:
+        if backend not in ["thread", "process"]:
+            raise ValueError(f"backend must be 'thread' or 'process', not {backend}.")
+        return backend
+
     @staticmethod
     def _validate_measurement_type(measurement_type: Optional[str]) -> str:
         valid_types = ["absorption", "freesky", None]
@@ -131,49 +165,192 @@ class Tracking(AbsSave):
         return measurement_type or ""
 
     @staticmethod
-    def get_tracks_points_from_hits(hits: Tensor, chunk_size: int = 200_000) -> Tuple[Tensor, Tensor]:
+    def fit_tracks_svd(centered_hits: Tensor) -> Tensor:
+        r"""
+        Computes the tracks as the first right singular vector of the centered hits.
+
+        Args:
+            - centered_hits (Tensor): The hits centered on their mean point, with size (3, n_plane, mu).
+
+        Returns:
+            - tracks (Tensor): The tracks, with size (mu, 3).
+        """
+        _, _, vh = torch.linalg.svd(centered_hits.permute(2, 1, 0), full_matrices=False)  # vh shape: (mu, 3, 3)
+        return vh[:, 0, :]
+
+    @staticmethod
+    def fit_tracks_covariance(centered_hits: Tensor) -> Tensor:
+        r"""
+        Computes the tracks as the principal axis of the hits 3x3 covariance matrix,
+        i.e the eigenvector associated to its largest eigenvalue, in closed form.
+
+        The largest eigenvalue is computed with the trigonometric solution of the characteristic polynomial.
+        The eigenvector is given by the cross product of two rows of (C - lambda I), the pair with the largest norm
+        being used for numerical stability.
+
+        Args:
+            - centered_hits (Tensor): The hits centered on their mean point, with size (3, n_plane, mu).
+
+        Returns:
+            - tracks (Tensor): The tracks, with size (mu, 3).
+        """
+        x, y, z = centered_hits
+
+        # Covariance matrix elements (up to a 1 / n_plane factor), with size (mu)
+        cxx, cyy, czz = (x * x).sum(dim=0), (y * y).sum(dim=0), (z * z).sum(dim=0)
+        cxy, cxz, cyz = (x * y).sum(dim=0), (x * z).sum(dim=0), (y * z).sum(dim=0)
+
+        # Largest eigenvalue
+        q = (cxx + cyy + czz) / 3
+        p = torch.sqrt(((cxx - q) ** 2 + (cyy - q) ** 2 + (czz - q) ** 2 + 2 * (cxy**2 + cxz**2 + cyz**2)) / 6)
+        p_safe = torch.where(p > 0, p, torch.ones_like(p))
+        bxx, byy, bzz = (cxx - q) / p_safe, (cyy - q) / p_safe, (czz - q) / p_safe
+        bxy, bxz, byz = cxy / p_safe, cxz / p_safe, cyz / p_safe
+        det_b = bxx * (byy * bzz - byz**2) - bxy * (bxy * bzz - byz * bxz) + bxz * (bxy * byz - byy * bxz)
+        phi = torch.acos(torch.clamp(det_b / 2, -1.0, 1.0)) / 3
+        eigenvalue = q + 2 * p * torch.cos(phi)
+
+        # Rows of (C - lambda I), with size (mu, 3)
+        r0 = torch.stack([cxx - eigenvalue, cxy, cxz], dim=-1)
+        r1 = torch.stack([cxy, cyy - eigenvalue, cyz], dim=-1)
+        r2 = torch.stack([cxz, cyz, czz - eigenvalue], dim=-1)
+
+        # The eigenvector is orthogonal to the rows of (C - lambda I)
+        candidates = torch.stack([torch.linalg.cross(r0, r1), torch.linalg.cross(r0, r2), torch.linalg.cross(r1, r2)], dim=1)  # (mu, 3, 3)
+        norms = torch.linalg.norm(candidates, dim=-1)  # (mu, 3)
+        best = norms.argmax(dim=1)
+        idx = torch.arange(len(best), device=best.device)
+
+        norm = norms[idx, best]
+        tracks = candidates[idx, best] / torch.where(norm > 0, norm, torch.ones_like(norm))[:, None]
+
+        # Degenerate case (identical hits): vertical track
+        vertical = torch.tensor([0.0, 0.0, 1.0], dtype=tracks.dtype, device=tracks.device)
+        return torch.where((norm > 0)[:, None], tracks, vertical)
+
+    @staticmethod
+    def fit_tracks_regression(centered_hits: Tensor) -> Tensor:
+        r"""
+        Computes the tracks with a linear regression of x and y as function of z:
+        x = x0 + sx * z, y = y0 + sy * z. Suited for tracks far from horizontal, detected by panels at different z.
+
+        Args:
+            - centered_hits (Tensor): The hits centered on their mean point, with size (3, n_plane, mu).
+
+        Returns:
+            - tracks (Tensor): The tracks, with size (mu, 3).
+        """
+        x, y, z = centered_hits
+
+        szz = (z * z).sum(dim=0)
+        if (szz == 0).any():
+            raise ValueError("The regression fit requires hits at different z positions.")
+
+        sx, sy = (x * z).sum(dim=0) / szz, (y * z).sum(dim=0) / szz
+        tracks = torch.stack([sx, sy, torch.ones_like(sx)], dim=-1)
+
+        return tracks / torch.linalg.norm(tracks, dim=-1, keepdim=True)
+
+    @staticmethod
+    def fit_chunk(hits: Tensor, tracks: Tensor, points: Tensor, start: int, end: int, fit_method: str = "svd") -> None:
+        r"""
+        Fits the tracks of the muons within [start, end) and writes them in-place in the `tracks` and `points` buffers.
+
+        Args:
+            - hits (Tensor): The hits data with shape (3, n_plane, mu).
+            - tracks (Tensor): The tracks buffer with size (mu, 3).
+            - points (Tensor): The points buffer with size (mu, 3).
+            - start (int): The index of the first muon of the chunk.
+            - end (int): The index of the last muon of the chunk (excluded).
+            - fit_method (str): The fitting method, either 'svd', 'covariance' or 'regression'.
+        """
+        if fit_method == "svd":
+            fit_tracks = Tracking.fit_tracks_svd
+        elif fit_method == "covariance":
+            fit_tracks = Tracking.fit_tracks_covariance
+        elif fit_method == "regression":
+            fit_tracks = Tracking.fit_tracks_regression
+        else:
+            raise ValueError(f"fit_method must be 'svd', 'covariance' or 'regression', not {fit_method}.")
+
+        hits_chunk = hits[:, :, start:end]  # Shape: (3, n_plane, chunk_size)
+
+        # Calculate the mean point for each set of hits in the chunk
+        points_chunk = hits_chunk.mean(dim=1)  # Shape: (3, chunk_size)
+
+        # Center the data
+        centered_hits_chunk = hits_chunk - points_chunk.unsqueeze(1)  # Shape: (3, n_plane, chunk_size)
+
+        # Store the chunk results in the main output tensors
+        tracks[start:end, :] = fit_tracks(centered_hits_chunk)
+        points[start:end, :] = points_chunk.T
+
+    @staticmethod
+    def get_tracks_points_from_hits(
+        hits: Tensor,
+        chunk_size: int = 200_000,
+        fit_method: str = "svd",
+        n_workers: int = 1,
+        backend: str = "thread",
+    ) -> Tuple[Tensor, Tensor]:
         r"""
         The muon hits on detector planes are plugged into a linear fit
         to compute a track T(tx, ty, tz) and a point on that track P(px, py, pz).
 
+        Chunks can be fitted concurrently by a pool of `n_workers` threads or processes, writing into shared
+        preallocated `tracks` and `points` buffers. The output is identical to the serial one.
+
         Args:
             - hits (Tensor): The hits data with shape (3, n_plane, mu).
             - chunk_size (int): Size of chunks for processing in case n_mu is very large.
+            - fit_method (str): The fitting method, one of:
+                - 'svd': first right singular vector of the centered hits (default).
+                - 'covariance': closed form principal axis of the hits 3x3 covariance matrix.
+                - 'regression': linear regression of x and y as function of z, for tracks far from horizontal.
+            - n_workers (int): The number of workers fitting chunks concurrently. If 1, chunks are fitted sequentially.
+            - backend (str): The type of workers, either 'thread' or 'process'. The 'process' backend only supports CPU tensors.
 
         Returns:
             - tracks, points (Tuple[Tensor, Tensor]): The points and tracks tensors
             with respective size (mu, 3).
         """
 
+        Tracking._validate_backend(backend)
+
         _, __, mu = hits.shape
 
         tracks = torch.empty((mu, 3), dtype=hits.dtype, device=hits.device)
         points = torch.empty((mu, 3), dtype=hits.dtype, device=hits.device)
 
         # Process in chunks to manage memory
-        for start in range(0, mu, chunk_size):
-            end = min(start + chunk_size, mu)
-
-            hits_chunk = hits[:, :, start:end]  # Shape: (3, n_plane, chunk_size)
+        chunks = [(start, min(start + chunk_size, mu)) for start in range(0, mu, chunk_size)]
 
-            # Calculate the mean point for each set of hits in the chunk
-            points_chunk = hits_chunk.mean(dim=1)  # Shape: (3, chunk_size)
+        if (n_workers <= 1) | (len(chunks) <= 1):
+            for start, end in chunks:
+                Tracking.fit_chunk(hits, tracks, points, start, end, fit_method)
 
-            # Center the data
-            centered_hits_chunk = hits_chunk - points_chunk.unsqueeze(1)  # Shape: (3, n_plane, chunk_size)
+        elif backend == "thread":
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                futures = [executor.submit(Tracking.fit_chunk, hits, tracks, points, start, end, fit_method) for start, end in chunks]
+                for future in futures:
+                    future.result()
 
-            # Perform SVD in batch mode
-            centered_hits_chunk = centered_hits_chunk.permute(2, 1, 0)  # Shape: (chunk_size, n_plane, 3)
-            _, _, vh = torch.linalg.svd(centered_hits_chunk, full_matrices=False)  # vh shape: (chunk_size, 3, 3)
+        else:
+            if hits.device.type != "cpu":
+                raise ValueError("The 'process' backend only supports CPU tensors.")
 
-            # Extract the principal direction (first right singular vector) for each set
-            tracks_chunk = vh[:, 0, :]  # Shape: (chunk_size, 3)
+            # Buffers shared with the worker processes
+            tracks.share_memory_()
+            points.share_memory_()
+            hits = torch.empty_like(hits, memory_format=torch.contiguous_format).share_memory_().copy_(hits)
 
-            # Store the chunk results in the main output tensors
-            tracks[start:end, :] = tracks_chunk
-            points[start:end, :] = points_chunk.T
+            with ProcessPoolExecutor(max_workers=n_workers, mp_context=torch.multiprocessing.get_context()) as executor:
+                futures = [executor.submit(Tracking.fit_chunk, hits, tracks, points, start, end, fit_method) for start, end in chunks]
+                for future in futures:
+                    future.result()
 
-        tracks[:, 2] = torch.where(tracks[:, 2] > 0, -tracks[:, 2], tracks[:, 2])
+        # Tracks point downward
+        tracks = torch.where(tracks[:, 2:] > 0, -tracks, tracks)
         return tracks, points
 
     @staticmethod
@@ -221,7 +398,7 @@ class Tracking(AbsSave):
         Computes the tracks efficiency.
         """
 
-        tracks_eff = torch.where(hits_eff.sum(dim=0) == 3, 1, 0)
+        tracks_eff = torch.where(hits_eff.sum(dim=0) == hits_eff.size(0), 1, 0)
         return tracks_eff
 
     @staticmethod
@@ -275,6 +452,35 @@ class Tracking(AbsSave):
         if "angular_error" in df.keys():
             self.angular_error = torch.tensor(df["angular_error"].values, dtype=torch.float32, device=DEVICE)
 
+    def load_from_hits_chunks(self, hits_chunks: Iterable[Hits], n_workers: Optional[int] = None, backend: Optional[str] = None) -> None:
+        r"""
+        Computes the tracking features chunk by chunk from an iterable of `Hits` instances.
+        The hits of a chunk are released once its tracking features are computed.
+
+        Args:
+            hits_chunks (Iterable[Hits]): Iterable of Hits instances.
+            n_workers (Optional[int]): The number of workers fitting the muons of a chunk concurrently. Defaults to `self.n_workers`.
+            backend (Optional[str]): The type of workers, either 'thread' or 'process'. Defaults to `self.backend`.
+
+        Sets:
+            self.tracks, self.points, self.E, self.tracks_eff, self.angular_error
+        """
+        features: Dict[str, List[Tensor]] = {"tracks": [], "points": [], "E": [], "tracks_eff": [], "angular_error": []}
+
+        n_workers = n_workers if n_workers is not None else self.n_workers
+        backend = backend if backend is not None else self.backend
+
+        for hits in hits_chunks:
+            chunk_tracking = Tracking(label=self.label, hits=hits, fit_method=self.fit_method, n_workers=n_workers, backend=backend)
+            for feature in features.keys():
+                features[feature].append(getattr(chunk_tracking, feature))
+
+        if len(features["tracks"]) == 0:
+            raise ValueError("hits_chunks must contain at least one Hits instance.")
+
+        for feature, values in features.items():
+            setattr(self, feature, torch.cat(values))
+
     def get_angular_error(self, reco_theta: Tensor) -> Tensor:
         r"""
         Compute the angular error between the generated and reconstructed tracks.
@@ -285,7 +491,7 @@ class Tracking(AbsSave):
             (Tensor): angular error with size (mu).
         """
 
-        gen_tracks, _ = self.get_tracks_points_from_hits(hits=self.hits.gen_hits)  # type: ignore
+        gen_tracks, _ = self.get_tracks_points_from_hits(hits=self.hits.gen_hits, fit_method=self.fit_method, n_workers=self.n_workers, backend=self.backend)  # type: ignore
         gen_theta = self.get_theta_from_tracks(tracks=gen_tracks)
         return gen_theta - reco_theta
 
@@ -579,25 +785,6 @@ class Tracking(AbsSave):
         self._theta = None  # (mu)
         self._theta_xy = None  # (2, mu)
 
-    def _filter_muons(self, mask: Tensor) -> None:
-        r"""
-        Remove muons specified as False in `mask`.
-
-        Args:
-            - mask (Boolean tensor) Muons with False elements will be removed.
-        """
-
-        # Set attributes without setter method to None
-        self._reset_vars()
-
-        n_muons = self.tracks.size()[0]
-        # Loop over class attributes and apply the mask is Tensor
-        for var in vars(self).keys():
-            data = getattr(self, var)
-            if isinstance(data, Tensor):
-                if data.size()[0] == n_muons:
-                    setattr(self, var, data[mask])
-
     @property
     def df(self) -> pd.DataFrame:
         r"""
@@ -611,7 +798,9 @@ class Tracking(AbsSave):
         The muons' direction
         """
         if self._tracks is None:
-            self._tracks, self._points = self.get_tracks_points_from_hits(hits=self.hits.reco_hits)  # type: ignore
+            self._tracks, self._points = self.get_tracks_points_from_hits(
+                hits=self.hits.reco_hits, fit_method=self.fit_method, n_workers=self.n_workers, backend=self.backend  # type: ignore
+            )
         return self._tracks
 
     @tracks.setter
@@ -624,7 +813,9 @@ class Tracking(AbsSave):
         Point on muons' trajectory.
         """
         if self._points is None:
-            self._tracks, self._points = self.get_tracks_points_from_hits(hits=self.hits.reco_hits)  # type: ignore
+            self._tracks, self._points = self.get_tracks_points_from_hits(
+                hits=self.hits.reco_hits, fit_method=self.fit_method, n_workers=self.n_workers, backend=self.backend  # type: ignore
+            )
         return self._points
 
     @points.setter
@@ -739,9 +930,12 @@ class Tracking(AbsSave):
         self._measurement_type = value
 
 
-class TrackingMST:
+class TrackingMST(AbsSelection):
     r"""
     A class for tracking muons in the context of a Muon Scattering Tomography analysis.
+
+    Muon events are selected through indices (see `AbsSelection`): filtering a TrackingMST instance,
+    or a view of it obtained with `select`, does not copy the muon-wise attributes until they are read.
     """
 
     _theta_in: Optional[Tensor] = None  # (mu)
@@ -753,6 +947,8 @@ class TrackingMST:
 
     _vars_to_load = ["tracks", "points", "angular_res", "E", "tracks_eff", "hits"]
 
+    _muon_wise_vars = ["_tracks_in", "_tracks_out", "_points_in", "_points_out", "_tracks_eff_in", "_tracks_eff_out", "_E", "_hits_in", "_hits_out"]
+
     def __init__(
         self,
         trackings: Tuple[Tracking, Tracking] = None,
@@ -777,7 +973,8 @@ class TrackingMST:
         # Filter muon event due to detector efficiency
         self.n_mu_removed = (self.n_mu - self.muon_eff.sum()).detach().cpu().item()
         self._tracking_eff = 1 - (self.n_mu_removed / self.n_mu)
-        self._filter_muons(self.muon_eff)
+        if self.n_mu_removed > 0:
+            self._filter_muons(self.muon_eff)
 
     def __repr__(self) -> str:
         description = f"Collection of tracks from {self.n_mu:,d} muons "
@@ -849,27 +1046,6 @@ class TrackingMST:
         muon_wise_eff = (tracks_eff_in + tracks_eff_out) == 2
         return muon_wise_eff
 
-    def _filter_muons(self, mask: Tensor) -> None:
-        r"""
-        Remove muons specified as False in `mask`.
-
-        Arguments:
-            mask: (N,) Boolean tensor. Muons with False elements will be removed.
-        """
-
-        # Set attributes without setter method to None
-        self._reset_vars()
-
-        n_muons = self.tracks_in.size()[0]
-        # Loop over class attributes and apply the mask is Tensor
-        for var in vars(self).keys():
-            data = getattr(self, var)
-            if isinstance(data, Tensor):
-                if data.size()[0] == n_muons:
-                    setattr(self, var, data[mask])
-            elif isinstance(data, Hits):
-                data._filter_events(mask=mask)
-
     def _reset_vars(self) -> None:
         r"""
         Reset attributes to None.
@@ -880,6 +1056,7 @@ class TrackingMST:
         self._theta_xy_in = None  # (2, mu)
         self._theta_xy_out = None  # (2, mu)
         self._dtheta = None  # (mu)
+        self._muon_eff = None  # (mu)
 
     def plot_muon_features(
         self,
@@ -343,8 +343,6 @@ class Tracking_EM:
             batch_indices = batch[0].tolist()  # Extract batch indices  # <-- NEW LINE
 
             for ev in batch_indices:  # <-- UPDATED TO USE BATCHED DATA
-                edge = self.voi.voxel_edges
-
                 if _in_ and poca:
                     x1, y1 = self.data["xyz_in_x"][ev], self.data["xyz_in_y"][ev]
                     x2, y2 = self.data["location_x"][ev], self.data["location_y"][ev]
@@ -381,19 +379,8 @@ class Tracking_EM:
                 xyz[:, 1] = y
                 xyz[:, 2] = z
 
-                edge = edge[:, :, :, :, None, :]
-                edge = edge.expand(self.voi.n_vox_xyz[0], self.voi.n_vox_xyz[1], self.voi.n_vox_xyz[2], 2, len(xyz), 3)
-                mask = (
-                    (edge[:, :, :, 0, :, 0] < xyz[:, 0])
-                    & (edge[:, :, :, 1, :, 0] > xyz[:, 0])
-                    & (edge[:, :, :, 0, :, 1] < xyz[:, 1])
-                    & (edge[:, :, :, 1, :, 1] > xyz[:, 1])
-                    & (edge[:, :, :, 0, :, 2] < xyz[:, 2])
-                    & (edge[:, :, :, 1, :, 2] > xyz[:, 2])
-                )
-
-                indices = torch.nonzero(mask, as_tuple=False)
-                indices = indices[:, :-1].unique(dim=0).tolist()
+                indices = self.voi.get_voxel_indices(xyz)
+                indices = indices[(indices >= 0).all(dim=-1)].unique(dim=0).tolist()
 
                 # sign_x, sign_y = (-1, -1) if x1 > x2 and y1 > y2 else (-1, 1) if x1 > x2 and y1 < y2 else (1, -1) if x1 < x2 and y1 > y2 else (1, 1)
                 # key = lambda k: (k[2], sign_x * k[0], sign_y * k[1])
@@ -0,0 +1,168 @@
+from abc import ABC, abstractmethod
+from copy import copy
+from typing import Any, List, Optional, TypeVar
+import torch
+from torch import Tensor
+
+from muograph.utils.device import DEVICE
+
+r"""
+Provides a base class for index-based selection of muon events.
+"""
+
+Selection = TypeVar("Selection", bound="AbsSelection")
+
+
+class AbsSelection(ABC):
+    r"""
+    A base class for index-based selection of muon events.
+
+    The masks applied with `_filter_muons` are composed into a single tensor of indices, `_selection`,
+    pointing to the muons of the unfiltered instance `_source`. The muon-wise attributes listed in
+    `_muon_wise_vars` are only gathered from `_source` when read, and must not be defined as class attributes.
+    Attributes with a `_filter_events` method (e.g `Hits`) are copied and filtered instead of indexed.
+
+    Filtering an unfiltered instance with `_filter_muons` keeps a shallow copy of it, with all its muons, as `_source`.
+    The unfiltered muon-wise tensors therefore stay in memory alongside the gathered ones, e.g after the
+    efficiency filter of `TrackingMST`, as long as the filtered instance is alive.
+    """
+
+    _muon_wise_vars: List[str] = []
+
+    # Unfiltered instance and indices of the selected muons in it
+    _source: Optional["AbsSelection"] = None
+    _selection: Optional[Tensor] = None  # (mu)
+
+    def _reset_vars(self) -> None:
+        r"""
+        Reset the attributes computed from the muon-wise attributes.
+        """
+        pass
+
+    @staticmethod
+    def get_indices_from_mask(mask: Tensor) -> Tensor:
+        r"""
+        Converts a boolean mask into the indices of its True elements.
+
+        Args:
+            - mask (Tensor): Boolean tensor, or tensor of indices (returned as is).
+
+        Returns:
+            - indices (Tensor): The indices of the selected elements.
+        """
+        return torch.nonzero(mask).flatten() if mask.dtype == torch.bool else mask
+
+    def _drop_muon_wise_vars(self) -> None:
+        r"""
+        Remove the gathered muon-wise attributes, such that they are gathered again when read.
+        """
+        self._reset_vars()
+        for var in self._muon_wise_vars:
+            self.__dict__.pop(var, None)
+
+    def select(self: Selection, mask: Tensor) -> Selection:
+        r"""
+        Returns a filtered view of the muons specified as True in `mask`, without copying the data.
+
+        The view shares the tensors of this instance. Its muon-wise attributes are only gathered when read,
+        and the view can be filtered further with `_filter_muons` without modifying this instance.
+
+        Args:
+            - mask (Tensor): Boolean tensor, or tensor of muon indices.
+
+        Returns:
+            - view: The filtered view.
+        """
+        indices = self.get_indices_from_mask(mask)
+
+        view = copy(self)
+        view._drop_muon_wise_vars()
+
+        # Views of views refer to the unfiltered instance
+        if self._source is not None:
+            view._source, view._selection = self._source, self._selection[indices]  # type: ignore
+        else:
+            view._source, view._selection = self, indices
+
+        return view
+
+    def _filter_muons(self, mask: Tensor) -> None:
+        r"""
+        Remove muons specified as False in `mask`. The mask is composed with the current selection,
+        the muon-wise attributes being gathered when read.
+
+        Args:
+            - mask (Tensor): Boolean tensor, or tensor of muon indices. Muons with False elements will be removed.
+        """
+        indices = self.get_indices_from_mask(mask)
+
+        if self._source is None:
+            self._source, self._selection = copy(self), indices
+        else:
+            self._selection = self._selection[indices]  # type: ignore
+
+        self._drop_muon_wise_vars()
+
+    @property
+    def muon_indices(self) -> Tensor:
+        r"""
+        The indices of the selected muons within the unfiltered data, with size (mu).
+        Useful to cross-reference muons between filtered instances sharing the same unfiltered data.
+        """
+        if self._selection is None:
+            return torch.arange(self.n_mu, device=DEVICE)
+        return self._selection
+
+    def get_positions(self, view: "AbsSelection") -> Tensor:
+        r"""
+        Returns the positions in this instance of the muons selected in `view`. Both instances
+        must be selections of the same unfiltered data, e.g `view` obtained with `select`.
+
+        Args:
+            - view (AbsSelection): A selection of the same unfiltered data.
+
+        Returns:
+            - positions (Tensor): The positions of the muons of `view` in this instance, with size (mu_view).
+            Muons of `view` not selected in this instance have position -1.
+        """
+        source = self._source if self._source is not None else self
+        view_source = view._source if view._source is not None else view
+        if source is not view_source:
+            raise ValueError("Both instances must be selections of the same unfiltered data.")
+
+        indices, view_indices = self.muon_indices, view.muon_indices
+        n = int(torch.cat((indices, view_indices)).max().item()) + 1 if len(indices) + len(view_indices) > 0 else 0
+
+        lookup = torch.full((n,), -1, dtype=torch.int64, device=indices.device)
+        lookup[indices] = torch.arange(len(indices), device=indices.device)
+
+        return lookup[view_indices]
+
+    @property
+    @abstractmethod
+    def n_mu(self) -> int:
+        r"""
+        The number of selected muons.
+        """
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        r"""
+        Gathers the muon-wise attributes from the unfiltered instance, when first read.
+        Muon-wise attributes missing from an unfiltered instance are None.
+        """
+        if name not in type(self)._muon_wise_vars:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        if self._source is None:
+            return None
+
+        data = getattr(self._source, name)
+        if hasattr(data, "_filter_events"):
+            data = copy(data)
+            data._filter_events(self._selection)
+        elif data is not None:
+            data = data[self._selection]
+
+        setattr(self, name, data)
+        return data
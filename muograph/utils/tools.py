@@ -2,7 +2,8 @@ import torch
 from torch import Tensor
 from scipy.ndimage import gaussian_filter
 import numpy as np
-from typing import Union, List
+from typing import Union, List, Tuple, Callable, Optional
+from functools import partial
 import os
 
 
@@ -66,3 +67,130 @@ def apply_gaussian_filter(x: Union[Tensor, np.ndarray], sigma: List[float]) -> U
         return gaussian_filter(x, sigma=sigma)
     else:
         raise TypeError(f"Input type {type(x)} is not supported. Expected Tensor or np.ndarray.")
+
+
+def sort_by_segment(values: Tensor, segment_ids: Tensor, n_segments: int, sort_values: bool = True) -> Tuple[Tensor, Tensor]:
+    r"""Groups values into contiguous segments, such that the values of segment `i`
+    are given by `sorted_values[offsets[i] : offsets[i + 1]]`.
+
+    Args:
+        values (Tensor): The values, with size (n,).
+        segment_ids (Tensor): The segment index of each value, with size (n,).
+        n_segments (int): The total number of segments.
+        sort_values (bool): If True, values are sorted in increasing order within each segment.
+        Otherwise, the original order of the values is preserved. Defaults to True.
+
+    Returns:
+        sorted_values (Tensor): The values grouped by segment, with size (n,).
+        offsets (Tensor): The segments offsets, with size (n_segments + 1,).
+    """
+    segment_ids = segment_ids.long()
+
+    if sort_values:
+        values, order = torch.sort(values)
+        segment_ids = segment_ids[order]
+
+    segment_ids, order = torch.sort(segment_ids, stable=True)
+    counts = torch.bincount(segment_ids, minlength=n_segments)
+
+    offsets = torch.zeros(n_segments + 1, dtype=torch.int64, device=values.device)
+    offsets[1:] = torch.cumsum(counts, dim=0)
+
+    return values[order], offsets
+
+
+def segment_quantile(sorted_values: Tensor, offsets: Tensor, q: float) -> Tensor:
+    r"""Computes the q-th quantile of each segment, using linear interpolation
+    as `np.quantile` and `torch.quantile`. Empty segments are set to 0.
+
+    Args:
+        sorted_values (Tensor): The values sorted within each segment, as returned by `sort_by_segment`.
+        offsets (Tensor): The segments offsets, with size (n_segments + 1,).
+        q (float): The quantile to compute, in [0, 1].
+
+    Returns:
+        quantiles (Tensor): The quantile of each segment, with size (n_segments,).
+    """
+    counts = offsets.diff()
+    non_empty = counts > 0
+    quantiles = torch.zeros(len(counts), dtype=sorted_values.dtype, device=sorted_values.device)
+
+    pos = q * (counts[non_empty] - 1).double()
+    low, high = torch.floor(pos).long(), torch.ceil(pos).long()
+    v_low = sorted_values[offsets[:-1][non_empty] + low].double()
+    v_high = sorted_values[offsets[:-1][non_empty] + high].double()
+
+    quantiles[non_empty] = (v_low + (pos - low) * (v_high - v_low)).to(sorted_values.dtype)
+
+    return quantiles
+
+
+def segment_mean(sorted_values: Tensor, offsets: Tensor) -> Tensor:
+    r"""Computes the mean of each segment. Empty segments are set to 0.
+
+    Args:
+        sorted_values (Tensor): The values grouped by segment, as returned by `sort_by_segment`.
+        offsets (Tensor): The segments offsets, with size (n_segments + 1,).
+
+    Returns:
+        means (Tensor): The mean of each segment, with size (n_segments,).
+    """
+    counts = offsets.diff()
+    segment_ids = torch.repeat_interleave(torch.arange(len(counts), device=counts.device), counts)
+    sums = torch.zeros(len(counts), dtype=torch.float64, device=sorted_values.device).index_add_(0, segment_ids, sorted_values.double())
+
+    return (sums / counts.clamp(min=1)).to(sorted_values.dtype)
+
+
+def get_segment_quantile(score_method: Callable) -> Optional[float]:
+    r"""Returns the quantile computed by `score_method` if it is a median or a
+    `np.quantile` / `torch.quantile` partial with a scalar `q`, None otherwise.
+
+    Args:
+        score_method (Callable): The function used to convert a list of scores into a float.
+
+    Returns:
+        q (Optional[float]): The quantile computed by `score_method`.
+    """
+    if score_method is np.median:
+        return 0.5
+    if isinstance(score_method, partial) and score_method.func in (np.quantile, torch.quantile):
+        if (not score_method.args) and (set(score_method.keywords) == {"q"}) and (np.ndim(score_method.keywords["q"]) == 0):
+            return float(score_method.keywords["q"])
+    return None
+
+
+def segment_reduce(values: Tensor, segment_ids: Tensor, n_segments: int, score_method: Callable, to_numpy: bool = False) -> Tensor:
+    r"""Reduces the values of each segment into a single score.
+
+    Quantiles (`np.quantile` or `torch.quantile` partials with scalar `q`, `np.median`) and means
+    (`np.mean`, `torch.mean`) are computed with vectorized segmented reductions. Any other `score_method`
+    is called on the values of each non-empty segment, in their original order. Empty segments are set to 0.
+
+    Args:
+        values (Tensor): The values, with size (n,).
+        segment_ids (Tensor): The segment index of each value, with size (n,).
+        n_segments (int): The total number of segments.
+        score_method (Callable): The function used to convert the values of a segment into a float.
+        to_numpy (bool): If True, the values of each segment are passed to a custom `score_method` as a np.ndarray. Defaults to False.
+
+    Returns:
+        scores (Tensor): The score of each segment, with size (n_segments,).
+    """
+    q = get_segment_quantile(score_method)
+
+    if q is not None:
+        sorted_values, offsets = sort_by_segment(values, segment_ids, n_segments)
+        return segment_quantile(sorted_values, offsets, q)
+
+    sorted_values, offsets = sort_by_segment(values, segment_ids, n_segments, sort_values=False)
+
+    if score_method in (np.mean, torch.mean):
+        return segment_mean(sorted_values, offsets)
+
+    segments = torch.tensor_split(sorted_values.cpu(), offsets[1:-1].cpu())
+    scores = torch.zeros(n_segments, dtype=torch.float64)
+    for segment in torch.nonzero(offsets.diff()).flatten().tolist():
+        scores[segment] = float(score_method(segments[segment].numpy() if to_numpy else segments[segment]))
+
+    return scores.to(dtype=values.dtype, device=values.device)
@@ -2,6 +2,7 @@ import torch
 from torch import Tensor
 from typing import Tuple
 from muograph.utils.device import DEVICE
+from muograph.utils.datatype import dtype_n
 
 r"""
 Provides container classes for a batch of many muons.
@@ -118,6 +119,64 @@ class Volume:
 
         return voxel_centers, voxel_edges
 
+    def get_voxel_indices(self, xyz: Tensor, clamp: bool = False) -> Tensor:
+        r"""
+        Get the indices of the voxels containing the points `xyz`.
+
+        As the volume is a regular grid, the voxel indices are computed analytically as
+        floor((xyz - xyz_min) / vox_width), with a cost linear in the number of points.
+        Points lying exactly on the upper edge of the volume are assigned to the last voxel.
+
+        Args:
+            xyz (`Tensor`): The xyz coordinates of the points, with size (n, 3).
+            clamp (`bool`): If True, points outside the volume are assigned to the closest voxel.
+            If False, the indices of points outside the volume are set to -1 along all dimensions.
+
+        Returns:
+            indices (`Tensor`): The xyz voxel indices of each point, with size (n, 3).
+        """
+        xyz_min, xyz_max = self.xyz_min.to(xyz.device), self.xyz_max.to(xyz.device)
+        n_vox_xyz = torch.tensor(self.n_vox_xyz, device=xyz.device)
+
+        indices = torch.floor((xyz - xyz_min) / self.vox_width).long()
+        indices = torch.minimum(torch.clamp(indices, min=0), n_vox_xyz - 1)
+
+        if not clamp:
+            mask_in_voi = ((xyz >= xyz_min) & (xyz <= xyz_max)).all(dim=-1)
+            indices[~mask_in_voi] = -1
+
+        return indices.to(dtype_n)
+
+    def get_flat_voxel_indices(self, indices: Tensor) -> Tensor:
+        r"""
+        Convert xyz voxel indices into flat voxel indices, such that
+        flat_index = ix * ny * nz + iy * nz + iz.
+
+        Args:
+            indices (`Tensor`): The xyz voxel indices, with size (n, 3).
+
+        Returns:
+            flat_indices (`Tensor`): The flat voxel indices, with size (n,).
+        """
+        _, ny, nz = self.n_vox_xyz
+        indices = indices.long()
+        return indices[:, 0] * (ny * nz) + indices[:, 1] * nz + indices[:, 2]
+
+    def unflatten_voxel_indices(self, flat_indices: Tensor) -> Tensor:
+        r"""
+        Convert flat voxel indices back into xyz voxel indices.
+        Inverse of `get_flat_voxel_indices`.
+
+        Args:
+            flat_indices (`Tensor`): The flat voxel indices, with size (n,).
+
+        Returns:
+            indices (`Tensor`): The xyz voxel indices, with size (n, 3).
+        """
+        _, ny, nz = self.n_vox_xyz
+        flat_indices = flat_indices.long()
+        return torch.stack([flat_indices // (ny * nz), (flat_indices % (ny * nz)) // nz, flat_indices % nz], dim=-1)
+
     @property
     def n_vox_xyz(self) -> Tuple[int, int, int]:
         """